@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks
+    ~~~~~~~~~~
+
+    Micro benchmarks for the pyinfluxql hot paths
+
+    Run with ``python -m benchmarks``, see ``python -m benchmarks --help``.
+"""
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.bench_aggregate
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Client side aggregation of 10 chunks of 10000 raw points
+"""
+
+import random
+from influxdb.resultset import ResultSet
+
+from pyinfluxql.aggregate import Aggregation
+from pyinfluxql.functions import Mean, Max, Percentile, Count, Distinct
+from .runner import benchmark
+
+CHUNKS = 10
+POINTS = 10000
+
+
+def chunks_setup():
+    rng = random.Random(1)
+    chunks = []
+    for chunk in range(CHUNKS):
+        start = chunk * POINTS
+        chunks.append(ResultSet({'series': [{
+            'name': 'cpu', 'tags': {'host': 'a'}, 'columns': ['time', 'value'],
+            'values': [[(start + i) * 10 ** 9, rng.random() * 100]
+                       for i in range(POINTS)]}]}))
+    return chunks
+
+
+def aggregate(chunks, functions):
+    aggregation = Aggregation(functions, '1h')
+    for chunk in chunks:
+        aggregation.add_result(chunk)
+    return aggregation.result()
+
+
+@benchmark('aggregate.mean_max_100k', setup=chunks_setup, memory=True)
+def mean_max(chunks):
+    aggregate(chunks, [Mean('value'), Max('value')])
+
+
+@benchmark('aggregate.percentile_100k', setup=chunks_setup, memory=True)
+def percentile(chunks):
+    aggregate(chunks, [Percentile('value', 99)])
+
+
+@benchmark('aggregate.distinct_100k', setup=chunks_setup, memory=True)
+def distinct(chunks):
+    aggregate(chunks, [Count(Distinct('value'))])
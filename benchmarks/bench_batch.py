@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.bench_batch
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Rendering 10000 backfill queries, 100 hosts by 100 daily windows
+"""
+
+from datetime import datetime, timedelta
+
+from pyinfluxql import Query
+from pyinfluxql.batch import QueryBatch
+from pyinfluxql.functions import Mean
+from .runner import benchmark
+
+HOSTS = ['server%03i' % i for i in range(100)]
+STARTS = [datetime(2015, 6, 6) + timedelta(days=i) for i in range(100)]
+
+
+def base():
+    return Query(Mean('value')).from_('cpu').where(region='us') \
+        .group_by(time='1h')
+
+
+@benchmark('batch.query_loop_10k', setup=base)
+def query_loop(query):
+    """A cloned Query per row
+    """
+    for host in HOSTS:
+        for start in STARTS:
+            str(query.clone().where(host=host).date_range(
+                start, start + timedelta(days=1)))
+
+
+@benchmark('batch.query_batch_10k', setup=base)
+def query_batch(query):
+    """One QueryBatch with the same rows
+    """
+    hosts = [host for host in HOSTS for _ in STARTS]
+    starts = STARTS * len(HOSTS)
+    ends = [start + timedelta(days=1) for start in starts]
+    QueryBatch(query, host=hosts, time__gt=starts, time__lt=ends).statements()
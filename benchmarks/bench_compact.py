@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.bench_compact
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Decoding a response of 2000 series of 50 rows grouped by host and region
+    into a ResultSet and a CompactResult and reading every point, with the
+    peak memory of both.
+"""
+
+import json
+
+from influxdb.resultset import ResultSet
+
+from pyinfluxql.compact import CompactResult
+from pyinfluxql.decode import pack_results
+from .runner import benchmark
+
+SERIES = 2000
+ROWS = 50
+
+
+def body():
+    return json.dumps({'results': [{'statement_id': 0, 'series': [
+        {'name': 'cpu', 'tags': {'host': 'h%i' % (i % 100),
+                                 'region': 'r%i' % (i // 100)},
+         'columns': ['time', 'mean', 'count'],
+         'values': [[1433548800 + j * 60, i * 0.5 + j, j]
+                    for j in range(ROWS)]} for i in range(SERIES)]}]})
+
+
+@benchmark('compact.resultset_100k', setup=body, memory=True)
+def resultset(data):
+    result = ResultSet(json.loads(data)['results'][0])
+    points = list(result.get_points(tags={'region': 'r3'}))
+    return result, points
+
+
+@benchmark('compact.compact_100k', setup=body, memory=True)
+def compact(data):
+    result = CompactResult.from_packed(
+        pack_results(json.loads(data))['results'][0])
+    points = list(result.get_points(tags={'region': 'r3'}))
+    return result, points
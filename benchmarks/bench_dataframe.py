@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.bench_dataframe
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    DataFrame conversion of a wide group by result, 200 hosts x 1440 points,
+    built from the column arrays versus from get_points() dicts
+"""
+
+import pandas as pd
+from influxdb.resultset import ResultSet
+
+from pyinfluxql.dataframe import to_dataframe
+from .runner import benchmark
+
+HOSTS = 200
+POINTS = 1440
+
+
+def wide_result():
+    series = []
+    for h in range(HOSTS):
+        series.append({
+            'name': 'cpu',
+            'tags': {'host': 'server%03i' % h, 'region': 'us-west'},
+            'columns': ['time', 'mean', 'max'],
+            'values': [[1433548800 + i * 60, float(i), float(i + h)]
+                       for i in range(POINTS)]})
+    return ResultSet({'statement_id': 0, 'series': series})
+
+
+@benchmark('dataframe.columnar', setup=wide_result, memory=True)
+def dataframe_columnar(result):
+    to_dataframe(result, epoch='s')
+
+
+@benchmark('dataframe.from_points', setup=wide_result, memory=True)
+def dataframe_from_points(result):
+    frames = []
+    for (name, tags), points in result.items():
+        df = pd.DataFrame(list(points))
+        for key, value in tags.items():
+            df[key] = value
+        frames.append(df)
+    df = pd.concat(frames)
+    df['time'] = pd.to_datetime(df['time'], unit='s', utc=True)
+    df.set_index(['host', 'region', 'time'])
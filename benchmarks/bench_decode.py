@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.bench_decode
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Decoding a 200000 row response with each decoder, in process and
+    offloaded to a worker process. The stall benchmarks report the longest
+    a 1ms ticker thread is held up while one response is decoded, i.e. the
+    tail latency the rest of a service sees.
+"""
+
+import json
+import time
+import random
+import threading
+
+from pyinfluxql.decode import Decoder
+from .runner import benchmark
+
+ROWS = 200000
+TICK = 0.001
+
+
+def body():
+    rng = random.Random(1)
+    return json.dumps({'results': [{'statement_id': 0, 'series': [{
+        'name': 'cpu', 'tags': {'host': 'a'},
+        'columns': ['time', 'value', 'count'],
+        'values': [[1433548800000000000 + i * 10 ** 9, rng.random() * 100, i]
+                   for i in range(ROWS)]}]}]}).encode('utf-8')
+
+
+def installed():
+    names = ['json']
+    for name in ('orjson', 'ujson'):
+        try:
+            Decoder(name)
+            names.append(name)
+        except ImportError:
+            pass
+    return names
+
+
+def decoder_setup(name, offload):
+    def setup():
+        decoder = Decoder(name, offload_threshold=0 if offload else None,
+                          processes=1)
+        data = body()
+        decoder.decode(data)
+        return decoder, data
+    return setup
+
+
+def stall(args):
+    """Returns the longest gap between the ticks of a thread sleeping 1ms
+    while a response is decoded
+    """
+    decoder, data = args
+    gaps = []
+    done = threading.Event()
+
+    def tick():
+        last = time.time()
+        while not done.is_set():
+            time.sleep(TICK)
+            now = time.time()
+            gaps.append(now - last - TICK)
+            last = now
+    thread = threading.Thread(target=tick)
+    thread.start()
+    time.sleep(TICK * 5)
+    decoder.decode(data)
+    done.set()
+    thread.join()
+    return max(gaps)
+
+
+def decode(args):
+    decoder, data = args
+    decoder.decode(data)
+
+
+for _name in installed():
+    for _offload in (False, True):
+        _label = '%s%s' % (_name, '_offload' if _offload else '')
+        _setup = decoder_setup(_name, _offload)
+        benchmark('decode.%s_200k' % _label, setup=_setup)(decode)
+        benchmark('decode.%s_200k_stall' % _label, setup=_setup,
+                  reported=True)(stall)
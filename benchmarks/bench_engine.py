@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.bench_engine
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Engine helpers against stub clients with a simulated 0.5ms round trip
+"""
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.functions import Mean
+from .runner import benchmark
+from .stubs import client, make_series
+
+ROUND_TRIP = 0.0005
+HOSTS = ['server%03i' % i for i in range(500)]
+
+
+def host_series():
+    return [make_series(tags={'host': host}, points=60) for host in HOSTS]
+
+
+def per_tag_setup():
+    return Engine(client([make_series(points=60)], latency=ROUND_TRIP,
+                         stored=host_series())), \
+        Query(Mean('value')).from_('cpu').group_by(time='1m')
+
+
+@benchmark('engine.per_tag_queries_500', setup=per_tag_setup)
+def per_tag_queries(args):
+    """500 round trips, one per host
+    """
+    engine, query = args
+    for host in HOSTS:
+        engine.execute(query.clone().where(host=host))
+
+
+def execute_by_tag_setup():
+    return Engine(client(host_series(), latency=ROUND_TRIP)), \
+        Query(Mean('value')).from_('cpu').group_by(time='1m')
+
+
+@benchmark('engine.execute_by_tag_500', setup=execute_by_tag_setup)
+def execute_by_tag(args):
+    """A single round trip grouped by host
+    """
+    engine, query = args
+    engine.execute_by_tag(query, 'host', HOSTS)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.bench_fill
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    A day of 1 minute buckets for 50 hosts with 20 points each, from a local
+    `pyinfluxql.testing.FakeInfluxDB`: fill(0) on the server against
+    fill(none) densified client side, end to end and by response size.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.functions import Mean
+from pyinfluxql.testing import FakeInfluxDB
+from .runner import benchmark
+
+START = datetime(2015, 6, 6)
+HOSTS = 50
+POINTS = 20
+
+_servers = []
+
+
+def setup():
+    rng = random.Random(1)
+    server = FakeInfluxDB()
+    _servers.append(server.start())
+    client = server.client('bench')
+    client.create_database('bench')
+    client.write_points([
+        {'measurement': 'cpu', 'tags': {'host': 'h%i' % host},
+         'time': START + timedelta(minutes=rng.randrange(1440)),
+         'fields': {'value': rng.random()}}
+        for host in range(HOSTS) for _ in range(POINTS)], batch_size=10000)
+    query = Query(Mean('value')).from_('cpu') \
+        .date_range(START, START + timedelta(days=1)) \
+        .group_by('host', time='1m', fill=0)
+    return Engine(client), query
+
+
+def payload(engine, query):
+    params = {'q': str(query), 'db': 'bench', 'epoch': 's'}
+    return len(engine.client.request('query', params=params).content)
+
+
+@benchmark('fill.server_fill0_72k', setup=setup)
+def server_fill(args):
+    engine, query = args
+    engine.execute(query, epoch='s')
+
+
+@benchmark('fill.densify_fill0_72k', setup=setup)
+def densify_fill(args):
+    engine, query = args
+    engine.execute_dense(query, epoch='s')
+
+
+@benchmark('fill.server_fill0_72k', setup=setup, size=True)
+def server_fill_payload(args):
+    return payload(*args)
+
+
+@benchmark('fill.densify_fill0_72k', setup=setup, size=True)
+def densify_fill_payload(args):
+    engine, query = args
+    return payload(engine, query.clone().group_by(fill='none'))
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.bench_hedge
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Hedged requests against stub replicas with a 1ms round trip where 2% of
+    queries take 50ms
+"""
+
+from pyinfluxql import Engine, Query
+from .runner import benchmark
+from .stubs import client, make_series
+
+QUERIES = 100
+
+
+def replicas(n):
+    return [client([make_series(points=10)], latency=0.001, tail_latency=0.05,
+                   tail_probability=0.02, seed=i) for i in range(n)]
+
+
+def warm(engine):
+    query = Query('value').from_('cpu')
+    for _ in range(QUERIES):
+        engine.execute(query)
+    return engine, query
+
+
+@benchmark('hedge.single_replica_100',
+           setup=lambda: warm(Engine(replicas(1)[0])))
+def single_replica(args):
+    """100 queries on one replica, every tail latency is paid in full
+    """
+    engine, query = args
+    for _ in range(QUERIES):
+        engine.execute(query)
+
+
+@benchmark('hedge.hedged_3_replicas_100',
+           setup=lambda: warm(Engine(replicas(3))))
+def hedged_replicas(args):
+    """100 queries over three replicas, hedged after their p95 latency
+    """
+    engine, query = args
+    for _ in range(QUERIES):
+        engine.execute(query)
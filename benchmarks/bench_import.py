@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.bench_import
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Package import time as reported by `python -X importtime`, measured in a
+    fresh interpreter each time
+"""
+
+import os
+import sys
+import subprocess
+
+from .runner import benchmark
+
+# the third party and standard library modules the query modules need, the
+# import time budgets are relative to the time they take to import
+REFERENCE = 'import copy, datetime, six'
+
+# cumulative import time budgets as multiples of the REFERENCE import time,
+# enforced by tests/test_imports.py
+BUDGETS = {
+    'import pyinfluxql': 0.25,
+    'from pyinfluxql import Query': 3,
+    'from pyinfluxql import Engine': 3,
+}
+
+
+def import_times(statement):
+    """Runs `statement` in a new interpreter and returns the cumulative
+    seconds `-X importtime` reports for every top level module it imported
+    """
+    env = dict(os.environ)
+    # without cached bytecode every run would include compiling the modules
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        stderr=subprocess.STDOUT, env=env, universal_newlines=True)
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        if not module.startswith('  '):
+            times[module.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def import_time(statement):
+    """Seconds spent importing modules for `statement`, excluding whatever
+    the interpreter imports at startup
+    """
+    baseline = import_times('pass')
+    return sum(seconds for module, seconds in import_times(statement).items()
+               if module not in baseline)
+
+
+def _register(statement):
+    name = 'import.' + statement.replace(' ', '_')
+
+    @benchmark(name, reported=True)
+    def bench(_):
+        return import_time(statement)
+
+
+for _statement in sorted(BUDGETS):
+    _register(_statement)
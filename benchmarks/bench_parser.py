@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.bench_parser
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    InfluxQL parsing throughput. The target is 50k typical statements per
+    second on one core, 20us per statement, enforced as a budget relative to
+    `runner.reference` so it holds on slower machines too.
+"""
+
+from pyinfluxql.parser import parse, tokenize
+from .runner import benchmark
+
+# 20us as a multiple of the ~7us `runner.reference` takes, enforced by
+# tests/test_parser.py
+BUDGET = 3
+
+TYPICAL = (
+    "SELECT mean(\"value\") FROM \"cpu\" WHERE \"host\" =~ /^server01$/ "
+    "AND time > now() - 6h GROUP BY time(1m), \"host\" fill(0)")
+SIMPLE = "SELECT value FROM cpu LIMIT 10"
+DELETE = "DELETE FROM cpu WHERE time < '2015-06-06 00:00:00.000'"
+
+
+@benchmark('parser.tokenize_typical')
+def tokenize_typical():
+    tokenize(TYPICAL)
+
+
+@benchmark('parser.parse_typical', budget=BUDGET)
+def parse_typical():
+    parse(TYPICAL)
+
+
+@benchmark('parser.parse_simple')
+def parse_simple():
+    parse(SIMPLE)
+
+
+@benchmark('parser.parse_delete')
+def parse_delete():
+    parse(DELETE)
+
+
+@benchmark('parser.roundtrip_typical')
+def roundtrip_typical():
+    str(parse(TYPICAL))
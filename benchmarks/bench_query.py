@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.bench_query
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Query rendering, cloning, value formatting and engine benchmarks
+"""
+
+from datetime import datetime, timedelta
+from dateutil.tz import tzutc
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.functions import Mean, Max, Percentile, Count, Distinct
+from pyinfluxql.profiler import Profiler, shape
+from pyinfluxql.utils import format_timedelta, parse_interval
+from .runner import benchmark
+from .stubs import client, make_series
+
+START = datetime(2015, 6, 6)
+END = START + timedelta(days=1)
+
+
+def small_query():
+    return Query('value').from_('cpu')
+
+
+def medium_query():
+    return Query(Mean('value')).from_('cpu_load') \
+        .where(host='server01', region='us-west') \
+        .date_range(START, END) \
+        .group_by('host', time=timedelta(minutes=5), fill=True) \
+        .limit(1000)
+
+
+def huge_query():
+    expressions = []
+    for i in range(50):
+        expressions.append(Mean('field%i' % i))
+        expressions.append(Percentile('field%i' % i, 95))
+    where = dict(('tag%i' % i, 'value%i' % i) for i in range(200))
+    return Query(*expressions).from_('wide-measurement') \
+        .where(**where) \
+        .date_range(START, END) \
+        .group_by(*['tag%i' % i for i in range(20)], time='1m') \
+        .limit(10000).order('time', 'desc')
+
+
+@benchmark('render.small', setup=small_query)
+def render_small(query):
+    str(query)
+
+
+@benchmark('render.medium', setup=medium_query)
+def render_medium(query):
+    str(query)
+
+
+@benchmark('render.huge', setup=huge_query)
+def render_huge(query):
+    str(query)
+
+
+@benchmark('clone.medium', setup=medium_query)
+def clone_medium(query):
+    query.clone()
+
+
+@benchmark('clone.huge', setup=huge_query)
+def clone_huge(query):
+    query.clone()
+
+
+@benchmark('build.medium')
+def build_medium():
+    medium_query()
+
+
+@benchmark('build.nested_func')
+def build_nested_func():
+    Count(Distinct(Max('value'))).as_('x').format()
+
+
+@benchmark('format_value.str', setup=Query)
+def format_value_str(query):
+    query._format_value('server01')
+
+
+@benchmark('format_value.regex', setup=Query)
+def format_value_regex(query):
+    query._format_value('/server.*/')
+
+
+@benchmark('format_value.int', setup=Query)
+def format_value_int(query):
+    query._format_value(1433548800)
+
+
+@benchmark('format_value.float', setup=Query)
+def format_value_float(query):
+    query._format_value(0.25)
+
+
+@benchmark('format_value.bool', setup=Query)
+def format_value_bool(query):
+    query._format_value(True)
+
+
+@benchmark('format_value.datetime', setup=Query)
+def format_value_datetime(query):
+    query._format_value(START)
+
+
+@benchmark('format_value.datetime_tz', setup=Query)
+def format_value_datetime_tz(query):
+    query._format_value(START.replace(tzinfo=tzutc()))
+
+
+@benchmark('utils.format_timedelta')
+def utils_format_timedelta():
+    format_timedelta(timedelta(minutes=90))
+
+
+@benchmark('utils.format_timedelta_us')
+def utils_format_timedelta_us():
+    format_timedelta(timedelta(microseconds=2500))
+
+
+@benchmark('utils.parse_interval')
+def utils_parse_interval():
+    parse_interval('24h')
+
+
+def stub_engine():
+    stored = [make_series('cpu_load', {'host': 'server01', 'region': 'us-west'},
+                          points=288, start=1433548800)]
+    return Engine(client(stored=stored)), medium_query()
+
+
+@benchmark('engine.execute', setup=stub_engine)
+def engine_execute(args):
+    engine, query = args
+    engine.execute(query)
+
+
+def profiled_engine():
+    engine, query = stub_engine()
+    engine.profiler = Profiler()
+    return engine, query
+
+
+@benchmark('engine.execute_profiled', setup=profiled_engine)
+def engine_execute_profiled(args):
+    engine, query = args
+    engine.execute(query)
+
+
+@benchmark('profiler.shape_medium', setup=medium_query)
+def profiler_shape_medium(query):
+    shape(query)
+
+
+@benchmark('engine.execute_points', setup=stub_engine)
+def engine_execute_points(args):
+    engine, query = args
+    list(engine.execute(query).get_points())
+
+
+@benchmark('format_value.epoch', setup=lambda: Query().time_precision('s'))
+def format_value_epoch(query):
+    query._format_value(START)
+
+
+@benchmark('fingerprint.medium', setup=medium_query)
+def fingerprint_medium(query):
+    query.fingerprint()
+
+
+@benchmark('fingerprint.medium_round_time', setup=medium_query)
+def fingerprint_medium_round_time(query):
+    query.fingerprint(round_time=True)
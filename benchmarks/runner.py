@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.runner
+    ~~~~~~~~~~~~~~~~~
+
+    A tiny timeit based benchmark runner with stored baselines
+"""
+
+import os
+import re
+import sys
+import json
+import timeit
+import argparse
+import tracemalloc
+import importlib
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+MODULES = [
+    'benchmarks.bench_query',
+    'benchmarks.bench_parser',
+    'benchmarks.bench_engine',
+    'benchmarks.bench_dataframe',
+    'benchmarks.bench_hedge',
+    'benchmarks.bench_import',
+    'benchmarks.bench_aggregate',
+    'benchmarks.bench_batch',
+    'benchmarks.bench_decode',
+    'benchmarks.bench_compact',
+    'benchmarks.bench_fill',
+]
+
+_registry = []
+
+
+def reference():
+    """Pure interpreter work the `budget` of a benchmark is a multiple of,
+    about 7us on a current desktop CPU with CPython 3.11
+    """
+    sum(range(1000))
+
+
+def benchmark(name, setup=None, memory=False, reported=False, size=False,
+              budget=None):
+    """Registers a benchmark. The decorated function is timed once per
+    iteration, and receives the return value of `setup` if one is given.
+    With `memory` the peak memory allocated by one call is recorded as well,
+    under `name` + ':peak_bytes'. With `reported` the function measures
+    itself and returns seconds, the best of `repeat` calls is kept. With
+    `size` it returns a number of bytes, e.g. a payload size, recorded under
+    `name` + ':bytes'. A `budget` is the most seconds per call allowed, as a
+    multiple of the time `reference` takes on the same machine.
+    """
+    def decorator(func):
+        _registry.append((name, func, setup, memory, reported, size, budget))
+        return func
+    return decorator
+
+
+def load(modules=MODULES):
+    for module in modules:
+        importlib.import_module(module)
+    return sorted(_registry, key=lambda entry: entry[0])
+
+
+def measure(func, arg=None, min_time=0.2, repeat=5):
+    """Returns the best seconds per call over `repeat` runs
+    """
+    if arg is None:
+        stmt = func
+    else:
+        stmt = lambda: func(arg)  # noqa: E731
+    timer = timeit.Timer(stmt)
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time / repeat:
+            break
+        number *= 2
+    return min(timer.repeat(repeat, number)) / number
+
+
+def measure_memory(func, arg=None):
+    """Returns the peak bytes allocated while calling func once
+    """
+    tracemalloc.start()
+    try:
+        if arg is None:
+            func()
+        else:
+            func(arg)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(pattern=None, min_time=0.2, repeat=5, out=sys.stdout, suffix=''):
+    results = {}
+    for name, func, setup, memory, reported, size, budget in load():
+        if pattern and not re.search(pattern, name):
+            continue
+        name += suffix
+        arg = setup() if setup else None
+        if size:
+            name += ':bytes'
+            results[name] = func(arg)
+            out.write("%-40s %12.1f KiB\n" % (name, results[name] / 1024.0))
+            continue
+        if reported:
+            results[name] = min(func(arg) for _ in range(repeat))
+        elif budget:
+            # interleaved with the reference so both see the same load
+            timings = [(measure(func, arg, min_time, repeat),
+                        measure(reference, None, min_time, repeat))
+                       for _ in range(repeat)]
+            results[name] = min(seconds for seconds, _ in timings)
+            results['reference'] = min(
+                [results.get('reference', 1)] + [ref for _, ref in timings])
+            out.write("%-40s %12.3f us\n" % (
+                'reference', results['reference'] * 1e6))
+        else:
+            results[name] = measure(func, arg, min_time, repeat)
+        out.write("%-40s %12.3f us\n" % (name, results[name] * 1e6))
+        if memory:
+            peak = name + ':peak_bytes'
+            results[peak] = measure_memory(func, arg)
+            out.write("%-40s %12.1f KiB\n" % (peak, results[peak] / 1024.0))
+    return results
+
+
+def over_budget(results):
+    """Returns a list of (name, budget, multiple) for every benchmark taking
+    more than its budget, in multiples of the reference time
+    """
+    over = []
+    for name, _, _, _, _, _, budget in load():
+        if budget and name in results:
+            multiple = results[name] / results['reference']
+            if multiple > budget:
+                over.append((name, budget, multiple))
+    return over
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    baseline = load_baseline(path)
+    baseline.update(results)
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(results, baseline, threshold):
+    """Returns a list of (name, baseline, current, ratio) for every benchmark
+    slower than its baseline by more than `threshold`
+    """
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        ratio = results[name] / baseline[name]
+        if ratio > 1 + threshold:
+            regressions.append((name, baseline[name], results[name], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('-k', dest='pattern', help='only run matching benchmarks')
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--compare', action='store_true',
+                        help='fail if a benchmark regressed against the baseline')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slowdown before --compare fails (default 0.2)')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--min-time', type=float, default=0.2)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--server', action='store_true',
+                        help='run engine benchmarks against a local stand-in '
+                             'InfluxDB instead of stub clients, results are '
+                             'suffixed with :server')
+    args = parser.parse_args(argv)
+
+    suffix = ''
+    if args.server:
+        from . import stubs
+        stubs.USE_SERVER = True
+        suffix = ':server'
+    results = run(args.pattern, args.min_time, args.repeat, suffix=suffix)
+    if args.save:
+        save_baseline(results, args.baseline)
+    over = over_budget(results)
+    for name, budget, multiple in over:
+        sys.stdout.write("OVER BUDGET %s: %.2fx reference, budget %gx\n" % (
+            name, multiple, budget))
+    if args.compare:
+        regressions = compare(results, load_baseline(args.baseline),
+                              args.threshold)
+        for name, before, after, ratio in regressions:
+            sys.stdout.write("REGRESSION %s: %r -> %r (%.0f%%)\n" % (
+                name, before, after, (ratio - 1) * 100))
+        if regressions:
+            return 1
+    return 1 if over else 0
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.stubs
+    ~~~~~~~~~~~~~~~~
+
+    In process stand-ins for an InfluxDB client
+
+    With `python -m benchmarks --server` the engine benchmarks use
+    `client`s of a local `pyinfluxql.testing.FakeInfluxDB` holding the same
+    series instead, so the HTTP round trip and JSON decoding are measured
+    too.
+"""
+
+import time
+import random
+from influxdb.resultset import ResultSet
+
+
+def make_series(name='cpu', tags=None, points=100, start=1433548800):
+    return {
+        'name': name,
+        'tags': tags or {},
+        'columns': ['time', 'value'],
+        'values': [[start + i * 60, float(i)] for i in range(points)]
+    }
+
+
+class StubClient(object):
+    """Answers every query with the same canned result without any I/O,
+    optionally sleeping `latency` seconds to simulate a round trip
+    """
+    def __init__(self, series=None, latency=0):
+        self.series = [make_series()] if series is None else series
+        self.latency = latency
+        self.calls = 0
+
+    def query(self, query, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return ResultSet({'statement_id': 0, 'series': self.series})
+
+
+class TailLatencyClient(StubClient):
+    """A stub whose round trip takes `latency` seconds, except for a
+    `tail_probability` fraction of queries taking `tail_latency`
+    """
+    def __init__(self, series=None, latency=0.001, tail_latency=0.05,
+                 tail_probability=0.02, seed=None):
+        super(TailLatencyClient, self).__init__(series, latency)
+        self.tail_latency = tail_latency
+        self.tail_probability = tail_probability
+        self.random = random.Random(seed)
+
+    def query(self, query, **kwargs):
+        self.calls += 1
+        if self.random.random() < self.tail_probability:
+            time.sleep(self.tail_latency)
+        else:
+            time.sleep(self.latency)
+        return ResultSet({'statement_id': 0, 'series': self.series})
+
+
+#: set by `python -m benchmarks --server`
+USE_SERVER = False
+_servers = []
+
+
+def _points(series_list):
+    for series in series_list:
+        for row in series['values']:
+            yield {'measurement': series['name'], 'tags': series['tags'],
+                   'time': row[0], 'fields': dict(zip(series['columns'][1:],
+                                                      row[1:]))}
+
+
+def client(series=None, latency=0, stored=None, tail_latency=0,
+           tail_probability=0, seed=None):
+    """A stub answering every query with `series`, or with --server a client
+    of a stand-in server holding `stored`, by default `series`, that adds
+    the same latencies to every request
+    """
+    if not USE_SERVER:
+        if tail_probability:
+            return TailLatencyClient(series, latency, tail_latency,
+                                     tail_probability, seed)
+        return StubClient(series, latency)
+    from pyinfluxql.testing import FakeInfluxDB
+    server = FakeInfluxDB(latency=latency, tail_latency=tail_latency,
+                          tail_probability=tail_probability, seed=seed)
+    _servers.append(server.start())
+    influx = server.client('bench')
+    influx.create_database('bench')
+    if stored is None:
+        stored = [make_series()] if series is None else series
+    influx.write_points(list(_points(stored)), time_precision='s',
+                        batch_size=10000)
+    return influx
@@ -8,15 +8,29 @@
 
 __version__ = '0.0.1'
 
-from .query import Query
+import sys
 
+__all__ = ['Engine', 'Query']
 
-class Engine(object):
-    def __init__(self, client):
-        self.client = client
+# the modules defining the public names, imported on first access so that
+# importing the package stays cheap
+_lazy = {'Engine': 'engine', 'Query': 'query'}
 
-    def execute(self, query):
-        return self.client.query(str(query))
 
-    def query(self, *expressions):
-        return Query(*expressions)
+def __getattr__(name):
+    if name not in _lazy:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    module = __import__('%s.%s' % (__name__, _lazy[name]), fromlist=[name])
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy))
+
+
+if sys.version_info < (3, 7):
+    # module __getattr__ needs PEP 562
+    from .query import Query  # noqa: F401
+    from .engine import Engine  # noqa: F401
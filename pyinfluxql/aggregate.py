@@ -0,0 +1,577 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.aggregate
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Client side aggregation of raw points, for math the server can't do such
+    as combining measurements or percentiles over several nodes
+
+    Every aggregate function of `pyinfluxql.functions` returning one value
+    per bucket has a streaming aggregator with a fixed size state that can be
+    merged with the state of another aggregator, percentiles and medians use
+    a t-digest and distinct counts a HyperLogLog.
+
+    >>> aggregation = Aggregation.from_query(
+    ...     Query(Mean('value'), Percentile('value', 99)).from_('cpu')
+    ...     .group_by('host', time='5m'))
+    >>> for chunk in engine.execute(aggregation.raw_query(query),
+    ...                             chunked=True, epoch='ns'):
+    ...     aggregation.add_result(chunk)
+    >>> aggregation.merge(aggregation_from_another_node)
+    >>> aggregation.result()  # like the server's result for the query
+"""
+
+import math
+import struct
+import hashlib
+from copy import deepcopy
+from datetime import date, datetime, timedelta
+
+import six
+
+from .coalesce import column_names
+from .functions import (Func, Count, Distinct, Mean, Median, Min, Max, Sum,
+                        Stddev, First, Last, Percentile)
+from .utils import (EPOCH, EPOCH_PRECISIONS, interval_to_timedelta,
+                    _utc_naive)
+
+_epoch_ordinal = EPOCH.toordinal()
+
+
+def _timedelta_ns(td):
+    return ((td.days * 86400 + td.seconds) * 1000000 + td.microseconds) * 1000
+
+
+def parse_rfc3339(value):
+    """Returns the nanoseconds since the epoch of a time like InfluxDB
+    returns them, e.g. 2015-06-06T00:00:00.5Z
+    """
+    days = date(int(value[0:4]), int(value[5:7]),
+                int(value[8:10])).toordinal() - _epoch_ordinal
+    seconds = days * 86400 + int(value[11:13]) * 3600 + \
+        int(value[14:16]) * 60 + int(value[17:19])
+    nanoseconds = 0
+    rest = value[19:]
+    if rest.startswith('.'):
+        digits = rest[1:].rstrip('Z')
+        for sign in '+-':
+            digits = digits.split(sign)[0]
+        nanoseconds = int(digits[:9].ljust(9, '0'))
+        rest = rest[1 + len(digits):]
+    if rest[:1] in ('+', '-'):
+        offset = int(rest[1:3]) * 3600 + int(rest[4:6]) * 60
+        seconds -= offset if rest[0] == '+' else -offset
+    return seconds * 1000000000 + nanoseconds
+
+
+def format_rfc3339(nanoseconds):
+    dt = EPOCH + timedelta(microseconds=nanoseconds // 1000)
+    fraction = nanoseconds % 1000000000
+    formatted = "%04d-%02d-%02dT%02d:%02d:%02d" % (
+        dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second)
+    if fraction:
+        formatted += ('.%09d' % fraction).rstrip('0')
+    return formatted + 'Z'
+
+
+class Aggregator(object):
+    """Base class for streaming aggregators. `add` consumes a point, `merge`
+    folds in the state of another aggregator of the same kind and `result`
+    returns the aggregate.
+    """
+    def add(self, time, value):
+        raise NotImplementedError
+
+    def merge(self, other):
+        raise NotImplementedError
+
+    def result(self):
+        raise NotImplementedError
+
+
+class CountAggregator(Aggregator):
+    def __init__(self):
+        self.count = 0
+
+    def add(self, time, value):
+        self.count += 1
+
+    def merge(self, other):
+        self.count += other.count
+
+    def result(self):
+        return self.count
+
+
+class SumAggregator(Aggregator):
+    def __init__(self):
+        self.sum = 0
+
+    def add(self, time, value):
+        self.sum += value
+
+    def merge(self, other):
+        self.sum += other.sum
+
+    def result(self):
+        return self.sum
+
+
+class MeanAggregator(Aggregator):
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, time, value):
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other):
+        self.count += other.count
+        self.sum += other.sum
+
+    def result(self):
+        return self.sum / self.count if self.count else None
+
+
+class MinAggregator(Aggregator):
+    def __init__(self):
+        self.min = None
+
+    def add(self, time, value):
+        if self.min is None or value < self.min:
+            self.min = value
+
+    def merge(self, other):
+        if other.min is not None:
+            self.add(None, other.min)
+
+    def result(self):
+        return self.min
+
+
+class MaxAggregator(Aggregator):
+    def __init__(self):
+        self.max = None
+
+    def add(self, time, value):
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if other.max is not None:
+            self.add(None, other.max)
+
+    def result(self):
+        return self.max
+
+
+class StddevAggregator(Aggregator):
+    """Sample standard deviation, with Welford's algorithm and Chan's
+    formula for merging
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, time, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+
+    def result(self):
+        if self.count < 2:
+            return None
+        return math.sqrt(self.m2 / (self.count - 1))
+
+
+class FirstAggregator(Aggregator):
+    """The value with the earliest time
+    """
+    def __init__(self):
+        self.time = None
+        self.value = None
+
+    def _replaces(self, time):
+        return self.time is None or time < self.time
+
+    def add(self, time, value):
+        if self._replaces(time):
+            self.time = time
+            self.value = value
+
+    def merge(self, other):
+        if other.time is not None:
+            self.add(other.time, other.value)
+
+    def result(self):
+        return self.value
+
+
+class LastAggregator(FirstAggregator):
+    """The value with the latest time
+    """
+    def _replaces(self, time):
+        return self.time is None or time > self.time
+
+
+class TDigest(object):
+    """A merging t-digest (Dunning & Ertl) estimating quantiles from a fixed
+    number of centroids, more accurate towards the tails. `compression`
+    bounds the number of centroids.
+    """
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.means = []
+        self.weights = []
+        self.count = 0
+        self.min = None
+        self.max = None
+        self._buffer = []
+        self._buffer_size = compression * 10
+
+    def add(self, value, weight=1):
+        self._buffer.append((value, weight))
+        self.count += weight
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if len(self._buffer) >= self._buffer_size:
+            self._compress()
+
+    def merge(self, other):
+        other._compress()
+        self._buffer.extend(zip(other.means, other.weights))
+        self.count += other.count
+        for value in (other.min, other.max):
+            if value is not None:
+                if self.min is None or value < self.min:
+                    self.min = value
+                if self.max is None or value > self.max:
+                    self.max = value
+        self._compress()
+
+    def _q_limit(self, q):
+        """The largest quantile a centroid starting at `q` may reach, using
+        the arcsine scale function
+        """
+        scale = self.compression / (2 * math.pi)
+        k = scale * math.asin(2 * q - 1) + 1
+        if k >= scale * math.pi / 2:
+            return 1.0
+        return (math.sin(k / scale) + 1) / 2
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        items = sorted(list(zip(self.means, self.weights)) + self._buffer)
+        self._buffer = []
+        total = float(sum(weight for _, weight in items))
+        means, weights = [], []
+        mean, weight = items[0]
+        q = 0.0
+        limit = self._q_limit(q)
+        for next_mean, next_weight in items[1:]:
+            if q + (weight + next_weight) / total <= limit:
+                weight += next_weight
+                mean += (next_mean - mean) * next_weight / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                q += weight / total
+                limit = self._q_limit(q)
+                mean, weight = next_mean, next_weight
+        means.append(mean)
+        weights.append(weight)
+        self.means, self.weights = means, weights
+
+    def quantile(self, q):
+        """Estimates the value at quantile `q` between 0 and 1
+        """
+        self._compress()
+        if not self.means:
+            return None
+        means, weights = self.means, self.weights
+        if len(means) == 1:
+            return means[0]
+        total = float(self.count)
+        index = q * total
+        if index < 1:
+            return self.min
+        if index > total - 1:
+            return self.max
+        if weights[0] > 1 and index < weights[0] / 2.0:
+            return self.min + (index - 1) / (weights[0] / 2.0 - 1) * \
+                (means[0] - self.min)
+        if weights[-1] > 1 and total - index <= weights[-1] / 2.0:
+            return self.max - (total - index - 1) / (weights[-1] / 2.0 - 1) * \
+                (self.max - means[-1])
+        so_far = weights[0] / 2.0
+        for i in range(len(means) - 1):
+            step = (weights[i] + weights[i + 1]) / 2.0
+            if so_far + step > index:
+                before = index - so_far
+                after = so_far + step - index
+                return (means[i] * after + means[i + 1] * before) / step
+            so_far += step
+        return means[-1]
+
+
+class PercentileAggregator(Aggregator):
+    def __init__(self, percentile=50, compression=100):
+        self.percentile = percentile
+        self.digest = TDigest(compression)
+
+    def add(self, time, value):
+        self.digest.add(value)
+
+    def merge(self, other):
+        self.digest.merge(other.digest)
+
+    def result(self):
+        return self.digest.quantile(self.percentile / 100.0)
+
+
+def _hash64(value):
+    digest = hashlib.md5(six.text_type(value).encode('utf-8')).digest()
+    return struct.unpack('<Q', digest[:8])[0]
+
+
+class HyperLogLog(object):
+    """Estimates the number of distinct values with 2 ** `precision` one
+    byte registers, the standard error is about 1.04 / sqrt(2 ** precision)
+    """
+    def __init__(self, precision=14):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value):
+        hashed = _hash64(value)
+        index = hashed >> (64 - self.precision)
+        rest = (hashed << self.precision) & 0xFFFFFFFFFFFFFFFF
+        rank = 65 - rest.bit_length() if rest else 65 - self.precision
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Can't merge HyperLogLogs of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(float(m) / zeros)
+        return int(round(estimate))
+
+
+class DistinctCountAggregator(Aggregator):
+    def __init__(self, precision=14):
+        self.sketch = HyperLogLog(precision)
+
+    def add(self, time, value):
+        self.sketch.add(value)
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+
+    def result(self):
+        return self.sketch.count()
+
+
+AGGREGATORS = {
+    Count: CountAggregator,
+    Sum: SumAggregator,
+    Mean: MeanAggregator,
+    Min: MinAggregator,
+    Max: MaxAggregator,
+    Stddev: StddevAggregator,
+    First: FirstAggregator,
+    Last: LastAggregator,
+    Median: PercentileAggregator,
+    Percentile: PercentileAggregator,
+}
+
+
+def _field(arg):
+    if not isinstance(arg, six.string_types) or arg.strip() == '*':
+        raise ValueError("Client side aggregation needs a field name, got %r"
+                         % (arg,))
+    return arg
+
+
+def _column(field):
+    """The name of the column the server returns for a field identifier
+    """
+    if len(field) > 1 and field[0] == '"' and field[-1] == '"':
+        return field[1:-1]
+    return field
+
+
+def aggregator_factory(func):
+    """Returns the field identifier a function reads and a callable creating
+    its aggregator. COUNT(DISTINCT(field)) counts distinct values, DISTINCT()
+    itself returns the values and isn't supported, like DERIVATIVE() and
+    other transformations.
+    """
+    if isinstance(func, Count) and isinstance(func._args[0], Distinct):
+        distinct = func._args[0]
+        if any(isinstance(a, Func) for a in distinct._args):
+            raise ValueError("%s can't be aggregated client side" %
+                             func.format())
+        return _field(distinct._args[0]), DistinctCountAggregator
+    cls = type(func)
+    if cls not in AGGREGATORS or any(isinstance(a, Func) for a in func._args):
+        raise ValueError("%s can't be aggregated client side" % func.format())
+    field = _field(func._args[0])
+    aggregator = AGGREGATORS[cls]
+    if cls is Percentile:
+        return field, lambda: aggregator(func._args[1])
+    return field, aggregator
+
+
+class Aggregation(object):
+    """Aggregates raw points with `functions` by time bucket of `interval`
+    and by the tags of each series.
+
+    Times are read as epochs of `epoch` precision, or parsed from RFC3339
+    strings when `epoch` is None, and returned the same way. Only buckets
+    with points are returned. Without an interval everything falls in one
+    bucket at `start`, like the server does for the lower time bound.
+    """
+    def __init__(self, functions, interval=None, epoch='ns', start=None):
+        self.functions = list(functions)
+        self.names = column_names(self.functions)
+        factories = [aggregator_factory(func) for func in self.functions]
+        # the identifiers to select and the columns they're returned as
+        self.selects = [field for field, _ in factories]
+        self.fields = [_column(field) for field in self.selects]
+        self._factories = [factory for _, factory in factories]
+        interval = interval_to_timedelta(interval) if interval else None
+        self.interval = _timedelta_ns(interval) if interval else None
+        self.epoch = epoch
+        self.start = start
+        # (measurement, tags) -> {bucket: [aggregator per function]}
+        self.groups = {}
+
+    @classmethod
+    def from_query(cls, query, epoch='ns'):
+        start = query.start_time
+        if isinstance(start, datetime):
+            start = _timedelta_ns(_utc_naive(start) - EPOCH)
+        return cls(query._select_expressions, query._group_by_time, epoch,
+                   start)
+
+    def raw_query(self, query):
+        """Returns `query` selecting the raw fields the functions need,
+        without the time grouping
+        """
+        raw = query.clone()
+        raw._select_expressions = []
+        for field in self.selects:
+            if field not in raw._select_expressions:
+                raw._select_expressions.append(field)
+        raw._group_by_time = None
+        raw._group_by_fill = False
+        raw._limit = None
+        raw._order = None
+        raw._order_by = []
+        raw._into_series = None
+        return raw
+
+    def _to_ns(self, time):
+        if self.epoch is None:
+            return parse_rfc3339(time)
+        return time * EPOCH_PRECISIONS[self.epoch][0]
+
+    def _from_ns(self, nanoseconds):
+        if self.epoch is None:
+            return format_rfc3339(nanoseconds)
+        return nanoseconds // EPOCH_PRECISIONS[self.epoch][0]
+
+    def add_series(self, series):
+        """Consumes the rows of one series of a raw result
+        """
+        columns = series['columns']
+        time_index = columns.index('time')
+        indexes = [columns.index(field) for field in self.fields]
+        key = (series.get('name'),
+               tuple(sorted((series.get('tags') or {}).items())))
+        buckets = self.groups.setdefault(key, {})
+        factories = self._factories
+        interval = self.interval
+        to_ns = self._to_ns
+        default_bucket = self.start or 0
+        for row in series.get('values') or []:
+            time = to_ns(row[time_index])
+            bucket = time - time % interval if interval else default_bucket
+            aggregators = buckets.get(bucket)
+            if aggregators is None:
+                aggregators = buckets[bucket] = [f() for f in factories]
+            for aggregator, index in zip(aggregators, indexes):
+                value = row[index]
+                if value is not None:
+                    aggregator.add(time, value)
+
+    def add_result(self, result):
+        """Consumes a raw result or one chunk of a chunked result
+        """
+        for series in result.raw.get('series', []):
+            self.add_series(series)
+
+    def merge(self, other):
+        """Folds in the partial state of another aggregation of the same
+        functions, e.g. over another node or time range
+        """
+        if other.names != self.names or other.interval != self.interval:
+            raise ValueError("Can only merge aggregations of the same "
+                             "functions and interval")
+        for key, other_buckets in other.groups.items():
+            buckets = self.groups.setdefault(key, {})
+            for bucket, other_aggregators in other_buckets.items():
+                aggregators = buckets.get(bucket)
+                if aggregators is None:
+                    buckets[bucket] = deepcopy(other_aggregators)
+                    continue
+                for aggregator, other_aggregator in zip(aggregators,
+                                                        other_aggregators):
+                    aggregator.merge(other_aggregator)
+        return self
+
+    def result(self):
+        """Returns the aggregates as a ResultSet with a series per tag set
+        """
+        from influxdb.resultset import ResultSet
+        series_list = []
+        for (name, tags), buckets in sorted(self.groups.items(),
+                                            key=lambda item: repr(item[0])):
+            values = []
+            for bucket in sorted(buckets):
+                row = [a.result() for a in buckets[bucket]]
+                values.append([self._from_ns(bucket)] + row)
+            series = {'name': name, 'columns': ['time'] + self.names,
+                      'values': values}
+            if tags:
+                series['tags'] = dict(tags)
+            series_list.append(series)
+        raw = {'statement_id': 0}
+        if series_list:
+            raw['series'] = series_list
+        return ResultSet(raw)
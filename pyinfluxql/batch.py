@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.batch
+    ~~~~~~~~~~~~~~~~
+
+    Renders many variations of a query at once, for backfills and fan-out
+
+    The base query is rendered once into a template with a slot for every
+    varying where clause, each column of values is formatted once, with
+    repeated values formatted only once, and every statement is a single
+    string interpolation. No Query is created per row.
+
+    >>> batch = QueryBatch(Query(Mean('value')).from_('cpu'),
+    ...                    host=hosts, time__gte=starts, time__lt=ends)
+    >>> batch.statements()[0]
+    "SELECT MEAN(value) FROM cpu WHERE host = 'a' AND time >= ... ;"
+    >>> for result in engine.execute_many(batch):
+    ...     ...
+"""
+
+from itertools import product
+
+from .functions import Expression
+from .utils import format_regex_alternation
+
+
+class _Slot(Expression):
+    """Renders as a marker that is replaced by the values of a column
+    """
+    def __init__(self, index):
+        super(_Slot, self).__init__(None)
+        self.index = index
+
+    def format(self):
+        return '\x00%i\x00' % self.index
+
+
+class QueryBatch(object):
+    """The statements of `query` with each keyword argument's where clause
+    set to the values of the given sequence, row by row. All sequences must
+    have the same length, see `product` for all combinations.
+    """
+    def __init__(self, query, **columns):
+        if not columns:
+            raise TypeError("QueryBatch takes at least one column of values")
+        self.query = query
+        self.keys = sorted(columns)
+        self.columns = [list(columns[key]) for key in self.keys]
+        lengths = set(len(column) for column in self.columns)
+        if len(lengths) != 1:
+            raise ValueError("All columns of a QueryBatch must have the same "
+                             "length")
+        for key in self.keys:
+            if key.rsplit('__', 1)[-1] in query.list_op:
+                raise ValueError("%s can't vary in a QueryBatch" % key)
+        self._template = None
+
+    @classmethod
+    def product(cls, query, **columns):
+        """A batch of every combination of the values of the columns
+        """
+        keys = sorted(columns)
+        rows = list(product(*[columns[key] for key in keys]))
+        return cls(query, **dict(
+            (key, [row[i] for row in rows]) for i, key in enumerate(keys)))
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def template(self):
+        """Returns the rendered base query as a %-format string with a %s
+        slot per column, and the order of the columns in it
+        """
+        if self._template is None:
+            query = self.query.clone()
+            for i, key in enumerate(self.keys):
+                query._where[key] = _Slot(i)
+            rendered = str(query).replace('%', '%%')
+            positions = []
+            for i, key in enumerate(self.keys):
+                marker = '\x00%i\x00' % i
+                if rendered.count(marker) != 1:
+                    raise ValueError("%s isn't rendered in %s" % (
+                        key, self.query))
+                positions.append((rendered.index(marker), i))
+                rendered = rendered.replace(marker, '%s')
+            self._template = rendered, [i for _, i in sorted(positions)]
+        return self._template
+
+    def _format_column(self, key, values):
+        regex = key.rsplit('__', 1)[-1] in ('match', 'nmatch')
+        format_value = self.query._format_value
+        formatted = {}
+        column = []
+        for value in values:
+            # keyed by type as well, 1, 1.0 and True render differently
+            cache_key = (value.__class__, value)
+            try:
+                column.append(formatted[cache_key])
+                continue
+            except (KeyError, TypeError):
+                pass
+            if regex and isinstance(value, self.query._list_types):
+                text = format_regex_alternation(value)
+            else:
+                text = format_value(value)
+            try:
+                formatted[cache_key] = text
+            except TypeError:
+                pass
+            column.append(text)
+        return column
+
+    def statements(self):
+        """Returns every statement of the batch as a string
+        """
+        template, order = self.template()
+        columns = [self._format_column(self.keys[i], self.columns[i])
+                   for i in order]
+        return [template % row for row in zip(*columns)]
+
+    def __iter__(self):
+        return iter(self.statements())
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.catalog
+    ~~~~~~~~~~~~~~~~~~
+
+    A local cache of the database schema built from SHOW statements
+
+    Entries are fetched the first time they're needed and refetched one at a
+    time once they're older than the TTL, so a long running process only pays
+    for the measurements it actually queries.
+
+    >>> catalog = Catalog(engine, ttl=300)
+    >>> query.validate(catalog)  # ValueError: ... unknown field 'valu' ...
+    >>> catalog.save('schema.json')
+"""
+
+import json
+import time
+
+from .query import (ShowMeasurements, ShowTagKeys, ShowTagValues,
+                    ShowFieldKeys, ShowSeriesCardinality)
+
+CATALOG_VERSION = 1
+
+
+def _rows(result):
+    """Yields (measurement, row) for every row of a SHOW result
+    """
+    for series in result.raw.get('series', []):
+        for row in series.get('values') or []:
+            yield series.get('name'), row
+
+
+class Catalog(object):
+    """Caches measurements, tag keys, tag values, field keys and series
+    counts. `ttl` is the age in seconds after which an entry is refetched,
+    None keeps entries until they're invalidated.
+    """
+    def __init__(self, engine, ttl=300, clock=time.time):
+        self.engine = engine
+        self.ttl = ttl
+        self.clock = clock
+        # name -> {key: (fetched at, value)}, tag_values are keyed by a
+        # (measurement, tag key) tuple
+        self._entries = {
+            'measurements': {},
+            'field_keys': {},
+            'tag_keys': {},
+            'tag_values': {},
+            'series_count': {},
+        }
+
+    def _stale(self, fetched_at):
+        return self.ttl is not None and self.clock() - fetched_at >= self.ttl
+
+    def _get(self, name, key, fetch):
+        entries = self._entries[name]
+        entry = entries.get(key)
+        if entry is None or self._stale(entry[0]):
+            entry = entries[key] = (self.clock(), fetch())
+        return entry[1]
+
+    def measurements(self):
+        """Returns the set of measurement names
+        """
+        def fetch():
+            result = self.engine.execute(ShowMeasurements())
+            return set(row[0] for _, row in _rows(result))
+        return self._get('measurements', '', fetch)
+
+    def field_keys(self, measurement):
+        """Returns a dict of the field names of `measurement` to their types
+        """
+        def fetch():
+            result = self.engine.execute(ShowFieldKeys(measurement))
+            return dict((row[0], row[1] if len(row) > 1 else None)
+                        for _, row in _rows(result))
+        return self._get('field_keys', measurement, fetch)
+
+    def tag_keys(self, measurement):
+        """Returns the set of tag keys of `measurement`
+        """
+        def fetch():
+            result = self.engine.execute(ShowTagKeys(measurement))
+            return set(row[0] for _, row in _rows(result))
+        return self._get('tag_keys', measurement, fetch)
+
+    def tag_values(self, measurement, key):
+        """Returns the set of values of tag `key` in `measurement`
+        """
+        def fetch():
+            result = self.engine.execute(ShowTagValues(key, measurement))
+            return set(row[-1] for _, row in _rows(result))
+        return self._get('tag_values', (measurement, key), fetch)
+
+    def series_count(self, measurement):
+        """Returns the number of series in `measurement`
+        """
+        def fetch():
+            result = self.engine.execute(ShowSeriesCardinality(measurement))
+            return sum(row[0] for _, row in _rows(result))
+        return self._get('series_count', measurement, fetch)
+
+    def invalidate(self, measurement=None):
+        """Drops the cached entries of `measurement`, or everything
+        """
+        for name, entries in self._entries.items():
+            if measurement is None:
+                entries.clear()
+                continue
+            for key in list(entries):
+                if key == measurement or \
+                        (name == 'tag_values' and key[0] == measurement):
+                    del entries[key]
+        if measurement is not None:
+            self._entries['measurements'].clear()
+
+    def refresh(self):
+        """Refetches the stale entries that have been loaded, returns the
+        number of entries refetched
+        """
+        getters = {
+            'measurements': lambda key: self.measurements(),
+            'field_keys': self.field_keys,
+            'tag_keys': self.tag_keys,
+            'tag_values': lambda key: self.tag_values(*key),
+            'series_count': self.series_count,
+        }
+        refreshed = 0
+        for name, entries in self._entries.items():
+            for key, (fetched_at, _) in list(entries.items()):
+                if self._stale(fetched_at):
+                    getters[name](key)
+                    refreshed += 1
+        return refreshed
+
+    def dump(self):
+        """Returns the catalog as JSON serializable data, tag values keyed by
+        a [measurement, tag key] JSON array
+        """
+        data = {'version': CATALOG_VERSION}
+        for name, entries in self._entries.items():
+            data[name] = dict(
+                (json.dumps(key) if name == 'tag_values' else key,
+                 [fetched_at,
+                  sorted(value) if isinstance(value, set) else value])
+                for key, (fetched_at, value) in entries.items())
+        return data
+
+    def load(self, data):
+        """Merges data from `dump` into the catalog. Entries keep the time
+        they were fetched at so the TTL still applies.
+        """
+        version = data.get('version')
+        if version != CATALOG_VERSION:
+            raise ValueError("Unsupported catalog version %r" % version)
+        for name, entries in self._entries.items():
+            for key, (fetched_at, value) in data.get(name, {}).items():
+                if isinstance(value, list):
+                    value = set(value)
+                if name == 'tag_values':
+                    key = tuple(json.loads(key))
+                entries[key] = (fetched_at, value)
+        return self
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.dump(), f, sort_keys=True)
+
+    @classmethod
+    def open(cls, engine, path, **kwargs):
+        """Creates a catalog from a file written by `save`
+        """
+        with open(path) as f:
+            return cls(engine, **kwargs).load(json.load(f))
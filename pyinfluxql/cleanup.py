@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.cleanup
+    ~~~~~~~~~~~~~~~~~~
+
+    Deletes large amounts of data in small pieces
+
+    A single DELETE over months of data can keep a node busy for minutes.
+    `Cleanup` splits the delete into time windows and, optionally, subsets of
+    the values of a tag, runs a few of them at a time, backs off while the
+    server is slow and records finished pieces so an interrupted cleanup can
+    be resumed.
+
+    >>> query = Query().from_('cpu').delete().date_range(start, end)
+    >>> cleanup = Cleanup(engine, query, window=timedelta(days=1),
+    ...                   tag='host', values=hosts, checkpoint='cpu.json')
+    >>> cleanup.run()
+
+    When whole series or measurements go away `DropSeries` and
+    `DropMeasurement` are much cheaper than deleting their points.
+"""
+
+import os
+import json
+import hashlib
+import time
+import threading
+from datetime import timedelta
+from multiprocessing.pool import ThreadPool
+
+from .utils import format_datetime
+
+
+def time_windows(start, end, window):
+    """Splits [start, end) into consecutive windows of at most `window`
+    """
+    windows = []
+    while start < end:
+        windows.append((start, min(start + window, end)))
+        start += window
+    return windows
+
+
+class Cleanup(object):
+    """Runs the DELETE `query`, which needs a date_range start and end, as
+    deletes of `window` long time ranges. With `tag` and `values` every
+    window is further split into deletes of `series_batch` tag values each.
+
+    Up to `concurrency` deletes run at once. When one takes longer than
+    `max_latency` seconds no new delete starts for `pause` seconds. The keys
+    of finished deletes are saved to the `checkpoint` file, and skipped when
+    a cleanup with the same checkpoint runs again. A checkpoint left by a
+    different query, window, tag, values or series_batch raises a
+    ValueError.
+    """
+    def __init__(self, engine, query, window=timedelta(days=1), tag=None,
+                 values=None, series_batch=100, concurrency=2, max_latency=5.0,
+                 pause=10.0, checkpoint=None, clock=time.time,
+                 sleep=time.sleep):
+        if not query._is_delete:
+            raise ValueError("Cleanup requires a DELETE query")
+        if query.start_time is None or query.end_time is None:
+            raise ValueError("Cleanup requires a query with a date_range "
+                             "start and end")
+        if (tag is None) != (values is None):
+            raise ValueError("tag and values go together")
+        self.engine = engine
+        self.query = query
+        self.window = window
+        self.tag = tag
+        self.values = sorted(values) if values is not None else None
+        self.series_batch = series_batch
+        self.concurrency = concurrency
+        self.max_latency = max_latency
+        self.pause = pause
+        self.checkpoint = checkpoint
+        self.clock = clock
+        self.sleep = sleep
+        self.done = self._load_checkpoint()
+        self.latencies = []
+        self.pauses = 0
+        self._resume_at = 0
+        self._lock = threading.Lock()
+
+    def _settings(self):
+        """What the keys of the pieces depend on, checked when resuming
+        """
+        values = None
+        if self.values is not None:
+            values = hashlib.sha1(json.dumps(
+                self.values, default=str).encode('utf-8')).hexdigest()
+        return {'query': str(self.query),
+                'window': self.window.total_seconds(), 'tag': self.tag,
+                'values': values, 'series_batch': self.series_batch}
+
+    def _load_checkpoint(self):
+        if self.checkpoint is None or not os.path.exists(self.checkpoint):
+            return set()
+        with open(self.checkpoint) as f:
+            checkpoint = json.load(f)
+        settings = self._settings()
+        changed = sorted(key for key, value in settings.items()
+                         if checkpoint.get(key) != value)
+        if changed:
+            raise ValueError(
+                "Checkpoint %s is for a different cleanup (%s changed), "
+                "remove it to start over" % (self.checkpoint,
+                                             ", ".join(changed)))
+        return set(checkpoint['done'])
+
+    def _save_checkpoint(self):
+        path = self.checkpoint + '.tmp'
+        checkpoint = self._settings()
+        checkpoint['done'] = sorted(self.done)
+        with open(path, 'w') as f:
+            json.dump(checkpoint, f, indent=1)
+        os.rename(path, self.checkpoint)
+
+    def _subsets(self):
+        if self.values is None:
+            return [None]
+        return [self.values[i:i + self.series_batch]
+                for i in range(0, len(self.values), self.series_batch)]
+
+    def pieces(self):
+        """Returns (key, query) for every delete the cleanup is made of,
+        including those already done
+        """
+        windows = time_windows(self.query.start_time, self.query.end_time,
+                               self.window)
+        pieces = []
+        for start, end in windows:
+            for i, subset in enumerate(self._subsets()):
+                query = self.query.clone()
+                for key in ('time__gt', 'time__gte', 'time__lt', 'time__lte'):
+                    query._where.pop(key, None)
+                # the first and last windows keep the original bounds
+                if start == self.query.start_time:
+                    lower = [k for k in ('time__gt', 'time__gte')
+                             if k in self.query._where]
+                    query._where[(lower or ['time__gte'])[0]] = start
+                else:
+                    query._where['time__gte'] = start
+                if end == self.query.end_time:
+                    upper = [k for k in ('time__lt', 'time__lte')
+                             if k in self.query._where]
+                    query._where[(upper or ['time__lt'])[0]] = end
+                else:
+                    query._where['time__lt'] = end
+                query._start_time, query._end_time = start, end
+                key = format_datetime(start).strip("'")
+                if subset is not None:
+                    query.where(**{self.tag + '__match': subset})
+                    key += ' %s[%i]' % (self.tag, i)
+                pieces.append((key, query))
+        return pieces
+
+    def _wait(self):
+        while True:
+            with self._lock:
+                delay = self._resume_at - self.clock()
+            if delay <= 0:
+                return
+            self.sleep(delay)
+
+    def _delete(self, piece):
+        key, query = piece
+        self._wait()
+        start = self.clock()
+        self.engine.execute(query)
+        latency = self.clock() - start
+        with self._lock:
+            self.latencies.append(latency)
+            if latency > self.max_latency:
+                self.pauses += 1
+                self._resume_at = self.clock() + self.pause
+            self.done.add(key)
+            if self.checkpoint is not None:
+                self._save_checkpoint()
+        return key
+
+    def run(self):
+        """Runs the deletes that aren't done yet, returns how many ran
+        """
+        pending = [piece for piece in self.pieces()
+                   if piece[0] not in self.done]
+        if self.concurrency <= 1:
+            for piece in pending:
+                self._delete(piece)
+            return len(pending)
+        pool = ThreadPool(self.concurrency)
+        try:
+            for _ in pool.imap_unordered(self._delete, pending):
+                pass
+        finally:
+            pool.close()
+            pool.join()
+        return len(pending)
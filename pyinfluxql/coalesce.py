@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.coalesce
+    ~~~~~~~~~~~~~~~~~~~
+
+    Merges queries that only differ in their select expressions into a
+    single statement, so the server scans the data once
+
+    >>> coalescer = Coalescer(engine)
+    >>> mean_cpu = coalescer.add(Query(Mean('cpu')).from_('host_stats'))
+    >>> max_cpu = coalescer.add(Query(Max('cpu')).from_('host_stats'))
+    >>> results = coalescer.execute()  # SELECT MEAN(cpu) AS _c0_0, ...
+    >>> results[mean_cpu].get_points()  # [{'time': ..., 'mean': ...}]
+"""
+
+import six
+from copy import deepcopy
+
+from .functions import (Expression, Func, Top, Distinct, SELECTORS,
+                        TRANSFORMATIONS, functions, is_aggregate)
+
+
+def column_name(expression):
+    """Returns the name InfluxDB gives the column for a select expression
+    """
+    if isinstance(expression, Expression) and expression._as:
+        return expression._as
+    if isinstance(expression, Func):
+        return expression.identifier.lower()
+    if isinstance(expression, Expression):
+        expression = expression._expression
+    expression = "%s" % expression
+    if len(expression) > 1 and expression[0] == '"' and expression[-1] == '"':
+        return expression[1:-1]
+    return expression
+
+
+def column_names(expressions):
+    """Column names for a select list, repeated names get a numeric suffix
+    like InfluxDB does, e.g. mean, mean_1
+    """
+    names = []
+    seen = {}
+    for expression in expressions:
+        name = column_name(expression)
+        if name in seen:
+            seen[name] += 1
+            name = '%s_%i' % (name, seen[name])
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _mergeable(expression, grouped_by_time):
+    """Whether a select expression can share a statement with others:
+    TOP(), BOTTOM() and DISTINCT() can't, transformations return their own
+    rows, and selectors return the time of the selected point unless
+    grouped by time
+    """
+    for function in functions(expression):
+        if isinstance(function, (Top, Distinct) + TRANSFORMATIONS):
+            return False
+        if isinstance(function, SELECTORS) and not grouped_by_time:
+            return False
+    return True
+
+
+def project_result(result, columns, names, drop_empty=False):
+    """Builds a new result keeping only `columns` of every series (besides
+    time), renamed to `names`. Rows where all kept values are null are
+    dropped when `drop_empty` is set.
+    """
+    raw = result.raw
+    projected = dict((k, v) for k, v in raw.items() if k != 'series')
+    series_list = []
+    for series in raw.get('series', []):
+        index = dict((c, i) for i, c in enumerate(series['columns']))
+        keep = [index[c] for c in columns]
+        time_index = index.get('time')
+        values = []
+        for row in series.get('values', []):
+            projected_row = [row[i] for i in keep]
+            if drop_empty and all(v is None for v in projected_row):
+                continue
+            if time_index is not None:
+                projected_row.insert(0, row[time_index])
+            values.append(projected_row)
+        if drop_empty and not values:
+            continue
+        projected_series = dict(series)
+        projected_series['columns'] = \
+            (['time'] if time_index is not None else []) + list(names)
+        projected_series['values'] = values
+        series_list.append(projected_series)
+    if series_list:
+        projected['series'] = series_list
+    return type(result)(projected)
+
+
+class Coalescer(object):
+    """Collects pending queries and executes those with identical FROM,
+    WHERE, GROUP BY, LIMIT and ORDER clauses as one statement with a merged
+    select list. Raw queries with a LIMIT and queries with fill(none) aren't
+    merged.
+    """
+    alias_format = '_c%i_%i'
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._pending = []
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, query):
+        """Queues a query, returns its index in the list `execute` returns
+        """
+        self._pending.append(query)
+        return len(self._pending) - 1
+
+    def _key(self, query):
+        """Queries with the same key can be merged, or None if the query
+        has to run on its own
+        """
+        expressions = query._select_expressions
+        if query._is_delete or query._into_series or not expressions or \
+                any(isinstance(e, six.string_types) and e.strip() == '*'
+                    for e in expressions):
+            return None
+        aggregate = [is_aggregate(e) for e in expressions]
+        if any(aggregate) and not all(aggregate):
+            return None
+        # the other queries' points would count towards a raw LIMIT, and
+        # fill(none) only drops intervals empty for every merged field
+        if not aggregate[0] and query._limit or \
+                query._group_by_fill == 'none':
+            return None
+        if not all(_mergeable(e, query._group_by_time) for e in expressions):
+            return None
+        rest = query.clone()
+        rest._select_expressions = ['']
+        return all(aggregate), str(rest)
+
+    def groups(self):
+        """Returns lists of indexes of the pending queries that can be merged
+        """
+        groups = []
+        keyed = {}
+        for i, query in enumerate(self._pending):
+            key = self._key(query)
+            if key is None:
+                groups.append([i])
+            elif key in keyed:
+                keyed[key].append(i)
+            else:
+                keyed[key] = [i]
+                groups.append(keyed[key])
+        return groups
+
+    def merge(self, indexes):
+        """Returns the merged query for the pending queries at `indexes` and
+        for each of them the aliases of its columns in the merged result
+        """
+        merged = self._pending[indexes[0]].clone()
+        merged._select_expressions = []
+        aliases = []
+        for i in indexes:
+            query_aliases = []
+            for j, expression in enumerate(self._pending[i]._select_expressions):
+                alias = self.alias_format % (i, j)
+                if isinstance(expression, Expression):
+                    expression = deepcopy(expression)
+                else:
+                    expression = Expression(expression)
+                merged._select_expressions.append(expression.as_(alias))
+                query_aliases.append(alias)
+            aliases.append(query_aliases)
+        return merged, aliases
+
+    def execute(self):
+        """Executes and clears the pending queries, returns their results in
+        the order they were added
+        """
+        pending, results = self._pending, [None] * len(self._pending)
+        for indexes in self.groups():
+            if len(indexes) == 1:
+                results[indexes[0]] = self.engine.execute(pending[indexes[0]])
+                continue
+            merged, aliases = self.merge(indexes)
+            result = self.engine.execute(merged)
+            drop_empty = not is_aggregate(pending[indexes[0]]._select_expressions[0])
+            for i, query_aliases in zip(indexes, aliases):
+                names = column_names(pending[i]._select_expressions)
+                results[i] = project_result(result, query_aliases, names,
+                                            drop_empty)
+        self._pending = []
+        return results
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.compact
+    ~~~~~~~~~~~~~~~~~~
+
+    A compact in-memory representation of query results
+
+    A `ResultSet` keeps every row as a list and `get_points` turns each into
+    a dict, so a result grouped by a few tags costs many times its payload.
+    `CompactResult` keeps every column of a series in one typed array (see
+    `pyinfluxql.decode.pack_column`), shares a single dict per distinct tag
+    set and a single tuple per distinct list of column names across the
+    response, and yields points as lazy read-only views of a row.
+
+    >>> result = engine.execute(query, format='compact')
+    >>> for point in result.get_points(tags={'host': 'a'}):
+    ...     point['value']
+    >>> result.series[0].to_numpy('value')
+"""
+
+from six.moves import intern
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from .decode import pack_column, unpack_column, OBJECT
+
+
+class Interner(object):
+    """Hands out one shared copy of every distinct tag set and column list
+    """
+    def __init__(self):
+        self.tags = {}
+        self.columns = {}
+
+    def intern_tags(self, tags):
+        if not tags:
+            return None
+        key = tuple(sorted(tags.items()))
+        try:
+            return self.tags[key]
+        except KeyError:
+            interned = dict((intern(str(k)), intern(str(v))
+                             if isinstance(v, str) else v) for k, v in key)
+            self.tags[key] = interned
+            return interned
+
+    def intern_columns(self, columns):
+        key = tuple(columns)
+        try:
+            return self.columns[key]
+        except KeyError:
+            interned = tuple(intern(str(c)) for c in key)
+            self.columns[key] = interned, dict(
+                (c, i) for i, c in enumerate(interned))
+            return self.columns[key]
+
+
+class Point(Mapping):
+    """A read-only view of one row of a `CompactSeries`
+    """
+    __slots__ = ('_series', '_row')
+
+    def __init__(self, series, row):
+        self._series = series
+        self._row = row
+
+    def __getitem__(self, column):
+        return self._series.value(self._series.index[column], self._row)
+
+    def __iter__(self):
+        return iter(self._series.columns)
+
+    def __len__(self):
+        return len(self._series.columns)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class CompactSeries(object):
+    """One series with its values packed per column
+    """
+    __slots__ = ('name', 'tags', 'columns', 'index', 'data', 'nulls',
+                 'length')
+
+    def __init__(self, name, tags, columns, index, packed):
+        self.name = name
+        self.tags = tags
+        self.columns = columns
+        self.index = index
+        self.data = [column[2] for column in packed]
+        self.nulls = [column[1] and column[0] != OBJECT for column in packed]
+        self.length = len(self.data[0]) if self.data else 0
+
+    def __len__(self):
+        return self.length
+
+    def value(self, column, row):
+        value = self.data[column][row]
+        if self.nulls[column] and value != value:
+            return None
+        return value
+
+    def column(self, name):
+        """Returns the values of a column as a list
+        """
+        i = self.index[name]
+        data = self.data[i]
+        if isinstance(data, list):
+            return data
+        if data.typecode == OBJECT:
+            return data.tolist()
+        return unpack_column(data.typecode, self.nulls[i], data)
+
+    def to_numpy(self, name):
+        """Returns a column as a NumPy array, without copying arrays or
+        spilled files. Nulls in float columns are NaN.
+        """
+        import numpy
+        data = self.data[self.index[name]]
+        if isinstance(data, list) or data.typecode == OBJECT:
+            return numpy.array(list(data), dtype=object)
+        if hasattr(data, 'to_numpy'):
+            return data.to_numpy()
+        return numpy.frombuffer(data, dtype=data.typecode)
+
+    def points(self):
+        for row in range(self.length):
+            yield Point(self, row)
+
+    def close(self):
+        """Releases the files of spilled columns, see `pyinfluxql.spill`
+        """
+        for data in self.data:
+            if hasattr(data, 'close'):
+                data.close()
+
+    def raw(self):
+        series = {'name': self.name, 'columns': list(self.columns),
+                  'values': [list(row) for row in zip(
+                      *[self.column(c) for c in self.columns])]}
+        if self.tags is not None:
+            series['tags'] = dict(self.tags)
+        return series
+
+
+class CompactResult(object):
+    """A query result with `get_points`, `keys`, `items` and `raw` like an
+    `influxdb.resultset.ResultSet`. Build one with `from_packed` or
+    `from_raw`.
+    """
+    def __init__(self, series, statement_id=None, error=None,
+                 raise_errors=True):
+        self.series = series
+        self.statement_id = statement_id
+        self.error = error
+        if error is not None and raise_errors:
+            from influxdb.exceptions import InfluxDBClientError
+            raise InfluxDBClientError(error)
+
+    @classmethod
+    def from_packed(cls, result, interner=None, raise_errors=True):
+        """Builds a result from a result dict with packed series, see
+        `pyinfluxql.decode.pack_results`
+        """
+        interner = interner or Interner()
+        series_list = []
+        for series in result.get('series', []):
+            columns, index = interner.intern_columns(series['columns'])
+            series_list.append(CompactSeries(
+                intern(str(series.get('name', 'results'))),
+                interner.intern_tags(series.get('tags')), columns, index,
+                series['packed']))
+        return cls(series_list, result.get('statement_id'),
+                   result.get('error'), raise_errors)
+
+    @classmethod
+    def from_raw(cls, result, interner=None, raise_errors=True):
+        """Builds a result from the raw dict of a ResultSet
+        """
+        packed = dict(result)
+        packed['series'] = []
+        for series in result.get('series', []):
+            values = series.get('values') or []
+            columns = list(zip(*values)) if values else \
+                [()] * len(series['columns'])
+            packed['series'].append(dict(series, packed=[
+                pack_column(column) for column in columns]))
+        return cls.from_packed(packed, interner, raise_errors)
+
+    def __len__(self):
+        return len(self.series)
+
+    def keys(self):
+        return [(series.name, series.tags) for series in self.series]
+
+    def items(self):
+        return [((series.name, series.tags), series.points())
+                for series in self.series]
+
+    def get_points(self, measurement=None, tags=None):
+        """Yields a `Point` for every row of the series matching
+        `measurement` and `tags`
+        """
+        for series in self.series:
+            if measurement is not None and series.name != measurement:
+                continue
+            if tags is None:
+                for point in series.points():
+                    yield point
+                continue
+            series_tags = series.tags or {}
+            if all(series_tags.get(k) == v for k, v in tags.items()):
+                for point in series.points():
+                    yield point
+                continue
+            if not all(k in series.index for k in tags):
+                continue
+            for point in series.points():
+                if all(point[k] == v for k, v in tags.items()):
+                    yield point
+
+    @property
+    def raw(self):
+        """The result as the dict InfluxDB returned, rebuilt on every call
+        """
+        raw = {}
+        if self.statement_id is not None:
+            raw['statement_id'] = self.statement_id
+        if self.error is not None:
+            raw['error'] = self.error
+        if self.series:
+            raw['series'] = [series.raw() for series in self.series]
+        return raw
+
+    def close(self):
+        for series in self.series:
+            series.close()
+
+    def __repr__(self):
+        return "CompactResult(%i series, %i rows)" % (
+            len(self.series), sum(len(s) for s in self.series))
+
+
+def to_compact(result, raise_errors=True):
+    """Converts a ResultSet, a list of them or a chunked result to compact
+    results, sharing tag sets and column names among them
+    """
+    interner = Interner()
+    if isinstance(result, CompactResult):
+        return result
+    if hasattr(result, 'raw'):
+        return CompactResult.from_raw(result.raw, interner, raise_errors)
+    if isinstance(result, list):
+        return [CompactResult.from_raw(r.raw, interner, raise_errors)
+                for r in result]
+    return (CompactResult.from_raw(r.raw, interner, raise_errors)
+            for r in result)
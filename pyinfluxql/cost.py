@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.cost
+    ~~~~~~~~~~~~~~~
+
+    Estimates how expensive a query is before it's sent and guards the engine
+    against queries above configurable thresholds
+
+    >>> estimator = CostEstimator(catalog, point_interval=10)
+    >>> estimator.estimate(Query('value').from_('cpu'))
+    Cost(points=3153600000, rows=3153600000, series=1000, span=...)
+    >>> engine = Engine(client, guardrail=Guardrail(estimator,
+    ...                                            max_points=10 ** 7))
+"""
+
+import re
+import math
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import six
+
+from .functions import Expression, is_aggregate
+from .utils import EPOCH, parse_interval, interval_to_timedelta, \
+    floor_datetime, _utc_naive
+
+Cost = namedtuple('Cost', ['points', 'rows', 'series', 'span'])
+
+_now_offset = re.compile(r'^now\(\)\s*-\s*(\d+[smhdw])$')
+
+
+class QueryTooExpensive(ValueError):
+    """Raised when a query is above the thresholds of a guardrail
+    """
+    def __init__(self, message, cost):
+        super(QueryTooExpensive, self).__init__(message)
+        self.cost = cost
+
+
+def _seconds(td):
+    return td.days * 86400 + td.seconds + td.microseconds / 1e6
+
+
+class CostEstimator(object):
+    """Predicts the points a query scans and the rows it returns.
+
+    Series cardinality comes from the catalog's cached SHOW SERIES counts,
+    narrowed down by equality and IN filters on tags using the number of
+    values of each tag. Without a catalog every measurement is assumed to
+    have `default_series` series. `point_interval` is the number of seconds
+    between raw points of a series and `default_span` the time range
+    assumed for queries without a lower time bound, e.g. the retention.
+    """
+    def __init__(self, catalog=None, point_interval=10, default_series=1,
+                 default_span=timedelta(days=365), clock=datetime.utcnow):
+        self.catalog = catalog
+        self.point_interval = point_interval
+        self.default_series = default_series
+        self.default_span = default_span
+        self.clock = clock
+
+    def _now(self):
+        return _utc_naive(self.clock())
+
+    def _time_bound(self, value):
+        if isinstance(value, datetime):
+            return _utc_naive(value)
+        if isinstance(value, six.integer_types) and \
+                not isinstance(value, bool):
+            # bare integers are nanosecond epochs
+            return EPOCH + timedelta(microseconds=value // 1000)
+        if isinstance(value, Expression):
+            match = _now_offset.match(value.format())
+            if match:
+                return self._now() - parse_interval(match.group(1))
+        return None
+
+    def time_range(self, query):
+        """Returns the (start, end) a query covers as naive UTC datetimes,
+        unbounded or unknown bounds are filled in from `default_span` and the
+        clock
+        """
+        start = end = None
+        for key, value in query._where.items():
+            if key in ('time__gt', 'time__gte'):
+                start = self._time_bound(value)
+            elif key in ('time__lt', 'time__lte'):
+                end = self._time_bound(value)
+        end = end or self._now()
+        return start or end - self.default_span, end
+
+    def _measurements(self, query):
+        measurement = query._measurement
+        if measurement and measurement[0] == '/' and measurement[-1] == '/':
+            regex = re.compile(measurement[1:-1])
+            return [m for m in sorted(self.catalog.measurements())
+                    if regex.search(m)]
+        if measurement and measurement[0] == '"' and measurement[-1] == '"':
+            measurement = measurement[1:-1]
+        return [measurement]
+
+    def _selectivity(self, query, measurement):
+        """The fraction of the series of `measurement` the where clause keeps
+        """
+        tags = self.catalog.tag_keys(measurement)
+        selectivity = 1.0
+        for key, value in query._where.items():
+            parts = key.split('__')
+            if len(parts) > 2 or parts[0] not in tags:
+                continue
+            comparator = parts[1] if len(parts) == 2 else 'eq'
+            if comparator == 'eq':
+                matched = 1
+            elif comparator in ('in', 'match') and \
+                    isinstance(value, query._list_types):
+                matched = len(value)
+            else:
+                continue
+            values = len(self.catalog.tag_values(measurement, parts[0]))
+            if values:
+                selectivity *= min(1.0, float(matched) / values)
+        return selectivity
+
+    def series(self, query):
+        """Estimates the number of series a query reads
+        """
+        if self.catalog is None:
+            return self.default_series
+        series = 0.0
+        for measurement in self._measurements(query):
+            series += self.catalog.series_count(measurement) * \
+                self._selectivity(query, measurement)
+        return int(math.ceil(series))
+
+    def estimate(self, query):
+        series = self.series(query)
+        start, end = self.time_range(query)
+        span = max(end - start, timedelta(0))
+        points = int(series * _seconds(span) / self.point_interval)
+        expressions = query._select_expressions
+        if expressions and all(is_aggregate(e) for e in expressions):
+            groups = series if query._group_by else min(series, 1)
+            interval = interval_to_timedelta(query._group_by_time)
+            buckets = 1
+            if interval:
+                buckets = max(1, int(math.ceil(
+                    _seconds(span) / _seconds(interval))))
+            rows = groups * buckets
+        else:
+            groups = series
+            rows = points
+        if query._limit:
+            rows = min(rows, query._limit * max(groups, 1))
+            if not (expressions and all(is_aggregate(e) for e in expressions)):
+                points = min(points, rows)
+        return Cost(points, rows, series, span)
+
+
+class Guardrail(object):
+    """Checks queries against `max_points` scanned and `max_rows` returned.
+
+    Above a threshold the query is rejected with `QueryTooExpensive`, or
+    with `action='limit'` raw queries get a LIMIT keeping them under the
+    thresholds, or with `action='shard'` the date range is split into up to
+    `max_shards` windows that are each under `max_points`. Windows are
+    aligned to the group by interval so aggregates stay correct.
+    """
+    actions = ('reject', 'limit', 'shard')
+
+    def __init__(self, estimator, max_points=None, max_rows=None,
+                 action='reject', max_shards=100):
+        if action not in self.actions:
+            raise ValueError("action must be one of %s" % ", ".join(
+                self.actions))
+        self.estimator = estimator
+        self.max_points = max_points
+        self.max_rows = max_rows
+        self.action = action
+        self.max_shards = max_shards
+
+    def _over(self, cost):
+        return (self.max_points is not None and cost.points > self.max_points,
+                self.max_rows is not None and cost.rows > self.max_rows)
+
+    def _reject(self, query, cost):
+        raise QueryTooExpensive(
+            "Query would scan ~%i points and return ~%i rows from %i series "
+            "(max points %s, max rows %s): %s" % (
+                cost.points, cost.rows, cost.series, self.max_points,
+                self.max_rows, query), cost)
+
+    def limit(self, query, cost):
+        """Returns the query with a LIMIT under the thresholds, or None if a
+        limit doesn't help
+        """
+        if query._select_expressions and \
+                all(is_aggregate(e) for e in query._select_expressions):
+            return None
+        per_series = min(x for x in (self.max_points, self.max_rows)
+                         if x is not None) // max(cost.series, 1)
+        if per_series < 1:
+            return None
+        if query._limit:
+            per_series = min(per_series, query._limit)
+        return query.clone().limit(per_series)
+
+    def shard(self, query, cost):
+        """Returns the query split into windows under `max_points`, or None
+        if it can't be split
+        """
+        if self.max_points is None or any(self._over(cost)[1:]):
+            return None
+        expressions = query._select_expressions
+        aggregate = expressions and all(is_aggregate(e) for e in expressions)
+        interval = interval_to_timedelta(query._group_by_time)
+        if aggregate and not interval:
+            return None
+        if 'time__gt' not in query._where and 'time__gte' not in query._where:
+            return None
+        start, end = self.estimator.time_range(query)
+        parts = int(math.ceil(float(cost.points) / self.max_points))
+        if parts > self.max_shards:
+            return None
+        step = (end - start) / parts
+        bounds = [start]
+        for i in range(1, parts):
+            bound = start + step * i
+            if interval:
+                bound = floor_datetime(bound, interval)
+            if bound > bounds[-1]:
+                bounds.append(bound)
+        bounds.append(end)
+        shards = []
+        for i in range(len(bounds) - 1):
+            shard = query.clone()
+            for key in ('time__gt', 'time__gte', 'time__lt', 'time__lte'):
+                shard._where.pop(key, None)
+            if i == 0 and 'time__gt' in query._where:
+                shard._where['time__gt'] = bounds[0]
+            else:
+                shard._where['time__gte'] = bounds[i]
+            if i < len(bounds) - 2:
+                shard._where['time__lt'] = bounds[i + 1]
+            else:
+                # the last window keeps the original upper bound, if any
+                for key in ('time__lt', 'time__lte'):
+                    if key in query._where:
+                        shard._where[key] = query._where[key]
+            shard._start_time, shard._end_time = bounds[i], bounds[i + 1]
+            shards.append(shard)
+        if query._order == 'DESC':
+            shards.reverse()
+        return shards
+
+    def check(self, query):
+        """Returns the list of queries to run in place of `query`, raises
+        `QueryTooExpensive` if it's over the thresholds and can't be fixed
+        """
+        cost = self.estimator.estimate(query)
+        if not any(self._over(cost)):
+            return [query]
+        if self.action == 'limit':
+            limited = self.limit(query, cost)
+            if limited is not None and \
+                    not any(self._over(self.estimator.estimate(limited))):
+                return [limited]
+        elif self.action == 'shard':
+            shards = self.shard(query, cost)
+            if shards is not None:
+                return shards
+        self._reject(query, cost)
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.dataframe
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Converts query results to pandas DataFrames straight from the column and
+    value arrays of the response, without building a dict per point
+"""
+
+EPOCH_UNITS = {'h': 'h', 'm': 'm', 's': 's', 'ms': 'ms', 'u': 'us', 'ns': 'ns'}
+
+
+_numeric_types = frozenset([int, float, type(None)])
+
+
+def _pandas():
+    try:
+        import numpy
+        import pandas
+    except ImportError:
+        raise ImportError("pandas is required for DataFrame output")
+    return numpy, pandas
+
+
+def _series_key(series):
+    return (series.get('name'), tuple(sorted((series.get('tags') or {}).items())))
+
+
+def _to_datetime(pd, times, epoch):
+    if epoch:
+        return pd.to_datetime(times, unit=EPOCH_UNITS[epoch], utc=True)
+    try:
+        return pd.to_datetime(times, utc=True, format='ISO8601')
+    except ValueError:
+        # pandas < 2.0 parses RFC3339 without being told to
+        return pd.to_datetime(times, utc=True)
+
+
+def _column_array(np, values):
+    """Converts one column of a series to a compact array, numbers with
+    nulls become floats with NaNs and anything else an object array
+    """
+    types = set(map(type, values))
+    if types <= _numeric_types:
+        if type(None) in types or float in types:
+            return np.array(values, dtype=float)
+        return np.array(values, dtype=np.int64)
+    return np.array(values, dtype=object)
+
+
+def _series_columns(np, series):
+    """Returns the columns of a series as a dict of arrays
+    """
+    values = series.get('values') or []
+    if not values:
+        return dict((column, np.array([], dtype=object))
+                    for column in series['columns'])
+    return dict((column, _column_array(np, col))
+                for column, col in zip(series['columns'], zip(*values)))
+
+
+def _series_frame(np, pd, series, epoch):
+    data = _series_columns(np, series)
+    index = None
+    if 'time' in data:
+        index = pd.DatetimeIndex(_to_datetime(pd, data.pop('time'), epoch),
+                                 name='time')
+    return pd.DataFrame(data, index=index, copy=False,
+                        columns=[c for c in series['columns'] if c != 'time'])
+
+
+def to_dataframe(result, per_series=False, epoch=None):
+    """Converts a result to a DataFrame indexed by a UTC DatetimeIndex.
+
+    Results with tags, i.e. from queries with a GROUP BY on tags, get a
+    MultiIndex of the tags and time with the tag values stored as
+    categoricals. If the result covers more than one measurement the
+    measurement name is the first level of the index.
+
+    With `per_series` a dict of DataFrames keyed by
+    (measurement, ((tag, value), ...)) is returned instead.
+
+    `epoch` is the precision of the timestamps if the query was run with
+    an epoch, e.g. 'ms'.
+    """
+    np, pd = _pandas()
+    series_list = result.raw.get('series', [])
+    if per_series:
+        return dict((_series_key(series), _series_frame(np, pd, series, epoch))
+                    for series in series_list)
+
+    tag_keys = sorted(set(
+        key for series in series_list for key in (series.get('tags') or {})))
+    names = sorted(set(series.get('name') for series in series_list),
+                   key=lambda name: name or '')
+    levels = (['measurement'] if len(names) > 1 else []) + tag_keys
+
+    columns = []
+    for series in series_list:
+        for column in series['columns']:
+            if column != 'time' and column not in columns:
+                columns.append(column)
+    # every column is collected as a list of per series arrays and joined
+    # once at the end
+    chunks = dict((column, []) for column in columns + ['time'])
+    # the categories of each index level, mapped to their codes
+    categories = dict((level, {}) for level in levels)
+    codes = dict((level, []) for level in levels)
+    for series in series_list:
+        length = len(series.get('values') or [])
+        if not length:
+            continue
+        data = _series_columns(np, series)
+        for column in columns + ['time']:
+            if column in data:
+                chunks[column].append(data[column])
+            else:
+                chunks[column].append(np.full(length, np.nan))
+        tags = dict(series.get('tags') or {})
+        tags['measurement'] = series.get('name')
+        for level in levels:
+            value = tags.get(level)
+            code = -1
+            if value is not None:
+                code = categories[level].setdefault(value, len(categories[level]))
+            codes[level].append(np.full(length, code, dtype=np.int32))
+
+    def join(arrays, dtype=object):
+        return np.concatenate(arrays) if arrays else np.array([], dtype=dtype)
+
+    index = pd.DatetimeIndex(_to_datetime(pd, join(chunks.pop('time')), epoch),
+                             name='time')
+    if levels:
+        arrays = [pd.Categorical.from_codes(
+            join(codes[level], np.int32),
+            categories=sorted(categories[level], key=categories[level].get))
+            for level in levels]
+        index = pd.MultiIndex.from_arrays(arrays + [index],
+                                          names=levels + ['time'])
+    data = dict((column, join(chunks.pop(column))) for column in columns)
+    return pd.DataFrame(data, index=index, columns=columns, copy=False)
@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.decode
+    ~~~~~~~~~~~~~~~~~
+
+    Pluggable decoding of query responses
+
+    `Decoder` decodes response bodies with the fastest JSON library
+    installed, orjson or ujson, or the standard library. Bodies above
+    `offload_threshold` bytes are decoded in a process pool so the calling
+    process doesn't hold the GIL for seconds: the worker packs every series
+    into typed columns in shared memory and only a small description of
+    them is pickled back.
+
+    >>> engine = Engine(client, decoder=Decoder('orjson',
+    ...                                         offload_threshold=2 ** 25))
+
+    Offloading needs `multiprocessing.shared_memory` (Python 3.8), without it
+    the packed columns are pickled back instead.
+"""
+
+import os
+import json
+from array import array
+
+import six
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+#: tried in order by Decoder('auto')
+DECODERS = ('orjson', 'ujson', 'json')
+
+#: typecodes of packed columns, object columns are kept as lists
+INTEGER, FLOAT, OBJECT = 'q', 'd', 'o'
+
+#: bytes read at a time from chunked responses, requests reads 512 by
+#: default which makes splitting long lines quadratic
+LINE_BUFFER = 2 ** 16
+
+_nan = float('nan')
+
+
+def _json_loads(body):
+    if isinstance(body, bytes):
+        body = body.decode('utf-8')
+    return json.loads(body)
+
+
+def get_decoder(name='auto'):
+    """Returns a function decoding a JSON body for the name of a library,
+    or the first one of `DECODERS` that's installed for 'auto'. Callables
+    are returned as is.
+    """
+    if callable(name):
+        return name
+    if name == 'auto':
+        for candidate in DECODERS:
+            try:
+                return get_decoder(candidate)
+            except ImportError:
+                continue
+    if name == 'json':
+        return _json_loads
+    if name == 'orjson':
+        try:
+            import orjson
+        except ImportError:
+            raise ImportError("orjson is required for the orjson decoder")
+        return orjson.loads
+    if name == 'ujson':
+        try:
+            import ujson
+        except ImportError:
+            raise ImportError("ujson is required for the ujson decoder")
+        return ujson.loads
+    raise ValueError("Unknown decoder %r, expected one of %s" % (
+        name, ", ".join(DECODERS)))
+
+
+def pack_column(values):
+    """Packs a column of values into (typecode, has_nulls, data). Integers
+    without nulls go into an int64 array, floats into a float64 array with
+    NaN for nulls, whole numbers in a float column included, and anything
+    else is kept as a list.
+    """
+    kinds = set(map(type, values))
+    has_nulls = type(None) in kinds
+    kinds.discard(type(None))
+    if kinds and kinds <= set(six.integer_types) and not has_nulls:
+        try:
+            return INTEGER, False, array(INTEGER, values)
+        except OverflowError:
+            pass
+    elif float in kinds and kinds <= set((float,) + six.integer_types):
+        if has_nulls:
+            values = [_nan if v is None else v for v in values]
+        return FLOAT, has_nulls, array(FLOAT, values)
+    return OBJECT, has_nulls, list(values)
+
+
+def unpack_column(typecode, has_nulls, data):
+    """Returns the values of a packed column as a list
+    """
+    if typecode == OBJECT:
+        return data
+    values = data.tolist()
+    if has_nulls:
+        values = [None if v != v else v for v in values]
+    return values
+
+
+def pack_results(data):
+    """Replaces the values of every series of a decoded response with a
+    'packed' list of columns, see `pack_column`
+    """
+    for result in data.get('results', []):
+        for series in result.get('series', []):
+            values = series.pop('values', None) or []
+            if values:
+                columns = list(zip(*values))
+            else:
+                columns = [()] * len(series['columns'])
+            series['packed'] = [pack_column(c) for c in columns]
+    return data
+
+
+def unpack_results(data):
+    """Turns packed series back into rows of values
+    """
+    for result in data.get('results', []):
+        for series in result.get('series', []):
+            columns = [unpack_column(*c) for c in series.pop('packed')]
+            series['values'] = [list(row) for row in zip(*columns)]
+    return data
+
+
+def _packed_arrays(data):
+    for result in data.get('results', []):
+        for series in result.get('series', []):
+            packed = series['packed']
+            for i, column in enumerate(packed):
+                if column[0] != OBJECT:
+                    yield packed, i
+
+
+def to_shared_memory(data):
+    """Moves the arrays of packed results into one shared memory block,
+    replacing them by (offset, length). Returns the block's name, or None
+    without arrays or shared memory.
+    """
+    arrays = list(_packed_arrays(data))
+    if shared_memory is None or not arrays:
+        return None
+    size = sum(len(packed[i][2]) * packed[i][2].itemsize
+               for packed, i in arrays)
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        offset = 0
+        for packed, i in arrays:
+            typecode, has_nulls, values = packed[i]
+            raw = values.tobytes()
+            block.buf[offset:offset + len(raw)] = raw
+            packed[i] = (typecode, has_nulls, (offset, len(values)))
+            offset += len(raw)
+    finally:
+        block.close()
+    # the process reading the block unlinks it, don't let this process'
+    # resource tracker unlink it as well. It only tracks POSIX blocks, by
+    # their name with a leading slash.
+    if os.name == 'posix':
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister('/' + block.name, 'shared_memory')
+    return block.name
+
+
+def from_shared_memory(data, name):
+    """Copies the arrays of packed results back out of the shared memory
+    block `name` and frees it
+    """
+    if name is None:
+        return data
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        for packed, i in list(_packed_arrays(data)):
+            typecode, has_nulls, (offset, length) = packed[i]
+            values = array(typecode)
+            end = offset + length * values.itemsize
+            values.frombytes(bytes(block.buf[offset:end]))
+            packed[i] = (typecode, has_nulls, values)
+    finally:
+        block.close()
+        block.unlink()
+    return data
+
+
+def decode_packed(body, decoder='json'):
+    """Decodes a body into packed results in shared memory, this runs in
+    the worker processes
+    """
+    data = pack_results(get_decoder(decoder)(body))
+    return data, to_shared_memory(data)
+
+
+class Decoder(object):
+    """Decodes response bodies with `decoder`, the name of a JSON library
+    or a function taking bytes. Bodies of at least `offload_threshold`
+    bytes are decoded by a pool of `processes` worker processes, created on
+    first use.
+
+    Compact results holding more than `spill_budget` bytes of columns are
+    moved to memory-mapped files in `spill_dir`, see `pyinfluxql.spill`.
+    """
+    def __init__(self, decoder='auto', offload_threshold=None,
+                 processes=None, spill_budget=None, spill_dir=None):
+        if decoder == 'auto':
+            for decoder in DECODERS:
+                try:
+                    get_decoder(decoder)
+                    break
+                except ImportError:
+                    continue
+        # worker processes get the decoder by name, functions have to be
+        # picklable
+        self.name = decoder
+        self.decoder = get_decoder(decoder)
+        self.offload_threshold = offload_threshold
+        self.processes = processes
+        self.spill_budget = spill_budget
+        self.spill_dir = spill_dir
+        self.offloaded = 0
+        self._pool = None
+
+    def offloads(self, body):
+        return self.offload_threshold is not None and \
+            len(body) >= self.offload_threshold
+
+    def decode(self, body):
+        """Returns the decoded response
+        """
+        if not self.offloads(body):
+            return self.decoder(body)
+        return unpack_results(self.decode_packed(body))
+
+    def decode_packed(self, body):
+        """Returns the decoded response with packed columns instead of
+        values, see `pack_results`
+        """
+        if not self.offloads(body):
+            return pack_results(self.decoder(body))
+        if self._pool is None:
+            from multiprocessing import Pool
+            self._pool = Pool(self.processes)
+        self.offloaded += 1
+        data, name = self._pool.apply(decode_packed,
+                                      (body, self.name))
+        return from_shared_memory(data, name)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+class DecodingClient(object):
+    """Wraps an `influxdb.InfluxDBClient` so that query responses are
+    requested as JSON and decoded by a `Decoder`. Other attributes are
+    looked up on the client.
+
+    With `compact=True` queries return `pyinfluxql.compact.CompactResult`
+    built straight from the packed columns, without rows of values. If the
+    decoder has a `spill_budget` the chunks of a chunked query are gathered
+    into one result, spilled to files past the budget.
+    """
+    compact_results = True
+
+    def __init__(self, client, decoder=None):
+        self.client = client
+        self.decoder = decoder if decoder is not None else Decoder()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def request(self, query, params=None, bind_params=None, epoch=None,
+                expected_response_code=200, database=None, chunked=False,
+                chunk_size=0, method='GET'):
+        """Sends a query the way `InfluxDBClient.query` does, returns the
+        response
+        """
+        params = dict(params or {})
+        if bind_params is not None:
+            bound = json.loads(params.get('params', '{}'))
+            bound.update(bind_params)
+            params['params'] = json.dumps(bound)
+        params['q'] = query
+        # InfluxDBClient keeps its database and headers private
+        database = database or getattr(self.client, '_database', None)
+        if database is not None:
+            params['db'] = database
+        if epoch is not None:
+            params['epoch'] = epoch
+        if chunked:
+            params['chunked'] = 'true'
+            if chunk_size > 0:
+                params['chunk_size'] = chunk_size
+        lower = query.lower()
+        if lower.startswith('select ') and ' into ' in lower:
+            method = 'POST'
+        headers = dict(getattr(self.client, '_headers', None) or {},
+                       Accept='application/json')
+        return self.client.request(
+            url='query', method=method, params=params, data=None,
+            stream=chunked, expected_response_code=expected_response_code,
+            headers=headers)
+
+    def query(self, query, raise_errors=True, compact=False, **kwargs):
+        from influxdb.resultset import ResultSet
+        response = self.request(query, **kwargs)
+        if compact and self.decoder.spill_budget is not None:
+            return self._spilled(response, raise_errors, kwargs.get('chunked'))
+        if kwargs.get('chunked'):
+            return self._chunks(response, raise_errors, compact)
+        if compact:
+            from .compact import CompactResult, Interner
+            data = self.decoder.decode_packed(response.content)
+            interner = Interner()
+            results = [CompactResult.from_packed(result, interner,
+                                                 raise_errors)
+                       for result in data.get('results', [])]
+        else:
+            data = self.decoder.decode(response.content)
+            results = [ResultSet(result, raise_errors=raise_errors)
+                       for result in data.get('results', [])]
+        if len(results) == 1:
+            return results[0]
+        return results
+
+    def _chunks(self, response, raise_errors, compact=False):
+        from influxdb.resultset import ResultSet
+        from .compact import CompactResult, Interner
+        decode = self.decoder.decoder
+        interner = Interner()
+        for line in response.iter_lines(chunk_size=LINE_BUFFER):
+            if not line:
+                continue
+            chunk = {}
+            for result in decode(line).get('results', []):
+                for key, value in result.items():
+                    if isinstance(value, list):
+                        chunk.setdefault(key, []).extend(value)
+            if compact:
+                yield CompactResult.from_raw(chunk, interner, raise_errors)
+            else:
+                yield ResultSet(chunk, raise_errors=raise_errors)
+
+    def _spilled(self, response, raise_errors, chunked):
+        from collections import OrderedDict
+        from .spill import ResultBuilder
+        builders = OrderedDict()
+        if chunked:
+            # a chunk is decoded and packed at a time, never the response
+            lines = response.iter_lines(chunk_size=LINE_BUFFER)
+            lines = (line for line in lines if line)
+            responses = (pack_results(self.decoder.decoder(line))
+                         for line in lines)
+        else:
+            responses = [self.decoder.decode_packed(response.content)]
+        for data in responses:
+            for result in data.get('results', []):
+                key = result.get('statement_id')
+                if key not in builders:
+                    builders[key] = ResultBuilder(self.decoder.spill_budget,
+                                                  self.decoder.spill_dir)
+                builders[key].add(result)
+        results = [builder.result(raise_errors)
+                   for builder in builders.values()]
+        if len(results) == 1:
+            return results[0]
+        return results
+
+    def close(self):
+        self.decoder.close()
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.densify
+    ~~~~~~~~~~~~~~~~~~
+
+    Rebuilds the full time bucket grid of a GROUP BY time result client side
+
+    A sparse series grouped by a short interval is mostly empty buckets, and
+    with fill(0) every one of them goes over the wire. Querying with
+    fill(none) only ships the buckets with points, `densify` then puts the
+    empty ones back with NumPy, filled like the server would.
+
+    >>> sparse = query.clone().group_by(fill='none')
+    >>> result = densify(engine.execute(sparse, epoch='s'), query, fill=0,
+    ...                  epoch='s')
+
+    or `Engine.execute_dense(query, fill=0, epoch='s')`.
+"""
+
+from datetime import datetime
+
+from influxdb.resultset import ResultSet
+
+from .aggregate import _timedelta_ns, parse_rfc3339, format_rfc3339
+from .utils import (EPOCH, EPOCH_PRECISIONS, interval_to_timedelta,
+                    format_fill, parse_fill, _utc_naive)
+
+_integer_types = frozenset([int])
+_numeric_types = frozenset([int, float])
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("numpy is required to densify results")
+    return numpy
+
+
+def _bound_ns(value):
+    """Returns a date_range bound as nanoseconds, or None when it isn't an
+    absolute time
+    """
+    if isinstance(value, datetime):
+        return _timedelta_ns(_utc_naive(value) - EPOCH)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def _times_ns(np, times, epoch):
+    if epoch is None:
+        return np.array([parse_rfc3339(t) for t in times], dtype=np.int64)
+    return np.array(times, dtype=np.int64) * EPOCH_PRECISIONS[epoch][0]
+
+
+def _fill_column(np, grid, positions, values, fill):
+    """Returns one column spread over the grid with the gaps filled, as a
+    list with None for nulls
+    """
+    n = len(grid)
+    kinds = set(map(type, values))
+    kinds.discard(type(None))
+    numeric = kinds <= _numeric_types
+    integer = bool(kinds) and kinds <= _integer_types and \
+        not isinstance(fill, float)
+    if numeric:
+        column = np.full(n, np.nan)
+        column[positions] = np.array(values, dtype=float)
+        valid = ~np.isnan(column)
+    else:
+        column = np.empty(n, dtype=object)
+        column[positions] = values
+        valid = np.zeros(n, dtype=bool)
+        valid[positions] = [v is not None for v in values]
+
+    if fill == 'previous':
+        index = np.where(valid, np.arange(n), -1)
+        np.maximum.accumulate(index, out=index)
+        column = column[index]
+        valid = index >= 0
+    elif fill == 'linear':
+        known = np.flatnonzero(valid)
+        if numeric and len(known) > 1:
+            gaps = ~valid
+            gaps[:known[0]] = False
+            gaps[known[-1]:] = False
+            column[gaps] = np.interp(grid[gaps], grid[known], column[known])
+            if integer:
+                column[gaps] = np.trunc(column[gaps])
+            valid |= gaps
+    elif fill != 'null':
+        column[~valid] = fill
+        valid[:] = True
+
+    if integer:
+        column = np.where(valid, column, 0).astype(np.int64)
+    filled = np.array(column.tolist(), dtype=object)
+    filled[~valid] = None
+    return filled.tolist()
+
+
+def densify(result, query, fill=None, epoch=None, end=None):
+    """Returns a ResultSet with a row for every `query._group_by_time`
+    bucket of the query's date_range, filled with `fill`, by default the
+    fill of the query or nulls. Times are epochs of `epoch` precision or
+    RFC3339 strings when it's None, like the result's.
+
+    Without absolute date_range bounds the grid spans the buckets of the
+    result, or ends before `end`, in nanoseconds. Series without any points
+    in the result can't be recovered. A list of results is densified
+    result by result.
+    """
+    if isinstance(result, list):
+        return [densify(r, query, fill, epoch, end) for r in result]
+    np = _numpy()
+    interval = interval_to_timedelta(query._group_by_time) \
+        if query._group_by_time else None
+    if interval is None:
+        raise ValueError("densify needs a GROUP BY time interval, got %r" % (
+            query._group_by_time,))
+    step = _timedelta_ns(interval)
+    if fill is None:
+        fill = query._group_by_fill or 'null'
+    else:
+        fill = format_fill(fill) or 'null'
+    fill = parse_fill(fill)
+    raw = result.raw
+    if fill == 'none':
+        return ResultSet(raw)
+
+    series_list = raw.get('series') or []
+    times = [_times_ns(np, [row[0] for row in s.get('values') or []], epoch)
+             for s in series_list]
+    seen = [t for t in times if len(t)]
+    lower = _bound_ns(query.start_time)
+    if lower is None:
+        if not seen:
+            return ResultSet(raw)
+        lower = min(int(t.min()) for t in seen)
+    upper = _bound_ns(query.end_time)
+    if upper is None:
+        upper = end
+    if upper is None:
+        if not seen:
+            return ResultSet(raw)
+        upper = max(int(t.max()) for t in seen) + 1
+    lower -= lower % step
+    grid = np.arange(lower, upper, step, dtype=np.int64)
+    if epoch is None:
+        grid_times = [format_rfc3339(t) for t in grid.tolist()]
+    else:
+        grid_times = (grid // EPOCH_PRECISIONS[epoch][0]).tolist()
+
+    dense = dict(raw)
+    dense['series'] = []
+    for series, series_times in zip(series_list, times):
+        positions = (series_times - lower) // step
+        keep = (positions >= 0) & (positions < len(grid))
+        positions = positions[keep]
+        rows = [row for row, kept in zip(series.get('values') or [],
+                                         keep.tolist()) if kept]
+        columns = [grid_times]
+        for i in range(1, len(series['columns'])):
+            columns.append(_fill_column(np, grid, positions,
+                                        [row[i] for row in rows], fill))
+        values = [list(row) for row in zip(*columns)]
+        if query._order == 'DESC':
+            values.reverse()
+        if query._limit:
+            values = values[:query._limit]
+        dense['series'].append(dict(series, values=values))
+    return ResultSet(dense)
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.engine
+    ~~~~~~~~~~~~~~~~~
+
+    Executes queries with an InfluxDB client
+"""
+
+from itertools import chain
+
+try:
+    from collections.abc import Iterator
+except ImportError:
+    from collections import Iterator
+
+from .query import Query, Show, DropSeries
+
+
+class Engine(object):
+    """Executes queries with `client`. Given a list of replica clients
+    queries are spread over them and slow ones hedged on another replica
+    after the `hedge_percentile` latency, see `pyinfluxql.hedge`.
+
+    With a `pyinfluxql.decode.Decoder`, or the name of a JSON library, the
+    responses of InfluxDB clients are decoded by it.
+
+    With a `pyinfluxql.profiler.Profiler` every `execute` is timed and
+    recorded by the shape of its query, a chunked query once its chunks
+    are consumed.
+    """
+    def __init__(self, client, guardrail=None, hedge_percentile=95,
+                 decoder=None, profiler=None):
+        if decoder is not None:
+            from .decode import Decoder, DecodingClient
+            if not isinstance(decoder, Decoder):
+                decoder = Decoder(decoder)
+            if isinstance(client, (list, tuple)):
+                client = [DecodingClient(c, decoder) for c in client]
+            else:
+                client = DecodingClient(client, decoder)
+        if isinstance(client, (list, tuple)):
+            from .hedge import HedgedClient
+            client = HedgedClient(client, percentile=hedge_percentile)
+        self.client = client
+        self.guardrail = guardrail
+        self.profiler = profiler
+
+    def _guarded(self, query):
+        return self.guardrail is not None and isinstance(query, Query) and \
+            not isinstance(query, (Show, DropSeries)) and not query._is_delete
+
+    def execute(self, query, format=None, **kwargs):
+        """Executes a query, keyword arguments are passed on to the client.
+
+        With `format='dataframe'` the result is converted to a pandas
+        DataFrame, see `pyinfluxql.dataframe.to_dataframe`. With
+        `format='compact'` it's a `pyinfluxql.compact.CompactResult`, built
+        directly from the response when the engine has a decoder.
+
+        If the engine has a `pyinfluxql.cost.Guardrail` the query is checked
+        against it first, and may be rejected, limited or run in shards whose
+        results are joined back together.
+        """
+        if self.profiler is None:
+            return self._execute(query, format, **kwargs)
+        clock = self.profiler.clock
+        started = clock()
+        try:
+            result = self._execute(query, format, **kwargs)
+        except Exception:
+            self.profiler.record(query, clock() - started, error=True)
+            raise
+        if kwargs.get('chunked') and isinstance(result, Iterator):
+            # chunks are only requested as they're consumed
+            return self.profiler.record_chunks(query, result, started)
+        self.profiler.record(query, clock() - started, result)
+        return result
+
+    def _execute(self, query, format=None, **kwargs):
+        queries = [query]
+        if self._guarded(query):
+            queries = self.guardrail.check(query)
+        compact = format == 'compact' and len(queries) == 1 and \
+            getattr(self.client, 'compact_results', False)
+        if compact:
+            kwargs['compact'] = True
+        if len(queries) == 1:
+            result = self.client.query(str(queries[0]), **kwargs)
+        elif kwargs.get('chunked'):
+            result = chain.from_iterable(
+                self.client.query(str(q), **kwargs) for q in queries)
+        else:
+            result = concat_results(
+                [self.client.query(str(q), **kwargs) for q in queries],
+                limit=query._limit)
+        if format == 'dataframe':
+            from .dataframe import to_dataframe
+            return to_dataframe(result, epoch=kwargs.get('epoch'))
+        elif format == 'compact':
+            if compact:
+                return result
+            from .compact import to_compact
+            return to_compact(result)
+        elif format is not None:
+            raise ValueError("Unknown result format %r" % format)
+        return result
+
+    def query(self, *expressions):
+        return Query(*expressions)
+
+    def execute_dense(self, query, fill=None, end=None, **kwargs):
+        """Executes a GROUP BY time query with fill(none) and rebuilds the
+        empty buckets client side, filled with `fill` or the query's fill,
+        see `pyinfluxql.densify.densify`
+        """
+        from .densify import densify
+        sparse = query.clone().group_by(fill='none')
+        result = self.execute(sparse, **kwargs)
+        return densify(result, query, fill, epoch=kwargs.get('epoch'),
+                       end=end)
+
+    def tail(self, query, interval, window=None, max_rows=10000, ticks=None,
+             **kwargs):
+        """Returns a `pyinfluxql.tail.Tail` running `query` once and then
+        every `interval` seconds only for the points after the last one
+        seen, yielding the new rows. The last `window` seconds, at most
+        `max_rows` per series, are kept in memory.
+        """
+        from .tail import Tail
+        return Tail(self, query, interval, window, max_rows, ticks, **kwargs)
+
+    def export(self, query, path, format='parquet', chunk_size=10000, jobs=1):
+        """Streams the result of a query into a Parquet or Arrow file, see
+        `pyinfluxql.export.export`. Returns the paths written.
+        """
+        from .export import export
+        return export(self, query, path, format, chunk_size, jobs)
+
+    def aggregate(self, query, chunk_size=10000):
+        """Runs the aggregate `query` as a raw query and computes the
+        functions client side in constant memory per time bucket, see
+        `pyinfluxql.aggregate`. Returns a result like the server's.
+
+        Transformations such as DERIVATIVE() return a row per pair of points
+        rather than a value per bucket and raise a ValueError, they have to
+        run on the server with `execute`.
+        """
+        from .aggregate import Aggregation
+        from .functions import TRANSFORMATIONS, functions
+        for expression in query._select_expressions:
+            for func in functions(expression):
+                if isinstance(func, TRANSFORMATIONS):
+                    raise ValueError(
+                        "%s is a transformation and can't be aggregated "
+                        "client side, run the query with execute()" %
+                        func.format())
+        aggregation = Aggregation.from_query(query)
+        result = self.execute(aggregation.raw_query(query), chunked=True,
+                              chunk_size=chunk_size, epoch='ns')
+        if hasattr(result, 'raw'):
+            result = [result]
+        for chunk in result:
+            aggregation.add_result(chunk)
+        return aggregation.result()
+
+    def execute_many(self, statements, batch_size=100, **kwargs):
+        """Executes rendered statements, e.g. a `pyinfluxql.batch.QueryBatch`,
+        `batch_size` at a time in a single request each. Yields the result
+        of every statement in order. Keyword arguments are passed on to the
+        client, long batches may need `method='POST'`.
+
+        Statements are sent as is, the guardrail isn't applied.
+        """
+        batch = []
+        for statement in statements:
+            batch.append(statement)
+            if len(batch) == batch_size:
+                for result in self._execute_statements(batch, kwargs):
+                    yield result
+                batch = []
+        if batch:
+            for result in self._execute_statements(batch, kwargs):
+                yield result
+
+    def _execute_statements(self, statements, kwargs):
+        results = self.client.query(''.join(statements), **kwargs)
+        if not isinstance(results, list):
+            results = [results]
+        if len(results) != len(statements):
+            raise ValueError("Expected %i results, got %i" % (
+                len(statements), len(results)))
+        return results
+
+    def execute_coalesced(self, queries):
+        """Executes `queries` merging those that only differ in their select
+        expressions, see `pyinfluxql.coalesce`. Returns the results in order.
+        """
+        from .coalesce import Coalescer
+        coalescer = Coalescer(self)
+        for query in queries:
+            coalescer.add(query)
+        return coalescer.execute()
+
+    def rank(self, query, tag, n, rank_by=None, bottom=False,
+             push_down=True, **kwargs):
+        """Returns the `n` values of `tag` scoring highest, or lowest with
+        `bottom`, by `rank_by` over the time range of `query`, as a list of
+        (value, score). See `pyinfluxql.topn`.
+        """
+        from .topn import rank
+        return rank(self, query, tag, n, rank_by, bottom, push_down, **kwargs)
+
+    def top(self, query, tag, n, rank_by=None, bottom=False, push_down=True,
+            **kwargs):
+        """Executes `query` for only the `n` values of `tag` ranking highest,
+        or lowest with `bottom`, by `rank_by`, by default the query's first
+        select expression. Ranking by the maximum or minimum of a field is
+        done by the server with TOP() or BOTTOM() unless `push_down` is
+        false, anything else by a query returning one row per tag value.
+        """
+        from .topn import top
+        return top(self, query, tag, n, rank_by, bottom, push_down, **kwargs)
+
+    def execute_by_tag(self, query, tag, values, regex=False):
+        """Runs `query` once for every value of `tag` in a single round trip.
+
+        Instead of one query per value the query is filtered on all values
+        with an IN list (or an anchored regex if `regex` is set), grouped by
+        `tag` and the result split back out. Returns a dict mapping each value
+        to a result like the one the per value query would have returned.
+        """
+        values = list(values)
+        grouped = query.clone()
+        if regex:
+            grouped.where(**{tag + '__match': values})
+        else:
+            grouped.where(**{tag + '__in': values})
+        if tag not in grouped._group_by:
+            grouped.group_by(tag)
+        result = self.execute(grouped)
+        return split_result(result, tag, values,
+                            keep_tag=tag in query._group_by)
+
+
+def split_result(result, tag, values, keep_tag=False):
+    """Splits a result grouped by `tag` into one result per tag value. The
+    tag is dropped from each series unless `keep_tag` is set.
+    """
+    series_by_value = dict((value, []) for value in values)
+    raw = result.raw
+    for series in raw.get('series', []):
+        tags = series.get('tags') or {}
+        value = tags.get(tag)
+        if value not in series_by_value:
+            continue
+        if not keep_tag:
+            series = dict(series)
+            tags = dict(tags)
+            del tags[tag]
+            if tags:
+                series['tags'] = tags
+            else:
+                del series['tags']
+        series_by_value[value].append(series)
+    split = {}
+    for value, series in series_by_value.items():
+        split_raw = dict((k, v) for k, v in raw.items() if k != 'series')
+        if series:
+            split_raw['series'] = series
+        split[value] = type(result)(split_raw)
+    return split
+
+
+def concat_results(results, limit=None):
+    """Joins the results of consecutive time windows of a query, the values
+    of series with the same name and tags are concatenated. With `limit`
+    every series is cut down to that many rows like the LIMIT of the
+    original query would have.
+    """
+    raw = dict((k, v) for k, v in results[0].raw.items() if k != 'series')
+    series_list = []
+    by_key = {}
+    for result in results:
+        for series in result.raw.get('series', []):
+            key = (series.get('name'),
+                   tuple(sorted((series.get('tags') or {}).items())))
+            if key not in by_key:
+                by_key[key] = dict(series)
+                by_key[key]['values'] = list(series.get('values') or [])
+                series_list.append(by_key[key])
+            else:
+                by_key[key]['values'].extend(series.get('values') or [])
+    if limit:
+        for series in series_list:
+            del series['values'][limit:]
+    if series_list:
+        raw['series'] = series_list
+    return type(results[0])(raw)
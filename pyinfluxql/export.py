@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.export
+    ~~~~~~~~~~~~~~~~~
+
+    Streams query results into Parquet or Arrow files, one chunk at a time
+
+    The query is run with chunked responses and epoch timestamps, every
+    chunk is converted to an Arrow record batch and written out before the
+    next one is read, so memory stays bounded by the chunk size.
+"""
+
+import os
+from multiprocessing.pool import ThreadPool
+
+FORMATS = ('parquet', 'arrow')
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("pyarrow is required to export results")
+    return pyarrow
+
+
+def part_paths(path, parts):
+    """Returns the file names of the parts of a parallel export,
+    e.g. out.parquet -> out.part0.parquet, out.part1.parquet, ...
+    """
+    root, ext = os.path.splitext(path)
+    return ['%s.part%i%s' % (root, i, ext) for i in range(parts)]
+
+
+def split_time_range(query, parts):
+    """Splits a query with a date range into `parts` queries covering
+    consecutive, non overlapping windows of it
+    """
+    start, end = query.start_time, query.end_time
+    if start is None or end is None:
+        raise ValueError("Splitting an export requires a query with a "
+                         "date_range start and end")
+    step = (end - start) / parts
+    queries = []
+    for i in range(parts):
+        window = query.clone()
+        if i > 0:
+            del window._where['time__gt']
+            window._start_time = start + step * i
+            window._where['time__gte'] = window._start_time
+        if i < parts - 1:
+            window._end_time = start + step * (i + 1)
+            window._where['time__lt'] = window._end_time
+        queries.append(window)
+    return queries
+
+
+class BatchWriter(object):
+    """Converts result chunks to record batches and writes them to `path`.
+
+    Time becomes a UTC timestamp, tags dictionary encoded strings and fields
+    whatever type Arrow infers, float64 while a field has only been null.
+    When a later chunk has a new field, or a new tag without `tags`, or an
+    integer field turns float or a null field typed, the schema is widened
+    and the following chunks go to a new file. On close the files are
+    unified into `path` with the final schema, so rows are rewritten at most
+    once however often the schema changes. Other type changes raise a
+    ValueError.
+    """
+    def __init__(self, path, format='parquet', tags=None):
+        if format not in FORMATS:
+            raise ValueError("format must be one of %s" % ", ".join(FORMATS))
+        self.pa = _pyarrow()
+        self.path = path
+        self.format = format
+        self.tags = tags
+        self.schema = None
+        self.rows = 0
+        self.rewrites = 0
+        self._writer = None
+        # files written with narrower schemas, unified into `path` on close
+        self._parts = []
+        # fields typed float64 only because they've been null so far
+        self._untyped = set()
+
+    def _columns(self, result):
+        """Returns the fields, tags and time values of a chunk as lists
+        """
+        fields = {}
+        tags = {}
+        times = []
+        for series in result.raw.get('series', []):
+            values = series.get('values') or []
+            if not values:
+                continue
+            offset = len(times)
+            for column, col in zip(series['columns'], zip(*values)):
+                if column == 'time':
+                    times.extend(col)
+                else:
+                    fields.setdefault(column, [None] * offset).extend(col)
+            for column in fields:
+                missing = len(times) - len(fields[column])
+                if missing:
+                    fields[column].extend([None] * missing)
+            series_tags = series.get('tags') or {}
+            for key in set(tags) | set(series_tags):
+                tags.setdefault(key, [None] * offset).extend(
+                    [series_tags.get(key)] * len(values))
+        return fields, tags, times
+
+    def _widened(self, fields, tags):
+        """Returns the schema for the written rows and a chunk with the
+        Arrow arrays `fields` and the tag keys `tags`, the current schema if
+        it fits the chunk
+        """
+        pa = self.pa
+        tag_type = pa.dictionary(pa.int32(), pa.string())
+        if self.schema is None:
+            tag_keys = self.tags if self.tags is not None else sorted(tags)
+            schema = [pa.field('time', pa.timestamp('ns', tz='UTC'))]
+            schema.extend(pa.field(key, tag_type) for key in tag_keys)
+        else:
+            schema = list(self.schema)
+        names = set(field.name for field in schema)
+        changed = self.schema is None
+        for key in sorted(tags) if self.tags is None else ():
+            if key not in names:
+                last_tag = max(i for i, field in enumerate(schema)
+                               if i == 0 or pa.types.is_dictionary(field.type))
+                schema.insert(last_tag + 1, pa.field(key, tag_type))
+                names.add(key)
+                changed = True
+        for column, array in fields.items():
+            new = array.type
+            if column not in names:
+                if pa.types.is_null(new):
+                    new = pa.float64()
+                    self._untyped.add(column)
+                schema.append(pa.field(column, new))
+                names.add(column)
+                changed = True
+                continue
+            i = [field.name for field in schema].index(column)
+            old = schema[i].type
+            # integers are cast to a float column as they're written
+            narrower = pa.types.is_floating(old) and \
+                pa.types.is_integer(new) and column not in self._untyped
+            if pa.types.is_null(new) or new == old or narrower:
+                continue
+            if column in self._untyped:
+                self._untyped.discard(column)
+            elif pa.types.is_integer(old) and pa.types.is_floating(new):
+                new = pa.float64()
+            else:
+                raise ValueError(
+                    "Column %s of %s changes type from %s to %s, cast it in "
+                    "the query" % (column, self.path, old, new))
+            schema[i] = pa.field(column, new)
+            changed = True
+        return pa.schema(schema) if changed else self.schema
+
+    def _open(self):
+        pa = self.pa
+        if self.format == 'parquet':
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(self.path, self.schema)
+        else:
+            # the stream format allows the tag dictionaries to change
+            # between batches, the file format doesn't
+            self._writer = pa.ipc.new_stream(self.path, self.schema)
+
+    def _batches(self, path):
+        """Yields the record batches of a file written before
+        """
+        if self.format == 'parquet':
+            import pyarrow.parquet as pq
+            with open(path, 'rb') as f:
+                for batch in pq.ParquetFile(f).iter_batches():
+                    yield batch
+        else:
+            with self.pa.ipc.open_stream(path) as reader:
+                for batch in reader:
+                    yield batch
+
+    def _cast(self, batch):
+        pa = self.pa
+        arrays = []
+        for field in self.schema:
+            if field.name in batch.schema.names:
+                arrays.append(batch.column(field.name).cast(field.type))
+            else:
+                arrays.append(pa.nulls(batch.num_rows, field.type))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    def _part(self):
+        """Moves the file written so far aside as the next part
+        """
+        part = '%s.part%i' % (self.path, len(self._parts))
+        os.rename(self.path, part)
+        self._parts.append(part)
+
+    def _widen(self, schema):
+        """Continues with the wider `schema` in a new file
+        """
+        self._writer.close()
+        self._part()
+        self.schema = schema
+        self._open()
+
+    def _unify(self):
+        """Rewrites the parts into `path` with the final schema, one batch
+        at a time
+        """
+        self._part()
+        self._open()
+        try:
+            for part in self._parts:
+                for batch in self._batches(part):
+                    self._writer.write_batch(self._cast(batch))
+        finally:
+            self._writer.close()
+            self._writer = None
+            for part in self._parts:
+                os.remove(part)
+            self._parts = []
+        self.rewrites += 1
+
+    def write(self, result):
+        """Writes one result chunk, returns the number of rows written
+        """
+        pa = self.pa
+        fields, tags, times = self._columns(result)
+        if not times:
+            return 0
+        fields = dict((column, pa.array(values))
+                      for column, values in fields.items())
+        schema = self._widened(fields, tags)
+        if self.schema is None:
+            self.schema = schema
+            self._open()
+        elif schema is not self.schema:
+            self._widen(schema)
+        arrays = []
+        for field in self.schema:
+            if field.name == 'time':
+                arrays.append(pa.array(times, pa.int64()).cast(field.type))
+            elif pa.types.is_dictionary(field.type):
+                values = tags.get(field.name, [None] * len(times))
+                arrays.append(pa.array(values, pa.string()).dictionary_encode()
+                              .cast(field.type))
+            elif field.name in fields:
+                arrays.append(fields[field.name].cast(field.type))
+            else:
+                arrays.append(pa.nulls(len(times), field.type))
+        self._writer.write_batch(
+            pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        self.rows += len(times)
+        return len(times)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            if self._parts:
+                self._unify()
+
+
+def _chunks(result):
+    if isinstance(result, list) or not hasattr(result, 'raw'):
+        return result
+    return [result]
+
+
+def export_query(engine, query, path, format='parquet', chunk_size=10000):
+    """Exports the result of a query to a single file, returns the number of
+    rows written
+    """
+    tags = [tag for tag in query._group_by if tag != '*'] or None
+    writer = BatchWriter(path, format, tags)
+    try:
+        for chunk in _chunks(engine.execute(
+                query, chunked=True, chunk_size=chunk_size, epoch='ns')):
+            writer.write(chunk)
+    finally:
+        writer.close()
+    return writer.rows
+
+
+def export(engine, query, path, format='parquet', chunk_size=10000, jobs=1):
+    """Exports the result of `query` to `path`. With `jobs` > 1 the date range
+    of the query is split into `jobs` windows which are exported in parallel,
+    each to its own part file. Returns the paths written.
+    """
+    if jobs <= 1:
+        export_query(engine, query, path, format, chunk_size)
+        return [path]
+    queries = split_time_range(query, jobs)
+    paths = part_paths(path, jobs)
+    pool = ThreadPool(jobs)
+    try:
+        pool.map(lambda args: export_query(engine, args[0], args[1], format,
+                                           chunk_size),
+                 zip(queries, paths))
+    finally:
+        pool.close()
+        pool.join()
+    return paths
@@ -99,6 +99,12 @@ class Percentile(Func):
 class Derivative(Func):
     identifier = 'DERIVATIVE'
 
+    def validate_args(self, *args):
+        """Takes the field and an optional unit, e.g. DERIVATIVE(value, 1s)
+        """
+        if len(args) != 2:
+            self.validate_arg_length(args, 1)
+
 
 class Sum(Func):
     identifier = 'SUM'
@@ -114,3 +120,82 @@ class First(Func):
 
 class Last(Func):
     identifier = 'LAST'
+
+
+class Top(Func):
+    """TOP(field, [tag, ...], N) selects the N largest values of a field, or
+    the largest value of each of the N tag values ranking highest
+    """
+    identifier = 'TOP'
+
+    def validate_args(self, *args):
+        if len(args) < 2:
+            raise ValueError(u"Function %s takes a field, optional tags and "
+                             "a count" % self.identifier)
+        if type(args[-1]) is not int:
+            raise TypeError(
+                "Last argument to %s must be an int" % self.identifier)
+        if args[-1] < 1:
+            raise ValueError(
+                "Last argument to %s must be at least 1" % self.identifier)
+        for tag in args[1:-1]:
+            if type(tag) not in self._valid_arg_types:
+                raise TypeError(
+                    "Tag arguments to %s must be strings" % self.identifier)
+
+
+class Bottom(Top):
+    identifier = 'BOTTOM'
+
+
+class Spread(Func):
+    identifier = 'SPREAD'
+
+
+class Mode(Func):
+    identifier = 'MODE'
+
+
+class Difference(Func):
+    identifier = 'DIFFERENCE'
+
+
+class MovingAverage(Func):
+    identifier = 'MOVING_AVERAGE'
+
+    def validate_args(self, *args):
+        self.validate_arg_length(args, 2)
+        if type(args[1]) is not int:
+            raise TypeError(
+                "Second argument to %s must be an int" % self.identifier)
+        if args[1] < 1:
+            raise ValueError(
+                "Second argument to %s must be at least 1" % self.identifier)
+
+
+#: functions returning the time of the point they select unless grouped by
+#: time
+SELECTORS = (Min, Max, First, Last, Percentile, Top)
+
+#: functions returning a row per input row or bucket instead of one value
+TRANSFORMATIONS = (Derivative, Difference, MovingAverage)
+
+
+def is_aggregate(expression):
+    """Whether a select expression is a function, possibly aliased
+    """
+    if isinstance(expression, Expression) and not isinstance(expression, Func):
+        expression = expression._expression
+    return isinstance(expression, Func)
+
+
+def functions(expression):
+    """Yields the functions of a select expression, nested ones included
+    """
+    if isinstance(expression, Expression) and not isinstance(expression, Func):
+        expression = expression._expression
+    if isinstance(expression, Func):
+        yield expression
+        for arg in expression._args:
+            for function in functions(arg):
+                yield function
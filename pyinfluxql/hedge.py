@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.hedge
+    ~~~~~~~~~~~~~~~~
+
+    Hedged requests across read replicas
+
+    A query goes to one replica first. If it hasn't answered once the
+    replica's latency percentile has passed, a duplicate goes to the
+    replica that's fastest at the time, and whichever answers first wins.
+    Only the slowest few percent of queries are sent twice, so the extra load
+    is small while the tail latency follows the fastest replica.
+
+    >>> engine = Engine([client_a, client_b, client_c], hedge_percentile=95)
+"""
+
+import re
+import math
+import time
+import threading
+from six.moves import queue
+
+_read_statement = re.compile(r'\s*(SELECT|SHOW)\b', re.IGNORECASE).match
+_into = re.compile(r'\bINTO\b', re.IGNORECASE).search
+
+
+def is_read_only(query):
+    """Whether every statement of `query` is a SELECT or SHOW without INTO,
+    i.e. it can be sent twice and to any replica. Errs on the side of no,
+    e.g. for "into" in a string literal.
+    """
+    if _into(query):
+        return False
+    statements = [s for s in query.split(';') if s.strip()]
+    return bool(statements) and all(_read_statement(s) for s in statements)
+
+
+class LatencyHistogram(object):
+    """A histogram of latencies in log spaced buckets that adapts to the
+    current latency: every `halflife` samples all counts are halved, so old
+    samples fade out.
+    """
+    def __init__(self, minimum=0.0001, maximum=60.0, growth=1.2,
+                 halflife=1000):
+        self.minimum = minimum
+        self.growth = growth
+        self.halflife = halflife
+        self._log_growth = math.log(growth)
+        self.bounds = [minimum]
+        while self.bounds[-1] < maximum:
+            self.bounds.append(self.bounds[-1] * growth)
+        self.counts = [0.0] * len(self.bounds)
+        self.total = 0.0
+        self._samples = 0
+
+    def _bucket(self, seconds):
+        if seconds <= self.minimum:
+            return 0
+        steps = math.log(seconds / self.minimum) / self._log_growth
+        index = int(math.ceil(steps))
+        return min(index, len(self.bounds) - 1)
+
+    def record(self, seconds):
+        self.counts[self._bucket(seconds)] += 1
+        self.total += 1
+        self._samples += 1
+        if self._samples >= self.halflife:
+            self._samples = 0
+            self.counts = [count / 2 for count in self.counts]
+            self.total /= 2
+
+    def percentile(self, p):
+        """Returns the upper bound of the bucket holding the `p`th
+        percentile, or None without samples
+        """
+        if not self.total:
+            return None
+        rank = self.total * p / 100.0
+        seen = 0.0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.bounds[-1]
+
+
+class _Attempt(object):
+    def __init__(self, replica, hedge):
+        self.replica = replica
+        self.hedge = hedge
+        self.result = None
+        self.error = None
+
+
+class HedgedClient(object):
+    """Sends queries to a list of replica clients, hedging slow ones.
+
+    Queries round robin over the replicas. A hedge is sent after the
+    `percentile` latency of the primary replica, or after `initial_delay`
+    seconds until it has `min_samples` latencies recorded. Failed queries
+    are retried on the other replica as well.
+
+    Only SELECT and SHOW statements without INTO are spread and hedged,
+    anything else, e.g. DELETE, DROP or SELECT ... INTO, goes to the first
+    replica once.
+
+    Chunked queries aren't hedged, the response is a generator read by the
+    caller long after the replica answered, so they go to their replica
+    without a deadline and their latency isn't recorded.
+
+    The losing request can't be interrupted while it's blocked on the
+    network, it's left to finish on its thread and its result is dropped.
+    Its latency is still recorded so slow replicas show up as slow.
+    """
+    def __init__(self, replicas, percentile=95, initial_delay=0.05,
+                 min_samples=20, clock=time.time):
+        if not replicas:
+            raise ValueError("HedgedClient requires at least one replica")
+        self.replicas = list(replicas)
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.clock = clock
+        self.histograms = [LatencyHistogram() for _ in self.replicas]
+        self.queries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def hedge_delay(self, replica):
+        """Seconds to wait for `replica` before sending a hedge
+        """
+        histogram = self.histograms[replica]
+        if histogram.total < self.min_samples:
+            return self.initial_delay
+        return histogram.percentile(self.percentile)
+
+    def _fastest(self, exclude):
+        candidates = [i for i in range(len(self.replicas)) if i != exclude]
+        return min(candidates, key=lambda i: (
+            self.histograms[i].percentile(50) or 0, i))
+
+    def _start(self, attempt, query, kwargs, done):
+        def run():
+            start = self.clock()
+            try:
+                attempt.result = self.replicas[attempt.replica].query(
+                    query, **kwargs)
+            except Exception as e:
+                attempt.error = e
+            else:
+                with self._lock:
+                    self.histograms[attempt.replica].record(
+                        self.clock() - start)
+            done.put(attempt)
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    @property
+    def compact_results(self):
+        return all(getattr(replica, 'compact_results', False)
+                   for replica in self.replicas)
+
+    def query(self, query, **kwargs):
+        if not is_read_only(query):
+            with self._lock:
+                self.queries += 1
+            return self.replicas[0].query(query, **kwargs)
+        with self._lock:
+            primary = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+            self.queries += 1
+        if len(self.replicas) == 1 or kwargs.get('chunked'):
+            return self.replicas[primary].query(query, **kwargs)
+
+        done = queue.Queue()
+        self._start(_Attempt(primary, False), query, kwargs, done)
+        outstanding = 1
+        hedged = False
+        try:
+            attempt = done.get(timeout=self.hedge_delay(primary))
+        except queue.Empty:
+            attempt = None
+        while True:
+            if attempt is not None:
+                outstanding -= 1
+                if attempt.error is None:
+                    if attempt.hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return attempt.result
+                if hedged and not outstanding:
+                    raise attempt.error
+            if not hedged:
+                hedged = True
+                with self._lock:
+                    self.hedges += 1
+                self._start(_Attempt(self._fastest(primary), True), query,
+                            kwargs, done)
+                outstanding += 1
+            attempt = done.get()
@@ -0,0 +1,715 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.parser
+    ~~~~~~~~~~~~~~~~~
+
+    Parses InfluxQL SELECT and DELETE statements into Query objects
+
+    >>> str(parse("select mean(value) from cpu where host='a' group by time(1h)"))
+    "SELECT MEAN(value) FROM cpu WHERE host = 'a' GROUP BY time(1h);"
+"""
+
+import re
+import datetime
+from string import ascii_letters, digits
+
+from . import functions
+from .functions import Expression, Func
+from .query import Query
+from .utils import FILL_OPTIONS, format_fill, quote_string
+
+IDENT = 'IDENT'
+QIDENT = 'QIDENT'
+STRING = 'STRING'
+NUMBER = 'NUMBER'
+DURATION = 'DURATION'
+REGEX = 'REGEX'
+OP = 'OP'
+LPAREN = '('
+RPAREN = ')'
+COMMA = ','
+DOT = '.'
+SEMICOLON = ';'
+EOF = 'EOF'
+
+_eof = (EOF, '', None)
+
+_ident_start = frozenset(ascii_letters + '_')
+_ident_chars = frozenset(ascii_letters + digits + '_')
+_digits = frozenset(digits)
+_ident_run = re.compile(r'[A-Za-z0-9_]*').match
+_number_run = re.compile(r'[0-9.]*').match
+_letter_run = re.compile(u'[A-Za-z\u00b5]*', re.UNICODE).match
+_whitespace = frozenset(' \t\r\n')
+_escape = re.compile(r'\\(.)', re.DOTALL)
+# the rest of a quoted literal up to and including its closing quote
+_literal_rest = {
+    "'": re.compile(r"(?:[^'\\]|\\.)*'", re.DOTALL).match,
+    '"': re.compile(r'(?:[^"\\]|\\.)*"', re.DOTALL).match,
+    '/': re.compile(r'(?:[^/\\]|\\.)*/', re.DOTALL).match,
+}
+_plain_identifier = re.compile(r'[A-Za-z_][A-Za-z0-9_]*\Z').match
+_escapes = {'\\': '\\', "'": "'", '"': '"', 'n': '\n'}
+_duration_units = frozenset(['ns', 'u', u'µ', 'ms', 's', 'm', 'h', 'd', 'w'])
+_single_char_tokens = {
+    '(': LPAREN, ')': RPAREN, ',': COMMA, '.': DOT, ';': SEMICOLON}
+# a "/" starts a regex unless it follows something that can be divided, i.e.
+# anything but a keyword
+_divisible = frozenset([IDENT, QIDENT, NUMBER, DURATION, RPAREN])
+# tokens that end an expression, besides clause keywords
+_expression_ends = frozenset([COMMA, RPAREN, SEMICOLON, EOF])
+# tokens a binary operator is a unary sign after, rendered without spaces
+_unspaced = frozenset([OP, LPAREN, COMMA])
+_single_token_kinds = frozenset([IDENT, QIDENT, NUMBER, STRING, DURATION,
+                                 REGEX])
+
+_comparators = {
+    '=': 'eq',
+    '!=': 'ne',
+    '<>': 'ne',
+    '>': 'gt',
+    '>=': 'gte',
+    '<': 'lt',
+    '<=': 'lte',
+    '=~': 'match',
+    '!~': 'nmatch',
+}
+
+_list_comparators = dict(
+    (name, single) for name, (single, _) in Query.list_op.items())
+_operators = frozenset(list(Query.binary_op) + list(Query.list_op))
+
+# valid InfluxQL clauses a Query can't represent
+_unsupported_clauses = frozenset(['OFFSET', 'SLIMIT', 'SOFFSET', 'TZ'])
+_clause_keywords = frozenset([
+    'FROM', 'WHERE', 'GROUP', 'ORDER', 'LIMIT', 'INTO', 'AND', 'OR', 'AS',
+    'FILL']) | _unsupported_clauses
+
+
+class ParseError(ValueError):
+    pass
+
+
+def tokenize(text):
+    """Splits a statement into a list of (type, value, keyword) tuples,
+    keyword is the upper cased value of identifiers and None otherwise.
+
+    Dispatches on the first character of each token, runs of identifier and
+    number characters are consumed with single character class matches which
+    can't backtrack.
+    """
+    tokens = []
+    append = tokens.append
+    i = 0
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c == ' ':
+            i += 1
+            continue
+        if c in _ident_start:
+            j = _ident_run(text, i + 1).end()
+            value = text[i:j]
+            token = (IDENT, value, value.upper())
+        elif c in _digits:
+            j = _number_run(text, i + 1).end()
+            k = _letter_run(text, j).end()
+            if k > j:
+                if text[j:k] not in _duration_units:
+                    raise ParseError("invalid duration %r at %i" % (
+                        text[i:k], i))
+                token = (DURATION, text[i:k], None)
+                j = k
+            else:
+                token = (NUMBER, text[i:j], None)
+        elif c in _single_char_tokens:
+            j = i + 1
+            token = (_single_char_tokens[c], c, None)
+        elif c == "'" or c == '"':
+            j = _find_closing(text, c, i)
+            value = text[i + 1:j]
+            if '\\' in value:
+                value = _unescape(value)
+            token = (STRING if c == "'" else QIDENT, value, None)
+            j += 1
+        elif c == '/' and _starts_regex(tokens):
+            j = _find_closing(text, c, i) + 1
+            token = (REGEX, text[i:j], None)
+        elif c in '=!<>':
+            j = i + 1
+            if j < n and text[i:j + 1] in _comparators:
+                j += 1
+            value = text[i:j]
+            if value == '!':
+                raise ParseError("unexpected '!' at %i" % i)
+            token = (OP, value, None)
+        elif c in '+-*/%':
+            j = i + 1
+            token = (OP, c, None)
+        elif c in _whitespace:
+            i += 1
+            continue
+        else:
+            raise ParseError("unexpected %r at %i" % (c, i))
+        append(token)
+        i = j
+    append(_eof)
+    return tokens
+
+
+def _starts_regex(tokens):
+    """Whether a "/" following `tokens` starts a regex, see `_divisible`
+    """
+    if not tokens:
+        return True
+    kind, _, keyword = tokens[-1]
+    return kind not in _divisible or keyword in _clause_keywords
+
+
+def _find_closing(text, quote, start):
+    """Returns the index of the quote closing the literal at `start`,
+    skipping escaped characters
+    """
+    match = _literal_rest[quote](text, start + 1)
+    if match is None:
+        raise ParseError("unterminated %s at %i" % (quote, start))
+    return match.end() - 1
+
+
+def _unescape(value):
+    """Resolves the escapes of a string literal, the reverse of
+    `pyinfluxql.utils.quote_string`. Other escapes are kept as they are.
+    """
+    return _escape.sub(lambda match: _escapes.get(match.group(1),
+                                                  match.group(0)), value)
+
+
+def _token_text(token):
+    if token[0] == STRING:
+        return quote_string(token[1])
+    elif token[0] == QIDENT:
+        return _quote_identifier(token[1])
+    return token[1]
+
+
+def _render_tokens(tokens):
+    """Joins expression tokens into canonical text: binary operators are
+    surrounded by spaces, everything else is packed tight
+    """
+    parts = []
+    append = parts.append
+    previous = LPAREN
+    for token in tokens:
+        kind = token[0]
+        if kind == OP and previous not in _unspaced:
+            append(' ' + token[1] + ' ')
+        elif kind == COMMA:
+            append(', ')
+        elif kind == STRING:
+            append(quote_string(token[1]))
+        elif kind == QIDENT:
+            append(_quote_identifier(token[1]))
+        else:
+            append(token[1])
+        previous = kind
+    return ''.join(parts)
+
+
+def _quote_identifier(name):
+    if _plain_identifier(name):
+        return name
+    return '"%s"' % name
+
+
+def _parse_time(value):
+    """Parses the date strings InfluxDB accepts in time comparisons, returns
+    None when the string can't be represented exactly by a datetime literal
+    """
+    if value.endswith('Z'):
+        value = value[:-1]
+    try:
+        if len(value) == 10:
+            return datetime.datetime(
+                int(value[0:4]), int(value[5:7]), int(value[8:10]))
+        if len(value) < 19 or value[10] not in ' T':
+            return None
+        microsecond = 0
+        if len(value) > 19:
+            fraction = value[20:]
+            if value[19] != '.' or not 0 < len(fraction) <= 6 or \
+                    not fraction.isdigit():
+                return None
+            microsecond = int(fraction.ljust(6, '0'))
+            if microsecond % 1000:
+                return None
+        return datetime.datetime(
+            int(value[0:4]), int(value[5:7]), int(value[8:10]),
+            int(value[11:13]), int(value[14:16]), int(value[17:19]),
+            microsecond)
+    except ValueError:
+        return None
+
+
+_func_classes = {}
+
+
+def _func_class(identifier):
+    """Looks up the Func subclass for a function name, functions we don't
+    know about get a class without argument validation
+    """
+    try:
+        return _func_classes[identifier]
+    except KeyError:
+        pass
+    for value in vars(functions).values():
+        if isinstance(value, type) and issubclass(value, Func) and \
+                value.identifier == identifier:
+            cls = value
+            break
+    else:
+        cls = type(str(identifier.title()), (Func,), {
+            'identifier': identifier,
+            'validate_args': lambda self, *args: None})
+    _func_classes[identifier] = cls
+    return cls
+
+
+class Parser(object):
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def error(self, message):
+        token = self.peek()
+        found = 'end of statement' if token[0] == EOF else repr(token[1])
+        return ParseError("%s, found %s in %r" % (message, found, self.text))
+
+    def unsupported(self, what):
+        return ParseError("%s isn't supported by the Query model in %r" % (
+            what, self.text))
+
+    def peek(self, offset=0):
+        return self.tokens[min(self.pos + offset, len(self.tokens) - 1)]
+
+    def next(self):
+        token = self.tokens[self.pos]
+        if token[0] == EOF:
+            raise self.error("unexpected end of statement")
+        self.pos += 1
+        return token
+
+    def is_keyword(self, keyword):
+        return self.tokens[self.pos][2] == keyword
+
+    def accept(self, token_type):
+        token = self.tokens[self.pos]
+        if token[0] == token_type:
+            self.pos += 1
+            return token
+        return None
+
+    def expect(self, token_type):
+        token = self.accept(token_type)
+        if token is None:
+            raise self.error("expected %s" % token_type)
+        return token
+
+    def expect_keyword(self, keyword):
+        if not self.is_keyword(keyword):
+            raise self.error("expected %s" % keyword)
+        self.pos += 1
+
+    def parse_statements(self):
+        statements = []
+        while self.tokens[self.pos][0] != EOF:
+            if self.accept(SEMICOLON):
+                continue
+            statements.append(self.parse_statement())
+            if self.tokens[self.pos][0] != EOF:
+                self.expect(SEMICOLON)
+        return statements
+
+    def parse_statement(self):
+        if self.is_keyword('SELECT'):
+            return self.parse_select()
+        elif self.is_keyword('DELETE'):
+            return self.parse_delete()
+        raise self.error("expected SELECT or DELETE")
+
+    def parse_select(self):
+        self.expect_keyword('SELECT')
+        query = Query(*self.parse_fields())
+        tokens = self.tokens
+        if tokens[self.pos][2] == 'INTO':
+            self.pos += 1
+            query.into(self.parse_path())
+        self.expect_keyword('FROM')
+        query.from_(self.parse_measurement())
+        while True:
+            keyword = tokens[self.pos][2]
+            if keyword == 'WHERE':
+                self.pos += 1
+                self.parse_where(query)
+            elif keyword == 'GROUP':
+                self.pos += 1
+                self.expect_keyword('BY')
+                self.parse_group_by(query)
+            elif keyword == 'ORDER':
+                self.pos += 1
+                self.expect_keyword('BY')
+                field = self.parse_path()
+                direction = 'ASC'
+                if self.is_keyword('ASC') or self.is_keyword('DESC'):
+                    direction = self.next()[2]
+                query.order(field, direction)
+            elif keyword == 'LIMIT':
+                self.pos += 1
+                query.limit(int(self.expect(NUMBER)[1]))
+            elif keyword == 'INTO':
+                self.pos += 1
+                query.into(self.parse_path())
+            elif keyword in _unsupported_clauses:
+                raise self.unsupported(keyword)
+            else:
+                return query
+
+    def parse_delete(self):
+        self.expect_keyword('DELETE')
+        self.expect_keyword('FROM')
+        query = Query().from_(self.parse_measurement())
+        query._is_delete = True
+        if self.is_keyword('WHERE'):
+            self.pos += 1
+            self.parse_where(query)
+        return query
+
+    def parse_path_parts(self):
+        """Parses a possibly dotted identifier, e.g. db.rp.measurement
+        """
+        tokens = self.tokens
+        pos = self.pos
+        token = tokens[pos]
+        if token[0] == IDENT:
+            parts = [token[1]]
+        elif token[0] == QIDENT:
+            parts = [_quote_identifier(token[1])]
+        else:
+            raise self.error("expected identifier")
+        pos += 1
+        while tokens[pos][0] == DOT:
+            token = tokens[pos + 1]
+            if token[0] == EOF:
+                self.pos = pos + 1
+                raise self.error("expected identifier")
+            parts.append(_token_text(token))
+            pos += 2
+        self.pos = pos
+        return parts
+
+    def parse_path(self):
+        return '.'.join(self.parse_path_parts())
+
+    def parse_measurement(self):
+        token = self.tokens[self.pos]
+        if token[0] == REGEX:
+            self.pos += 1
+            return token[1]
+        if token[0] == QIDENT and self.tokens[self.pos + 1][0] != DOT \
+                and (' ' in token[1] or '-' in token[1]):
+            # Query quotes these itself
+            self.pos += 1
+            return token[1]
+        return self.parse_path()
+
+    def _expression_end(self):
+        """Returns the position of the end of the expression starting at the
+        current token, i.e. the next top level comma, closing paren or clause
+        keyword
+        """
+        depth = 0
+        tokens = self.tokens
+        for i in range(self.pos, len(tokens)):
+            token = tokens[i]
+            kind = token[0]
+            if kind == LPAREN:
+                depth += 1
+            elif kind == RPAREN:
+                if not depth:
+                    return i
+                depth -= 1
+            elif depth:
+                continue
+            elif kind in _expression_ends or token[2] in _clause_keywords:
+                return i
+        return len(tokens) - 1
+
+    def parse_fields(self):
+        fields = [self.parse_field()]
+        while self.accept(COMMA):
+            fields.append(self.parse_field())
+        return fields
+
+    def parse_field(self):
+        field = self.parse_expression()
+        if self.is_keyword('AS'):
+            self.pos += 1
+            alias = _token_text(self.next())
+            if not isinstance(field, Expression):
+                field = Expression(field)
+            field.as_(alias)
+        return field
+
+    def parse_expression(self):
+        """Parses a field or function argument into a Func, a number or a
+        string containing the canonical expression text
+        """
+        start = self.pos
+        tokens = self.tokens
+        first = tokens[start]
+        if first[0] in _single_token_kinds and \
+                first[2] not in _clause_keywords:
+            # a lone identifier or literal, or a call, without scanning
+            # for the end of the expression
+            following = tokens[start + 1]
+            if following[0] in _expression_ends or \
+                    following[2] in _clause_keywords:
+                end = start + 1
+            elif first[0] == IDENT and following[0] == LPAREN:
+                after = tokens[self._matching_paren(start + 1) + 1]
+                if after[0] in _expression_ends or \
+                        after[2] in _clause_keywords:
+                    return self.parse_call()
+                end = self._expression_end()
+            else:
+                end = self._expression_end()
+        else:
+            end = self._expression_end()
+        if end == start:
+            raise self.error("expected expression")
+        if end - start == 1:
+            self.pos = end
+            kind = first[0]
+            if kind == NUMBER:
+                return float(first[1]) if '.' in first[1] else int(first[1])
+            return _token_text(first)
+        if first[0] == IDENT and tokens[start + 1][0] == LPAREN and \
+                self._matching_paren(start + 1) == end - 1:
+            return self.parse_call()
+        self.pos = end
+        return _render_tokens(tokens[start:end])
+
+    def _matching_paren(self, start):
+        depth = 0
+        tokens = self.tokens
+        for i in range(start, len(tokens)):
+            kind = tokens[i][0]
+            if kind == LPAREN:
+                depth += 1
+            elif kind == RPAREN:
+                depth -= 1
+                if not depth:
+                    return i
+        raise ParseError("unbalanced parentheses in %r" % self.text)
+
+    def parse_call(self):
+        name = self.next()[2]
+        self.expect(LPAREN)
+        args = []
+        if not self.accept(RPAREN):
+            args.append(self.parse_expression())
+            while self.accept(COMMA):
+                args.append(self.parse_expression())
+            self.expect(RPAREN)
+        try:
+            return _func_class(name)(*args)
+        except (TypeError, ValueError) as e:
+            raise ParseError("%s in %r" % (e, self.text))
+
+    def parse_where(self, query):
+        where = query._where
+        for base, comparator, value in self.parse_conditions():
+            key = base
+            if comparator != 'eq' or base.rsplit('__', 1)[-1] in _operators:
+                key = '%s__%s' % (base, comparator)
+            if key in where:
+                raise self.error("duplicate condition %s" % key)
+            where[key] = value
+        if isinstance(where.get('time__gt'), datetime.datetime):
+            query._start_time = where['time__gt']
+        if isinstance(where.get('time__lt'), datetime.datetime):
+            query._end_time = where['time__lt']
+
+    def parse_conditions(self):
+        """Parses conditions joined by AND, or equality conditions on a single
+        key joined by OR, into a list of (key, comparator, value) tuples.
+        Repeated equality conditions on a key become an IN list, repeated not
+        equal conditions a NOT IN list.
+        """
+        tokens = self.tokens
+        conditions = []
+        operators = set()
+        while True:
+            if tokens[self.pos][0] == LPAREN:
+                self.pos += 1
+                conditions.extend(self.parse_conditions())
+                self.expect(RPAREN)
+            else:
+                conditions.append(self.parse_condition())
+            keyword = tokens[self.pos][2]
+            if keyword != 'AND' and keyword != 'OR':
+                break
+            operators.add(keyword)
+            self.pos += 1
+        if len(operators) == 2:
+            raise self.unsupported("mixing AND and OR")
+        elif 'OR' in operators:
+            return [self._merge_conditions(conditions, 'in', "OR")]
+        elif len(conditions) == 1:
+            return conditions
+        merged = []
+        keys = {}
+        for condition in conditions:
+            key = condition[:2]
+            if condition[1] in ('ne', 'nin'):
+                key = (condition[0], 'nin')
+            if key in keys and key[1] == 'nin':
+                i = keys[key]
+                merged[i] = self._merge_conditions([merged[i], condition],
+                                                   'nin', "AND")
+            elif key in keys:
+                raise self.unsupported(
+                    "more than one %s condition on %s" % (
+                        Query.binary_op[key[1]], key[0]))
+            else:
+                keys[key] = len(merged)
+                merged.append(condition)
+        return merged
+
+    def _merge_conditions(self, conditions, comparator, operator):
+        """Merges conditions on a single key into one IN or NOT IN list
+        """
+        single = _list_comparators[comparator]
+        values = []
+        for key, condition_comparator, value in conditions:
+            if key != conditions[0][0] or \
+                    condition_comparator not in (single, comparator):
+                raise self.unsupported(
+                    "%s except between %s conditions on one key" % (
+                        operator, Query.binary_op[single]))
+            if condition_comparator == comparator:
+                values.extend(value)
+            else:
+                values.append(value)
+        return conditions[0][0], comparator, values
+
+    def parse_condition(self):
+        tokens = self.tokens
+        token = tokens[self.pos]
+        if token[0] == IDENT and tokens[self.pos + 1][0] != DOT:
+            identifiers = [token[1]]
+            self.pos += 1
+        else:
+            identifiers = self.parse_path_parts()
+        op = tokens[self.pos]
+        comparator = _comparators.get(op[1]) if op[0] == OP else None
+        if comparator is None:
+            raise self.error("expected comparison operator")
+        self.pos += 1
+        value = self.parse_value(identifiers[0] == 'time')
+        return '__'.join(identifiers), comparator, value
+
+    def parse_value(self, is_time):
+        start = self.pos
+        tokens = self.tokens
+        if tokens[start][0] == EOF:
+            raise self.error("expected value")
+        following = tokens[start + 1]
+        if following[2] in _clause_keywords or following[0] == EOF or \
+                following[0] == SEMICOLON:
+            end = start + 1
+        else:
+            end = self._expression_end()
+        self.pos = end
+        if end - start == 1:
+            kind, value = tokens[start][:2]
+            if kind == STRING:
+                if is_time:
+                    return _parse_time(value) or value
+                return value
+            elif kind == NUMBER:
+                return float(value) if '.' in value else int(value)
+            elif kind == REGEX:
+                return value
+            elif kind == IDENT and tokens[start][2] in ('TRUE', 'FALSE'):
+                return tokens[start][2] == 'TRUE'
+        elif end - start == 2 and tokens[start][:2] == (OP, '-') and \
+                tokens[start + 1][0] == NUMBER:
+            value = tokens[start + 1][1]
+            return -(float(value) if '.' in value else int(value))
+        if end == start:
+            raise self.error("expected value")
+        return Expression(_render_tokens(tokens[start:end]))
+
+    def parse_group_by(self, query):
+        tokens = self.tokens
+        while True:
+            token = tokens[self.pos]
+            if token[2] == 'TIME' and tokens[self.pos + 1][0] == LPAREN:
+                start = self.pos = self.pos + 2
+                if tokens[start + 1][0] == RPAREN:
+                    self.pos += 1
+                else:
+                    self.pos = self._expression_end()
+                query._group_by_time = tokens[start][1] \
+                    if self.pos == start + 1 and tokens[start][0] == DURATION \
+                    else _render_tokens(tokens[start:self.pos])
+                if tokens[self.pos][0] == COMMA:
+                    raise self.unsupported("an offset in GROUP BY time()")
+                self.expect(RPAREN)
+            elif token[0] == OP and token[1] == '*':
+                self.pos += 1
+                query._group_by.append('*')
+            elif token[0] == IDENT and tokens[self.pos + 1][0] != DOT:
+                self.pos += 1
+                query._group_by.append(token[1])
+            else:
+                query._group_by.append(self.parse_path())
+            if tokens[self.pos][0] != COMMA:
+                break
+            self.pos += 1
+        if tokens[self.pos][2] == 'FILL':
+            self.pos += 1
+            self.expect(LPAREN)
+            sign = 1
+            if tokens[self.pos][:2] == (OP, '-'):
+                self.pos += 1
+                sign = -1
+            fill = self.next()
+            self.expect(RPAREN)
+            if fill[0] == NUMBER:
+                value = fill[1]
+                fill = sign * (float(value) if '.' in value else int(value))
+            elif fill[0] == IDENT and sign == 1 and \
+                    fill[1].lower() in FILL_OPTIONS:
+                fill = fill[1].lower()
+            else:
+                raise ParseError("unsupported fill(%s) in %r" % (
+                    fill[1], self.text))
+            query._group_by_fill = format_fill(fill)
+
+
+def parse(text):
+    """Parses a single SELECT or DELETE statement into a Query
+    """
+    statements = Parser(text).parse_statements()
+    if len(statements) != 1:
+        raise ParseError("expected one statement, found %i in %r" % (
+            len(statements), text))
+    return statements[0]
+
+
+def parse_all(text):
+    """Parses one or more semicolon separated statements into Queries
+    """
+    return Parser(text).parse_statements()
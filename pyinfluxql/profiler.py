@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.profiler
+    ~~~~~~~~~~~~~~~~~~~
+
+    Query shape statistics and a sampled slow query log
+
+    A dashboard sends the same few queries over and over with different
+    hosts and time ranges. `Profiler` groups executions by their shape, the
+    statement with where clause values and time bounds replaced by ``?``,
+    and keeps the count, latency and rows of the shapes costing the most
+    total time. At most `capacity` shapes are tracked, with the space-saving
+    algorithm: a new shape replaces the cheapest one and inherits its total
+    time as an overestimate, so the expensive shapes of a day are kept in
+    bounded memory without logging every request.
+
+    >>> profiler = Profiler(slow=1.0, slow_log='slow.log', dump='shapes.json',
+    ...                     dump_interval=300)
+    >>> engine = Engine(client, profiler=profiler)
+    >>> ...
+    >>> for shape in profiler.report(10):
+    ...     print(shape['total'], shape['count'], shape['shape'])
+
+    Queries slower than `slow` seconds are sampled at `sample_rate` into
+    the slow log, one JSON object per line with the full statement.
+"""
+
+import os
+import re
+import copy
+import json
+import heapq
+import random
+import tempfile
+import threading
+import time
+
+import six
+
+from .functions import Expression
+from .hedge import LatencyHistogram
+from .query import Query
+from .replay import result_rows
+
+#: stands in for the where clause values of a shape
+PLACEHOLDER = Expression('?')
+
+_literal = re.compile(r"""
+    '(?:[^'\\]|\\.)*'                   # string
+  | (?<=~)\s*/(?:[^/\\]|\\.)*/            # regex
+  | -?\b\d+(?:\.\d+)?(?:e[+-]?\d+)?     # number
+    (?:ns|u|ms|s|m|h|d|w)?\b            # or duration
+""", re.VERBOSE | re.IGNORECASE | re.UNICODE)
+
+_now = re.compile(r"now\(\)(?: [-+] \?)?", re.IGNORECASE)
+
+_repeated = re.compile(r"(\w+ (?:=|!=|=~|!~) \?)(?: (?:OR|AND) \1)+")
+
+
+def shape(statement):
+    """Returns the text of a query, or of a rendered statement, with where
+    clause values and time bounds replaced by ``?``. Lists of values
+    become a single ``?``.
+    """
+    if not isinstance(statement, Query):
+        from .parser import parse, ParseError
+        try:
+            statement = parse(six.text_type(statement))
+        except ParseError:
+            return _shape_text(six.text_type(statement))
+    # only the where clause changes, a shallow copy is enough
+    query = copy.copy(statement)
+    query._where = dict(
+        (key, [PLACEHOLDER] if key.rsplit('__', 1)[-1] in query.list_op
+         else PLACEHOLDER) for key in statement._where)
+    return str(query)
+
+
+def _shape_text(text):
+    """Replaces the literals of statement text the parser doesn't support,
+    including numbers outside the where clause
+    """
+    text = _literal.sub(lambda match: (
+        ' ?' if match.group(0)[0].isspace() else '?'), text)
+    text = _now.sub('?', ' '.join(text.split()))
+    return _repeated.sub(r'\1', text)
+
+
+def _digest(text):
+    import hashlib
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+class ShapeStats(object):
+    """The executions of one query shape. `error` is the total time the
+    shape may have inherited when it replaced another one.
+    """
+    def __init__(self, shape, inherited=0.0):
+        self.shape = shape
+        self.digest = _digest(shape)
+        self.count = 0
+        self.errors = 0
+        self.total = inherited
+        self.error = inherited
+        self.measured = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.counted = 0
+        self.histogram = LatencyHistogram(halflife=float('inf'))
+        self.slowest = None
+
+    def record(self, query, duration, rows, error):
+        self.count += 1
+        self.errors += bool(error)
+        self.total += duration
+        self.measured += duration
+        self.histogram.record(duration)
+        if rows is not None:
+            self.rows += rows
+            self.counted += 1
+        if duration >= self.max:
+            self.max = duration
+            self.slowest = str(query)
+
+    @property
+    def mean(self):
+        return self.measured / self.count if self.count else 0.0
+
+    def as_dict(self):
+        return {'shape': self.shape, 'digest': self.digest,
+                'count': self.count, 'errors': self.errors,
+                'total': self.total, 'error': self.error,
+                'mean': self.mean, 'p95': self.histogram.percentile(95),
+                'max': self.max, 'rows': self.rows,
+                'mean_rows': self.rows / float(self.counted)
+                if self.counted else None,
+                'slowest': self.slowest}
+
+
+class Profiler(object):
+    """Aggregates executions by query shape, keeping the `capacity` shapes
+    with the highest total latency, see the module docstring.
+
+    Queries taking at least `slow` seconds are appended to the `slow_log`
+    file with probability `sample_rate`. With `dump` the report is written
+    to that file every `dump_interval` seconds, checked as queries are
+    recorded, and on `close`.
+    """
+    def __init__(self, capacity=1000, slow=None, sample_rate=1.0,
+                 slow_log=None, dump=None, dump_interval=60,
+                 clock=time.time, random=random.random):
+        self.capacity = capacity
+        self.slow = slow
+        self.sample_rate = sample_rate
+        self.dump_path = dump
+        self.dump_interval = dump_interval
+        self.clock = clock
+        self.random = random
+        self.started = clock()
+        self.dumped = self.started
+        self.queries = 0
+        self.sampled = 0
+        # shape text -> ShapeStats, and a heap of (total, shape) with stale
+        # entries skipped when looking for the cheapest shape
+        self.shapes = {}
+        self._heap = []
+        self._lock = threading.Lock()
+        self._slow_log = open(slow_log, 'a') if slow_log else None
+
+    def record(self, query, duration, result=None, error=False, rows=None):
+        """Records an execution of `query` taking `duration` seconds, with
+        the rows of `result` or `rows` rows
+        """
+        text = shape(query)
+        if error:
+            rows = None
+        elif rows is None:
+            rows = result_rows(result)
+        sample = self.slow is not None and duration >= self.slow and \
+            self.random() < self.sample_rate
+        with self._lock:
+            self.queries += 1
+            stats = self.shapes.get(text)
+            if stats is None:
+                stats = self._add(text)
+            stats.record(query, duration, rows, error)
+            heapq.heappush(self._heap, (stats.total, text))
+            if len(self._heap) > 4 * self.capacity:
+                self._heap = [(s.total, t) for t, s in self.shapes.items()]
+                heapq.heapify(self._heap)
+            if sample:
+                self.sampled += 1
+                self._slow_log_write(stats, query, duration, rows, error)
+            due = self.dump_path is not None and \
+                self.clock() - self.dumped >= self.dump_interval
+            if due:
+                self.dumped = self.clock()
+        if due:
+            self.dump()
+
+    def record_chunks(self, query, chunks, started):
+        """Yields the chunks of a chunked result of `query` sent at
+        `started`, recording the execution once they're exhausted, the
+        generator is closed or a chunk fails
+        """
+        rows = 0
+        error = False
+        try:
+            for chunk in chunks:
+                counted = result_rows(chunk)
+                rows = None if rows is None or counted is None \
+                    else rows + counted
+                yield chunk
+        except GeneratorExit:
+            raise
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.record(query, self.clock() - started, error=error, rows=rows)
+
+    def _add(self, text):
+        inherited = 0.0
+        if len(self.shapes) >= self.capacity:
+            while True:
+                total, cheapest = heapq.heappop(self._heap)
+                stats = self.shapes.get(cheapest)
+                if stats is not None and stats.total == total:
+                    break
+            del self.shapes[cheapest]
+            inherited = total
+        stats = self.shapes[text] = ShapeStats(text, inherited)
+        return stats
+
+    def _slow_log_write(self, stats, query, duration, rows, error):
+        if self._slow_log is None:
+            return
+        self._slow_log.write(json.dumps({
+            'time': self.clock(), 'duration': duration, 'rows': rows,
+            'error': bool(error), 'digest': stats.digest,
+            'statement': str(query)}, sort_keys=True) + '\n')
+        self._slow_log.flush()
+
+    def report(self, n=None):
+        """Returns the statistics of the `n`, or all, tracked shapes with
+        the highest total latency as dicts
+        """
+        with self._lock:
+            shapes = [stats.as_dict() for stats in self.shapes.values()]
+        shapes.sort(key=lambda s: s['total'], reverse=True)
+        return shapes[:n] if n is not None else shapes
+
+    def dump(self, path=None):
+        """Writes the report to `path`, by default the `dump` file, replacing
+        it atomically
+        """
+        path = path or self.dump_path
+        now = self.clock()
+        report = {'started': self.started, 'time': now,
+                  'queries': self.queries, 'sampled': self.sampled,
+                  'shapes': self.report()}
+        with tempfile.NamedTemporaryFile(
+                'w', dir=os.path.dirname(os.path.abspath(path)),
+                suffix='.tmp', delete=False) as f:
+            json.dump(report, f, sort_keys=True)
+        os.rename(f.name, path)
+        self.dumped = now
+
+    def close(self):
+        if self.dump_path is not None:
+            self.dump()
+        if self._slow_log is not None:
+            self._slow_log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -6,15 +6,23 @@
     PyInfluxQL query generator
 """
 
-import re
 import six
 import datetime
 from copy import copy, deepcopy
-from dateutil.tz import tzutc
-from .functions import Func
-from .utils import format_timedelta, format_boolean
+from .functions import Expression, Func
+from .utils import (format_timedelta, format_boolean, format_datetime,
+                    format_epoch, floor_datetime, interval_to_timedelta,
+                    format_regex_alternation, format_fill, quote_string,
+                    EPOCH_PRECISIONS)
 
-UTC_TZ = tzutc()
+# characters allowed in an identifier checked by Query.validate
+_identifier_chars = frozenset(
+    'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_.-')
+
+
+def _is_identifier(name):
+    return bool(name) and (name[0].isalpha() or name[0] == '_') and \
+        _identifier_chars.issuperset(name)
 
 
 class Query(object):
@@ -24,8 +32,19 @@ class Query(object):
         'gt': '>',
         'gte': '>=',
         'lt': '<',
-        'lte': '<='
+        'lte': '<=',
+        'match': '=~',
+        'nmatch': '!~'
+    }
+    # comparators taking a list of values, mapped to the comparator applied to
+    # each value and the operator joining them
+    list_op = {
+        'in': ('eq', 'OR'),
+        'nin': ('ne', 'AND')
     }
+    # comparators rendering a list of values like the list comparator
+    _list_comparators = {'eq': 'in', 'ne': 'nin'}
+    _list_types = (list, tuple, set, frozenset)
     _numeric_types = (int, float)
     _order_identifiers = {'asc', 'desc'}
 
@@ -43,6 +62,7 @@ class Query(object):
         self._into_series = None
         self._order = None
         self._order_by = []
+        self._time_precision = None
 
     def clone(self):
         query = Query().from_(self._measurement)
@@ -52,11 +72,18 @@ class Query(object):
         query._where = deepcopy(self._where)
         query._group_by_time = copy(self._group_by_time)
         query._group_by = deepcopy(self._group_by)
+        query._group_by_fill = self._group_by_fill
+        query._start_time = self._start_time
+        query._end_time = self._end_time
+        query._into_series = self._into_series
+        query._order = self._order
+        query._order_by = list(self._order_by)
+        query._time_precision = self._time_precision
         return query
 
     def _format_select_expression(self, expr):
         formatted = expr
-        if issubclass(type(expr), Func):
+        if isinstance(expr, Expression):
             formatted = expr.format()
         return formatted
 
@@ -85,21 +112,36 @@ class Query(object):
         return clause
 
     def _format_value(self, value):
-        if isinstance(value, six.string_types):
+        if isinstance(value, Expression):
+            return value.format()
+        elif isinstance(value, six.string_types):
             if value[0] == '/':
                 return value
-            return "'%s'" % value
+            return quote_string(value)
         elif type(value) is bool:
             return format_boolean(value)
         elif isinstance(value, self._numeric_types):
             return "%r" % value
         elif isinstance(value, datetime.datetime):
-            if value.tzinfo:
-                value = value.astimezone(UTC_TZ)
-            dt = datetime.datetime.strftime(value, "%Y-%m-%d %H:%M:%S.%f")
-            return "'%s'" % dt[:-3]
+            if self._time_precision:
+                return format_epoch(value, self._time_precision)
+            return format_datetime(value)
 
     def _format_where_expression(self, identifiers, comparator, value):
+        if comparator in self.list_op:
+            comparator, operator = self.list_op[comparator]
+            if isinstance(value, (set, frozenset)):
+                value = sorted(value)
+            formatted = [self._format_where_expression(identifiers, comparator, v)
+                         for v in value]
+            if len(formatted) == 1:
+                return formatted[0]
+            return '(%s)' % (' %s ' % operator).join(formatted)
+        elif isinstance(value, self._list_types):
+            if comparator in self._list_comparators:
+                return self._format_where_expression(
+                    identifiers, self._list_comparators[comparator], value)
+            value = format_regex_alternation(value)
         return '%s %s %s' % ('.'.join(identifiers),
                              self.binary_op[comparator],
                              self._format_value(value))
@@ -115,7 +157,8 @@ class Query(object):
                 identifiers = [expression]
             else:
                 identifiers = expression.split('__')
-                if identifiers[-1] not in self.binary_op:
+                if identifiers[-1] not in self.binary_op and \
+                        identifiers[-1] not in self.list_op:
                     comparator = 'eq'
                 else:
                     comparator = identifiers[-1]
@@ -139,7 +182,7 @@ class Query(object):
                     time_format.append(time_fmt)
             clause = "GROUP BY " + ", ".join(time_format + self._group_by)
             if self._group_by_fill:
-                clause += ' fill(0)'
+                clause += ' fill(%s)' % self._group_by_fill
             return clause
         return ''
 
@@ -163,7 +206,8 @@ class Query(object):
     def _format_query(self, query):
         """Trims extra spaces and inserts a semicolon at the end
         """
-        query = re.sub(r' +', ' ', query)
+        while '  ' in query:
+            query = query.replace('  ', ' ')
         if query[-1] == ' ':
             query = query[:len(query) - 1]
         return query + ';'
@@ -191,6 +235,12 @@ class Query(object):
         self._measurement = measurement
         return self
 
+    def delete(self):
+        """Turns the query into a DELETE FROM ... WHERE statement
+        """
+        self._is_delete = True
+        return self
+
     def select(self, *expressions):
         """Could be a one or more column names or expressions composed of
         functions from http://influxdb.org/docs/query_language/functions.html
@@ -207,13 +257,29 @@ class Query(object):
                something__lt=somethingelse,
                something__gt=somethingelseelse)
 
-        See "The Where Clause" at http://influxdb.org/docs/query_language/
-        OR operations are not supported
+        Lists of values can be matched with OR chains or regexes:
+
+        .where(host__in=['a', 'b'])     # (host = 'a' OR host = 'b')
+        .where(host__nin=['a', 'b'])    # (host != 'a' AND host != 'b')
+        .where(host__match=['a', 'b'])  # host =~ /^(a|b)$/
+        .where(host__match='/^a/')      # host =~ /^a/
+        .where(host=['a', 'b'])         # like host__in, != like host__nin
 
-        TODO:
-            support OR operations by adding in some kind of _Or function
-            see http://docs.sqlalchemy.org/en/rel_0_9/orm/tutorial.html#common-filter-operators
+        See "The Where Clause" at http://influxdb.org/docs/query_language/
+        Other OR operations are not supported
         """
+        for key, value in clauses.items():
+            comparator = key.rsplit('__', 1)[-1]
+            if comparator in self.list_op or \
+                    isinstance(value, self._list_types):
+                if not isinstance(value, self._list_types):
+                    raise TypeError("%s requires a list of values" % key)
+                if not value:
+                    raise ValueError("%s requires at least one value" % key)
+                if comparator in self.binary_op and comparator not in \
+                        ('eq', 'ne', 'match', 'nmatch'):
+                    raise TypeError("%s can't compare with a list of values"
+                                    % key)
         self._where.update(clauses)
         return self
 
@@ -234,6 +300,17 @@ class Query(object):
             self._end_time = end
         return self
 
+    def time_precision(self, precision):
+        """Render datetime values as integer epoch literals with the given
+        precision ('ns', 'u', 'ms', 's', 'm' or 'h') instead of date strings,
+        e.g. `time > 1433548800s`. Pass None to go back to date strings.
+        """
+        if precision is not None and precision not in EPOCH_PRECISIONS:
+            raise ValueError("precision must be one of %s" % ", ".join(
+                sorted(EPOCH_PRECISIONS)))
+        self._time_precision = precision
+        return self
+
     @property
     def start_time(self):
         return self._start_time
@@ -243,10 +320,13 @@ class Query(object):
         return self._end_time
 
     def group_by(self, *columns, **kwargs):
+        """Groups by `columns` and a `time` interval. `fill` is a number or
+        one of 'none', 'null', 'previous' and 'linear', True means fill(0).
+        """
         if 'time' in kwargs and kwargs['time']:
             self._group_by_time = kwargs['time']
-        if 'fill' in kwargs and kwargs['fill']:
-            self._group_by_fill = True
+        if 'fill' in kwargs:
+            self._group_by_fill = format_fill(kwargs['fill'])
         if columns:
             self._group_by.extend(columns)
         return self
@@ -272,6 +352,138 @@ class Query(object):
         self._order = order.upper()
         return self
 
+    def _canonical_expression(self, expr):
+        """Aliases are dropped and quoted identifiers unquoted
+        """
+        if isinstance(expr, Func):
+            return (expr.identifier,) + tuple(
+                self._canonical_expression(arg) for arg in expr._args)
+        elif isinstance(expr, Expression):
+            return self._canonical_expression(expr._expression)
+        elif isinstance(expr, six.string_types) and len(expr) > 1 and \
+                expr[0] == '"' and expr[-1] == '"':
+            return expr[1:-1]
+        return expr
+
+    def _canonical_select(self, expr):
+        """A select expression with its unquoted alias, or None, aliases name
+        the result's columns
+        """
+        alias = None
+        if isinstance(expr, Expression) and expr._as:
+            alias = self._canonical_expression(expr._as)
+        return self._canonical_expression(expr), alias
+
+    def _canonical_where(self, bucket):
+        where = []
+        for key, value in self._where.items():
+            if key.endswith('__eq'):
+                key = key[:-4]
+            if key == 'time' or key.startswith('time__'):
+                if bucket and isinstance(value, datetime.datetime):
+                    value = format_datetime(floor_datetime(value, bucket))
+                elif not isinstance(value, Expression):
+                    value = None
+            if isinstance(value, Expression):
+                value = value.format()
+            elif isinstance(value, self._list_types):
+                value = tuple(sorted(value, key=repr))
+            elif isinstance(value, datetime.datetime):
+                value = format_datetime(value)
+            where.append((key, value))
+        where.sort(key=lambda item: item[0])
+        return where
+
+    def canonical(self, round_time=False):
+        """Returns a tuple describing the query independently of where clause
+        order, identifier quoting and time bounds
+
+        Time literals are dropped unless `round_time` is set, in which case
+        they are rounded down to the start of their group by time bucket.
+        """
+        group_by_time = self._group_by_time
+        if group_by_time:
+            group_by_time = interval_to_timedelta(group_by_time) or group_by_time
+        bucket = None
+        if round_time and isinstance(group_by_time, datetime.timedelta):
+            bucket = group_by_time
+        return (
+            self._is_delete,
+            self._canonical_expression(self._measurement),
+            tuple(self._canonical_select(e) for e in self._select_expressions),
+            tuple(self._canonical_where(bucket)),
+            group_by_time,
+            tuple(sorted(self._canonical_expression(g) for g in self._group_by)),
+            self._group_by_fill,
+            self._limit,
+            self._into_series,
+            self._order,
+        )
+
+    def _validate_name(self, name, known, kind, errors):
+        name = self._canonical_expression(name)
+        if not isinstance(name, six.string_types) or name == '*' or \
+                not _is_identifier(name) or name in known:
+            return
+        import difflib
+        close = difflib.get_close_matches(name, known, 1)
+        errors.append("unknown %s %r%s" % (
+            kind, name, ", did you mean %r?" % close[0] if close else ""))
+
+    def _validate_expression(self, expr, fields, tags, errors):
+        if isinstance(expr, Func):
+            for arg in expr._args:
+                if isinstance(arg, Expression):
+                    self._validate_expression(arg, fields, tags, errors)
+                else:
+                    self._validate_name(arg, fields, 'field', errors)
+        elif isinstance(expr, Expression):
+            self._validate_expression(expr._expression, fields, tags, errors)
+        else:
+            self._validate_name(expr, fields | tags, 'field or tag', errors)
+
+    def validate(self, catalog):
+        """Checks the measurement, selected fields, where keys and group by
+        tags against a `pyinfluxql.catalog.Catalog` so that typos fail before
+        a request is sent. Raises a ValueError listing the unknown names.
+
+        Queries on a regex measurement and expressions other than plain
+        identifiers aren't checked.
+        """
+        measurement = self._canonical_expression(self._measurement)
+        if not measurement or measurement[0] == '/':
+            return
+        errors = []
+        self._validate_name(measurement, catalog.measurements(), 'measurement',
+                            errors)
+        if errors:
+            raise ValueError("Invalid query: %s" % "; ".join(errors))
+        fields = frozenset(catalog.field_keys(measurement))
+        tags = frozenset(catalog.tag_keys(measurement))
+        for expr in self._select_expressions:
+            self._validate_expression(expr, fields, tags, errors)
+        for key in sorted(self._where):
+            identifiers = key.split('__')
+            if identifiers[-1] in self.binary_op or \
+                    identifiers[-1] in self.list_op:
+                identifiers = identifiers[:-1]
+            if len(identifiers) == 1 and identifiers[0] != 'time':
+                self._validate_name(identifiers[0], fields | tags,
+                                    'field or tag', errors)
+        for tag in self._group_by:
+            self._validate_name(tag, tags, 'tag', errors)
+        if errors:
+            raise ValueError("Invalid query on %s: %s" % (
+                measurement, "; ".join(errors)))
+
+    def fingerprint(self, round_time=False):
+        """Returns a stable hex digest of the canonical form of the query, for
+        use as a cache key or metrics label. See `canonical`.
+        """
+        import hashlib
+        canonical = repr(self.canonical(round_time))
+        return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
     def __str__(self):
         return self._format()
 
@@ -296,3 +508,140 @@ class ContinuousQuery(object):
 
     def __unicode__(self):
         return self._format()
+
+
+class Show(Query):
+    """Base class for SHOW statements. FROM, WHERE and LIMIT clauses are
+    built and rendered the same way as for a select.
+    """
+    statement = None
+
+    def __init__(self, measurement=None):
+        super(Show, self).__init__()
+        self._measurement = measurement
+
+    def _format_from(self):
+        if self._measurement is None:
+            return ''
+        return super(Show, self)._format_from()
+
+    def clone(self):
+        """Returns a copy of the statement, keeping its class
+        """
+        return deepcopy(self)
+
+    def _format_with(self):
+        return ''
+
+    def _format(self):
+        return self._format_query("SHOW %s %s %s %s %s" % (
+            self.statement, self._format_from(), self._format_with(),
+            self._format_where(), self._format_limit()))
+
+
+class ShowMeasurements(Show):
+    """SHOW MEASUREMENTS, optionally filtered by a regex on the name
+    """
+    statement = 'MEASUREMENTS'
+
+    def __init__(self, regex=None):
+        super(ShowMeasurements, self).__init__()
+        self._regex = regex
+
+    def _format_from(self):
+        return ''
+
+    def _format_with(self):
+        if self._regex:
+            return 'WITH MEASUREMENT =~ %s' % self._regex
+        return ''
+
+
+class ShowTagKeys(Show):
+    statement = 'TAG KEYS'
+
+
+class ShowTagValues(Show):
+    """SHOW TAG VALUES of one key or a list of keys
+    """
+    statement = 'TAG VALUES'
+
+    def __init__(self, keys, measurement=None):
+        super(ShowTagValues, self).__init__(measurement)
+        if isinstance(keys, six.string_types):
+            keys = [keys]
+        if not keys:
+            raise ValueError("SHOW TAG VALUES requires at least one key")
+        self._keys = list(keys)
+
+    def _format_with(self):
+        if len(self._keys) == 1:
+            return 'WITH KEY = "%s"' % self._keys[0]
+        return 'WITH KEY IN (%s)' % ", ".join('"%s"' % k for k in self._keys)
+
+
+class ShowFieldKeys(Show):
+    statement = 'FIELD KEYS'
+
+
+class ShowSeries(Show):
+    statement = 'SERIES'
+
+
+class ShowSeriesCardinality(Show):
+    """SHOW SERIES EXACT CARDINALITY, the number of series counted by the
+    server without listing them, or its estimate unless `exact`
+    """
+    def __init__(self, measurement=None, exact=True):
+        super(ShowSeriesCardinality, self).__init__(measurement)
+        self.statement = 'SERIES EXACT CARDINALITY' if exact \
+            else 'SERIES CARDINALITY'
+
+
+class DropSeries(Query):
+    """DROP SERIES FROM ... WHERE, the where clause may only filter on tags
+    """
+    def __init__(self, measurement=None):
+        super(DropSeries, self).__init__()
+        self._measurement = measurement
+
+    def clone(self):
+        """Returns a copy of the statement, keeping its class
+        """
+        return deepcopy(self)
+
+    def _check_keys(self, keys):
+        for key in keys:
+            if key == 'time' or key.startswith('time__'):
+                raise ValueError("DROP SERIES can't filter on time")
+
+    def where(self, **clauses):
+        self._check_keys(clauses)
+        return super(DropSeries, self).where(**clauses)
+
+    def date_range(self, start=None, end=None):
+        self._check_keys(['time'])
+
+    def _format(self):
+        if self._measurement is None and not self._where:
+            raise ValueError("DROP SERIES requires a measurement or a where "
+                             "clause")
+        clause = ''
+        if self._measurement is not None:
+            clause = self._format_from()
+        return self._format_query("DROP SERIES %s %s" % (
+            clause, self._format_where()))
+
+
+class DropMeasurement(object):
+    def __init__(self, measurement):
+        self.measurement = measurement
+
+    def _format(self):
+        return 'DROP MEASUREMENT "%s";' % self.measurement.replace('"', '\\"')
+
+    def __str__(self):
+        return self._format()
+
+    def __unicode__(self):
+        return six.u(self._format())
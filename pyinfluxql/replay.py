@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.replay
+    ~~~~~~~~~~~~~~~~~
+
+    Records production query traffic and replays it for load testing
+
+    `Recorder` wraps an engine and appends a line for every executed query
+    to a log: when it started, how long it took, how many rows it returned,
+    its fingerprint, the client arguments and the rendered statement.
+    `Replayer` sends the logged statements to another engine with the
+    original pacing, or sped up, and reports latency percentiles and
+    throughput next to the recorded ones.
+
+    >>> engine = Recorder(Engine(client), 'traffic.log')
+    >>> engine.execute(query)
+    >>> replayer = Replayer('traffic.log')
+    >>> report = replayer.run(Engine(staging_client), speed=2, concurrency=8)
+    >>> report.compare()
+"""
+
+import json
+import time
+import threading
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+import six
+
+from .query import Query
+
+#: the client arguments worth recording, others are specific to the caller
+RECORDED_KWARGS = ('database', 'epoch', 'chunked', 'chunk_size', 'method')
+
+PERCENTILES = (50, 90, 95, 99)
+
+Record = namedtuple('Record', ['start', 'duration', 'rows', 'fingerprint',
+                               'kwargs', 'statement', 'error'])
+
+
+def result_rows(result):
+    """Returns the number of rows in a result, or None if it can't be
+    counted without consuming it
+    """
+    if hasattr(result, 'series') and hasattr(result, 'raw'):
+        # a CompactResult, without building its raw dict
+        return sum(series.length for series in result.series)
+    if hasattr(result, 'raw'):
+        return sum(len(series.get('values', []))
+                   for series in result.raw.get('series', []))
+    if isinstance(result, list):
+        rows = [result_rows(r) for r in result]
+        return None if None in rows else sum(rows)
+    if hasattr(result, 'columns') and hasattr(result, '__len__'):
+        return len(result)
+    return None
+
+
+def fingerprint(statement):
+    """The fingerprint of a query, or of the text of a rendered statement
+    """
+    if isinstance(statement, Query):
+        return statement.fingerprint()
+    import hashlib
+    return hashlib.sha1(six.text_type(statement).encode('utf-8')).hexdigest()
+
+
+def format_record(record):
+    """A record as a tab separated log line
+    """
+    return '%.6f\t%.6f\t%s\t%s\t%s\t%s\t%s\n' % (
+        record.start, record.duration,
+        '-' if record.rows is None else record.rows,
+        record.fingerprint[:16],
+        json.dumps(record.kwargs, sort_keys=True, separators=(',', ':')),
+        'E' if record.error else '-', json.dumps(record.statement))
+
+
+def parse_record(line):
+    start, duration, rows, digest, kwargs, error, statement = \
+        line.rstrip('\n').split('\t', 6)
+    return Record(float(start), float(duration),
+                  None if rows == '-' else int(rows), digest,
+                  json.loads(kwargs), json.loads(statement), error == 'E')
+
+
+def read_records(path):
+    """Yields the records of a traffic log
+    """
+    with open(path) as f:
+        for line in f:
+            if line.strip() and not line.startswith('#'):
+                yield parse_record(line)
+
+
+class Recorder(object):
+    """Executes queries with `engine`, appending a record of each to the
+    log at `path`. Other attributes are looked up on the engine.
+    """
+    def __init__(self, engine, path, clock=time.time):
+        self.engine = engine
+        self.path = path
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._file = open(path, 'a')
+
+    def __getattr__(self, name):
+        return getattr(self.engine, name)
+
+    def execute(self, query, **kwargs):
+        start = self.clock()
+        error = False
+        result = None
+        try:
+            result = self.engine.execute(query, **kwargs)
+            return result
+        except Exception:
+            error = True
+            raise
+        finally:
+            duration = self.clock() - start
+            self.record(Record(
+                start, duration, None if error else result_rows(result),
+                fingerprint(query),
+                dict((k, v) for k, v in kwargs.items()
+                     if k in RECORDED_KWARGS),
+                str(query), error))
+
+    def record(self, record):
+        line = format_record(record)
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def percentile(values, p):
+    """The `p`th percentile of sorted `values`, nearest rank
+    """
+    if not values:
+        return 0.0
+    return values[int(p / 100.0 * (len(values) - 1))]
+
+
+class Stats(object):
+    """Latency percentiles and throughput of a list of records
+    """
+    def __init__(self, records):
+        records = list(records)
+        self.queries = len(records)
+        self.errors = sum(1 for r in records if r.error)
+        latencies = sorted(r.duration for r in records)
+        self.latencies = dict((p, percentile(latencies, p))
+                              for p in PERCENTILES)
+        self.latencies['max'] = latencies[-1] if latencies else 0.0
+        self.mean = sum(latencies) / len(latencies) if latencies else 0.0
+        if records:
+            self.elapsed = max(r.start + r.duration for r in records) - \
+                min(r.start for r in records)
+        else:
+            self.elapsed = 0.0
+        self.throughput = self.queries / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        stats = {'queries': self.queries, 'errors': self.errors,
+                 'elapsed': self.elapsed, 'throughput': self.throughput,
+                 'mean': self.mean}
+        for p, latency in self.latencies.items():
+            stats['p%s' % p if p != 'max' else 'max'] = latency
+        return stats
+
+
+class Report(object):
+    """The replayed and recorded `Stats`, and the replayed records in the
+    order of the recording
+    """
+    def __init__(self, recorded, replayed, speed, lag):
+        self.recorded_records = recorded
+        self.replayed_records = replayed
+        self.recorded = Stats(recorded)
+        self.replayed = Stats(replayed)
+        self.speed = speed
+        #: seconds queries started behind schedule, at the most
+        self.lag = lag
+
+    @property
+    def row_mismatches(self):
+        """Records whose replay returned a different number of rows
+        """
+        pairs = zip(self.recorded_records, self.replayed_records)
+        return [(a, b) for a, b in pairs
+                if None not in (a.rows, b.rows) and a.rows != b.rows]
+
+    def compare(self):
+        """Returns {stat: (recorded, replayed, replayed / recorded)}, the
+        recorded throughput is scaled by the replay speed
+        """
+        recorded = self.recorded.as_dict()
+        replayed = self.replayed.as_dict()
+        if self.speed:
+            recorded['throughput'] *= self.speed
+        comparison = {}
+        for key in sorted(recorded):
+            a, b = recorded[key], replayed[key]
+            comparison[key] = (a, b, b / float(a) if a else None)
+        return comparison
+
+    def __str__(self):
+        lines = ['%-10s %12s %12s %8s' % ('', 'recorded', 'replayed',
+                                          'ratio')]
+        for key, (a, b, ratio) in sorted(self.compare().items()):
+            lines.append('%-10s %12.4f %12.4f %8s' % (
+                key, a, b, '-' if ratio is None else '%.2f' % ratio))
+        return '\n'.join(lines)
+
+
+class Replayer(object):
+    """Replays the records of a traffic log, or an iterable of records
+    """
+    def __init__(self, records, clock=time.time, sleep=time.sleep):
+        if isinstance(records, six.string_types):
+            records = read_records(records)
+        self.records = sorted(records, key=lambda r: r.start)
+        self.clock = clock
+        self.sleep = sleep
+
+    def _execute(self, target, record):
+        start = self.clock()
+        error = False
+        result = None
+        try:
+            result = target.execute(record.statement, **record.kwargs)
+        except Exception:
+            error = True
+        duration = self.clock() - start
+        return Record(start, duration,
+                      None if error else result_rows(result),
+                      record.fingerprint, record.kwargs, record.statement,
+                      error)
+
+    def run(self, target, speed=1.0, concurrency=4):
+        """Sends the statements to the engine `target`, `speed` times faster
+        than recorded, or as fast as possible if `speed` is None, with up to
+        `concurrency` queries at once. Returns a `Report`.
+
+        Queries that can't start on time because all `concurrency` slots are
+        busy start late, the largest delay is the report's `lag`.
+        """
+        if not self.records:
+            return Report([], [], speed, 0.0)
+        first = self.records[0].start
+        began = self.clock()
+        lag = 0.0
+        if concurrency <= 1:
+            replayed = []
+            for record in self.records:
+                lag = max(lag, self._wait(record, first, began, speed))
+                replayed.append(self._execute(target, record))
+            return Report(self.records, replayed, speed, lag)
+
+        pool = ThreadPool(concurrency)
+        slots = threading.Semaphore(concurrency)
+
+        def execute(record):
+            try:
+                return self._execute(target, record)
+            finally:
+                slots.release()
+        try:
+            pending = []
+            for record in self.records:
+                self._wait(record, first, began, speed)
+                slots.acquire()
+                lag = max(lag, self._late(record, first, began, speed))
+                pending.append(pool.apply_async(execute, (record,)))
+            replayed = [p.get() for p in pending]
+        finally:
+            pool.close()
+            pool.join()
+        return Report(self.records, replayed, speed, lag)
+
+    def _late(self, record, first, began, speed):
+        if not speed:
+            return 0.0
+        due = (record.start - first) / float(speed)
+        return max(0.0, self.clock() - began - due)
+
+    def _wait(self, record, first, began, speed):
+        if speed:
+            delay = (record.start - first) / float(speed) - \
+                (self.clock() - began)
+            if delay > 0:
+                self.sleep(delay)
+        return self._late(record, first, began, speed)
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.scheduler
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Admission control in front of an engine, so alerting and dashboard
+    queries don't wait behind batch work
+
+    Every query is submitted with a priority class. Classes are dispatched in
+    priority order, each with an optional concurrency limit, token bucket
+    rate limit and deadline on the time spent queued. When the queue is full
+    the lowest priority work is shed first.
+
+    >>> scheduler = Scheduler(engine, concurrency=4)
+    >>> scheduler.execute(query, priority='alert')
+    >>> ticket = scheduler.submit(export_query, priority='batch')
+    >>> ticket.result(timeout=60)
+
+    The scheduling itself happens in `step`, which only looks at the clock,
+    so it can be driven by hand with a `FakeClock` and a `ManualExecutor`.
+"""
+
+import time
+import threading
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+QUEUED, RUNNING, DONE, SHED = 'queued', 'running', 'done', 'shed'
+
+WAIT_SAMPLES = 1000
+
+
+class QueryShed(RuntimeError):
+    """Raised by `Ticket.result` for queries dropped by the scheduler
+    """
+
+
+class PriorityClass(object):
+    """A priority class, lower `priority` values are dispatched first.
+
+    `concurrency` limits the queries of the class running at once, `rate`
+    and `burst` configure a token bucket limiting the queries started per
+    second, and queries queued for longer than `deadline` seconds are shed.
+    """
+    def __init__(self, name, priority, concurrency=None, rate=None,
+                 burst=None, deadline=None):
+        self.name = name
+        self.priority = priority
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.deadline = deadline
+
+
+DEFAULT_CLASSES = (
+    PriorityClass('alert', 0, deadline=1),
+    PriorityClass('interactive', 1, deadline=10),
+    PriorityClass('batch', 2, concurrency=2),
+)
+
+
+class TokenBucket(object):
+    """Allows `rate` events per second on average and bursts of `burst`
+    """
+    def __init__(self, rate, burst=None, clock=time.time):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        """Takes a token if there is one, returns whether it did
+        """
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self):
+        """Seconds until the next token is available
+        """
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class Ticket(object):
+    """A submitted query, `result` blocks until it ran or was shed
+    """
+    def __init__(self, query, priority_class, kwargs, submitted):
+        self.query = query
+        self.priority_class = priority_class
+        self.kwargs = kwargs
+        self.submitted = submitted
+        self.started = None
+        self.state = QUEUED
+        self._result = None
+        self._error = None
+        self._done = threading.Event()
+
+    @property
+    def wait_time(self):
+        if self.started is None:
+            return None
+        return self.started - self.submitted
+
+    def done(self):
+        return self._done.is_set()
+
+    def _finish(self, state, result=None, error=None):
+        self.state = state
+        self._result = result
+        self._error = error
+        self._done.set()
+
+    def result(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise RuntimeError("Timed out waiting for %s" % self.query)
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class _ClassState(object):
+    def __init__(self, priority_class, clock):
+        self.priority_class = priority_class
+        self.queue = deque()
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.shed = 0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+        self.bucket = None
+        if priority_class.rate:
+            self.bucket = TokenBucket(priority_class.rate,
+                                      priority_class.burst, clock)
+
+    def metrics(self):
+        waits = sorted(self.waits)
+        return {
+            'queue_depth': len(self.queue),
+            'running': self.running,
+            'completed': self.completed,
+            'failed': self.failed,
+            'shed': self.shed,
+            'wait_mean': sum(waits) / len(waits) if waits else 0.0,
+            'wait_p95': waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+            'wait_max': waits[-1] if waits else 0.0,
+        }
+
+
+class Scheduler(object):
+    """Dispatches queries to `engine` by priority class.
+
+    `concurrency` is the number of queries running at once across all
+    classes and `max_queue` the number of queries that may be waiting.
+    `executor` is called with a function to run for every dispatched query,
+    by default it's run on a thread pool of `concurrency` threads.
+    """
+    def __init__(self, engine, classes=DEFAULT_CLASSES, concurrency=8,
+                 max_queue=None, clock=time.time, executor=None):
+        self.engine = engine
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.clock = clock
+        self._classes = sorted(classes, key=lambda c: c.priority)
+        self._states = dict((c.name, _ClassState(c, clock))
+                            for c in self._classes)
+        self._lock = threading.RLock()
+        self._timer = None
+        self._pool = None
+        if executor is None:
+            self._pool = ThreadPool(concurrency)
+            executor = self._pool.apply_async
+        self.executor = executor
+
+    @property
+    def running(self):
+        return sum(s.running for s in self._states.values())
+
+    @property
+    def queued(self):
+        return sum(len(s.queue) for s in self._states.values())
+
+    def submit(self, query, priority='interactive', **kwargs):
+        """Queues a query, keyword arguments are passed on to
+        `Engine.execute`. Returns a `Ticket`.
+        """
+        if priority not in self._states:
+            raise ValueError("Unknown priority class %r" % priority)
+        state = self._states[priority]
+        ticket = Ticket(query, state.priority_class, kwargs, self.clock())
+        with self._lock:
+            state.queue.append(ticket)
+            if self.max_queue is not None and self.queued > self.max_queue:
+                self._shed_lowest()
+        self.step()
+        return ticket
+
+    def execute(self, query, priority='interactive', timeout=None, **kwargs):
+        """Submits a query and waits for its result
+        """
+        return self.submit(query, priority, **kwargs).result(timeout)
+
+    def _shed(self, state, ticket, reason):
+        state.shed += 1
+        ticket._finish(SHED, error=QueryShed(
+            "%s query shed (%s): %s" % (state.priority_class.name, reason,
+                                        ticket.query)))
+
+    def _shed_lowest(self):
+        for priority_class in reversed(self._classes):
+            state = self._states[priority_class.name]
+            if state.queue:
+                self._shed(state, state.queue.pop(), 'queue full')
+                return
+
+    def step(self):
+        """Sheds queued queries past their deadline and dispatches as many
+        queued queries as the limits allow. Returns the tickets started.
+        """
+        started = []
+        wake = None
+        with self._lock:
+            now = self.clock()
+            for priority_class in self._classes:
+                state = self._states[priority_class.name]
+                deadline = priority_class.deadline
+                while deadline is not None and state.queue and \
+                        now - state.queue[0].submitted > deadline:
+                    self._shed(state, state.queue.popleft(), 'deadline')
+            for priority_class in self._classes:
+                state = self._states[priority_class.name]
+                limit = priority_class.concurrency
+                while state.queue and self.running < self.concurrency and \
+                        (limit is None or state.running < limit):
+                    if state.bucket is not None and not state.bucket.take():
+                        delay = state.bucket.wait_time()
+                        wake = delay if wake is None else min(wake, delay)
+                        break
+                    ticket = state.queue.popleft()
+                    ticket.state = RUNNING
+                    ticket.started = now
+                    state.running += 1
+                    state.waits.append(now - ticket.submitted)
+                    started.append(ticket)
+        for ticket in started:
+            self.executor(self._run, (ticket,))
+        if wake is not None and self._pool is not None:
+            self._schedule_wake(wake)
+        return started
+
+    def _schedule_wake(self, delay):
+        # rate limited work isn't started by a submit or a finished query,
+        # so check back once the next token is available
+        with self._lock:
+            if self._timer is not None and self._timer.is_alive():
+                return
+            self._timer = threading.Timer(delay, self.step)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _run(self, ticket):
+        state = self._states[ticket.priority_class.name]
+        try:
+            result = self.engine.execute(ticket.query, **ticket.kwargs)
+        except Exception as e:
+            with self._lock:
+                state.running -= 1
+                state.failed += 1
+            ticket._finish(DONE, error=e)
+        else:
+            with self._lock:
+                state.running -= 1
+                state.completed += 1
+            ticket._finish(DONE, result=result)
+        self.step()
+
+    def metrics(self):
+        """Returns queue depth, running, completed, failed and shed counts
+        and wait times in seconds for every priority class
+        """
+        with self._lock:
+            return dict((name, state.metrics())
+                        for name, state in self._states.items())
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+
+
+class FakeClock(object):
+    """A clock that only moves when told to, for driving a scheduler in
+    tests
+    """
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class ManualExecutor(object):
+    """Collects dispatched queries instead of running them, `run` runs
+    them in order
+    """
+    def __init__(self):
+        self.pending = deque()
+
+    def __call__(self, function, args):
+        self.pending.append((function, args))
+
+    def __len__(self):
+        return len(self.pending)
+
+    def run(self, n=None):
+        """Runs `n` of the dispatched queries, or all of them including
+        those dispatched while running
+        """
+        ran = 0
+        while self.pending and (n is None or ran < n):
+            function, args = self.pending.popleft()
+            function(*args)
+            ran += 1
+        return ran
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.spill
+    ~~~~~~~~~~~~~~~~
+
+    Spilling large results to memory-mapped temporary files
+
+    `ResultBuilder` gathers the packed series of a response, or of all the
+    chunks of a chunked response, into a `pyinfluxql.compact.CompactResult`.
+    Once the columns it holds take more than `budget` bytes they're moved to
+    temporary files, and every later value is appended to those files. The
+    result reads them through `mmap`, so pages are loaded when they're read
+    and can be dropped again by the OS under memory pressure.
+
+    >>> decoder = Decoder('orjson', spill_budget=256 * 2 ** 20)
+    >>> engine = Engine(client, decoder=decoder)
+    >>> result = engine.execute(query, format='compact', chunked=True,
+    ...                         chunk_size=10000)
+    >>> result.series[0].to_numpy('value')  # a view of the mapped file
+
+    Numeric columns are files of int64 or float64 values, other columns
+    files of JSON values with a file of their end offsets.
+"""
+
+import json
+import mmap
+import tempfile
+from array import array
+
+from .decode import INTEGER, FLOAT, OBJECT, unpack_column
+
+#: estimated bytes per value of a column kept as a list
+OBJECT_VALUE_SIZE = 64
+
+#: values converted at a time when a spilled column changes type
+_BLOCK = 2 ** 16
+
+_nan = float('nan')
+
+
+class SpilledArray(object):
+    """A read-only int64 or float64 column mapped from a file
+    """
+    def __init__(self, file, typecode, length):
+        self.typecode = typecode
+        self._file = file
+        self._mmap = None
+        self._view = memoryview(b'').cast(typecode)
+        if length:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap).cast(typecode)[:length]
+
+    def __len__(self):
+        return len(self._view)
+
+    def __getitem__(self, index):
+        return self._view[index]
+
+    def __iter__(self):
+        return iter(self._view)
+
+    def tolist(self):
+        return self._view.tolist()
+
+    def to_numpy(self):
+        import numpy
+        return numpy.frombuffer(self._view, dtype=self.typecode)
+
+    def close(self):
+        self._view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+
+class SpilledObjects(object):
+    """A read-only column of JSON values mapped from a file, decoded when
+    they're read
+    """
+    typecode = OBJECT
+
+    def __init__(self, file, ends):
+        self._file = file
+        self._ends = ends
+        self._mmap = None
+        if len(ends):
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self._ends)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self._ends)
+        start = self._ends[index - 1] if index else 0
+        return json.loads(self._mmap[start:self._ends[index]].decode('utf-8'))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def tolist(self):
+        return list(self)
+
+    def close(self):
+        self._ends.close()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+
+class Column(object):
+    """One column of a series being gathered, in memory until `spill`
+    """
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.typecode = None
+        self.has_nulls = False
+        self.nulls_only = True
+        self.data = None
+        self.file = None
+        self.ends = None
+        self.length = 0
+        self.offset = 0
+
+    @property
+    def spilled(self):
+        return self.file is not None
+
+    def size(self):
+        if self.spilled or self.data is None:
+            return 0
+        if self.typecode == OBJECT:
+            return len(self.data) * OBJECT_VALUE_SIZE
+        return len(self.data) * self.data.itemsize
+
+    def _tempfile(self):
+        return tempfile.TemporaryFile(prefix='pyinfluxql-spill-',
+                                      dir=self.directory)
+
+    def extend(self, typecode, has_nulls, values):
+        """Appends a packed chunk of the column, widening the column to
+        float or object values if the chunk needs it
+        """
+        if not len(values):
+            # an empty chunk packs as an object column, it mustn't type or
+            # widen the column
+            return
+        nulls_only = typecode == OBJECT and \
+            all(value is None for value in values)
+        if self.typecode is None:
+            self.typecode = typecode
+            self.nulls_only = nulls_only
+            if not self.spilled:
+                self.data = array(typecode) if typecode != OBJECT else []
+        elif nulls_only and self.typecode != OBJECT:
+            # a chunk without any values doesn't make a number column
+            # an object column
+            typecode, values = FLOAT, array(FLOAT, [_nan] * len(values))
+            if self.typecode == INTEGER:
+                self._widen(FLOAT)
+        elif self.nulls_only and typecode != OBJECT:
+            self._widen(FLOAT)
+            values = array(FLOAT, values)
+        elif typecode != self.typecode:
+            if OBJECT in (typecode, self.typecode):
+                self._widen(OBJECT)
+                values = unpack_column(typecode, has_nulls, values)
+            elif self.typecode == INTEGER:
+                self._widen(FLOAT)
+            else:
+                values = array(FLOAT, values)
+        self.has_nulls = self.has_nulls or has_nulls
+        self.nulls_only = self.nulls_only and nulls_only
+        self._append(values)
+
+    def _append(self, values):
+        self.length += len(values)
+        if not self.spilled:
+            self.data.extend(values)
+        elif self.typecode == OBJECT:
+            ends = array(INTEGER)
+            for value in values:
+                encoded = json.dumps(value).encode('utf-8')
+                self.file.write(encoded)
+                self.offset += len(encoded)
+                ends.append(self.offset)
+            self.ends.write(ends.tobytes())
+        else:
+            self.file.write(values.tobytes())
+
+    def _blocks(self):
+        """Returns an iterator over the values so far in lists, from memory
+        or the files
+        """
+        if not self.spilled:
+            return iter([list(self.data)])
+        values, length = self.packed()[2], self.length
+        return ([values[i] for i in range(start, min(start + _BLOCK, length))]
+                for start in range(0, length, _BLOCK))
+
+    def _widen(self, typecode):
+        """Rewrites the values so far as `typecode`
+        """
+        old = self.typecode
+        spilled = self.spilled
+        blocks = self._blocks()
+        files = (self.file, self.ends)
+        self.typecode = typecode
+        self.data = array(typecode) if typecode != OBJECT else []
+        self.file = self.ends = None
+        self.length = self.offset = 0
+        if spilled:
+            self.spill()
+        for block in blocks:
+            if typecode == OBJECT:
+                if old != OBJECT:
+                    block = unpack_column(old, self.has_nulls,
+                                          array(old, block))
+                self._append(block)
+            else:
+                self._append(array(typecode, [
+                    _nan if value is None else value for value in block]))
+        for file in files:
+            if file is not None:
+                file.close()
+
+    def spill(self):
+        """Moves the column to temporary files
+        """
+        if self.spilled:
+            return
+        data = self.data
+        self.data = None
+        self.file = self._tempfile()
+        self.ends = self._tempfile()
+        if data:
+            self.length -= len(data)
+            self._append(data)
+
+    def packed(self):
+        """Returns the column as (typecode, has_nulls, data), with mapped
+        views of the files when it's spilled
+        """
+        typecode = self.typecode or OBJECT
+        if not self.spilled:
+            return typecode, self.has_nulls, self.data or []
+        self.file.flush()
+        if typecode == OBJECT:
+            self.ends.flush()
+            ends = SpilledArray(self.ends, INTEGER, self.length)
+            return typecode, self.has_nulls, SpilledObjects(self.file, ends)
+        return typecode, self.has_nulls, SpilledArray(self.file, typecode,
+                                                      self.length)
+
+
+class ResultBuilder(object):
+    """Gathers packed results (see `pyinfluxql.decode.pack_results`) of one
+    statement into a `CompactResult`, moving the columns to temporary files
+    in `directory` once they take more than `budget` bytes
+    """
+    def __init__(self, budget=None, directory=None):
+        self.budget = budget
+        self.directory = directory
+        self.spilled = False
+        self.statement_id = None
+        self.error = None
+        # (name, tags, columns) -> [Column]
+        self.series = {}
+        self._order = []
+
+    def size(self):
+        return sum(c.size() for columns in self.series.values()
+                   for c in columns)
+
+    def add(self, result):
+        """Adds a packed result, or one chunk of it
+        """
+        if self.statement_id is None:
+            self.statement_id = result.get('statement_id')
+        if result.get('error') is not None:
+            self.error = result['error']
+        for series in result.get('series', []):
+            key = (series.get('name'),
+                   tuple(sorted((series.get('tags') or {}).items())),
+                   tuple(series['columns']))
+            columns = self.series.get(key)
+            if columns is None:
+                columns = self.series[key] = [
+                    Column(self.directory) for _ in series['columns']]
+                self._order.append(key)
+                if self.spilled:
+                    for column in columns:
+                        column.spill()
+            for column, packed in zip(columns, series['packed']):
+                column.extend(*packed)
+        if not self.spilled and self.budget is not None and \
+                self.size() > self.budget:
+            self.spill()
+
+    def spill(self):
+        self.spilled = True
+        for columns in self.series.values():
+            for column in columns:
+                column.spill()
+
+    def result(self, raise_errors=True):
+        from .compact import CompactResult, CompactSeries, Interner
+        interner = Interner()
+        series_list = []
+        for name, tags, columns in self._order:
+            names, index = interner.intern_columns(columns)
+            series_list.append(CompactSeries(
+                name or 'results', interner.intern_tags(dict(tags)), names,
+                index, [c.packed() for c in self.series[
+                    (name, tags, columns)]]))
+        return CompactResult(series_list, self.statement_id, self.error,
+                             raise_errors)
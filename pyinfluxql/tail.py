@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.tail
+    ~~~~~~~~~~~~~~~
+
+    Incremental refreshes of a query
+
+    An auto-refreshing panel doesn't need to run its whole date_range every
+    few seconds. `Tail` runs the query once, then on every tick only asks
+    for points after the last time it has seen. For a GROUP BY time query
+    the last bucket is still filling up, so it's asked for again from its
+    start and its row replaced.
+
+    >>> for delta in engine.tail(query, interval=5, epoch='s'):
+    ...     update_panel(delta.get_points())
+
+    Every delta is a ResultSet of the new rows of each series. A row with
+    the time of a row yielded before replaces it. The rows of the last
+    `window` or the last `max_rows` of each series are kept in
+    `Tail.result()`.
+"""
+
+import time
+from collections import deque
+from datetime import timedelta
+
+from influxdb.resultset import ResultSet
+
+from .aggregate import _timedelta_ns, parse_rfc3339
+from .utils import EPOCH_PRECISIONS, interval_to_timedelta
+
+_lower_bounds = ('time__gt', 'time__gte')
+
+
+def _seconds(interval):
+    if isinstance(interval, timedelta):
+        return interval.total_seconds()
+    return interval
+
+
+class Tail(object):
+    """Runs `query` with `engine` once, then every `interval` seconds for
+    the points after the last one seen. Keyword arguments are passed on to
+    `Engine.execute`, times are epochs of `epoch` precision, or RFC3339
+    strings when it's None.
+
+    Iterating yields a ResultSet of new and updated rows per tick, forever
+    or for `ticks` ticks. `poll` runs one tick without waiting.
+
+    Queries run with nanosecond epochs so the cursor is exact, rows are
+    converted to `epoch` afterwards. With a coarser precision the cursor
+    would be truncated and rows later in its last unit yielded again.
+    """
+    def __init__(self, engine, query, interval, window=None, max_rows=10000,
+                 ticks=None, clock=time.time, sleep=time.sleep, **kwargs):
+        self.engine = engine
+        self.query = query
+        self.interval = _seconds(interval)
+        self.window = None if window is None else \
+            int(_seconds(window) * 10 ** 9)
+        self.max_rows = max_rows
+        self.ticks = ticks
+        self.clock = clock
+        self.sleep = sleep
+        self.epoch = kwargs.get('epoch')
+        if self.epoch is not None:
+            kwargs = dict(kwargs, epoch='ns')
+        self.kwargs = kwargs
+        bucket = interval_to_timedelta(query._group_by_time) \
+            if query._group_by_time else None
+        self.bucket = _timedelta_ns(bucket) if bucket else None
+        # (name, tags) -> series dict with a deque of rows as values
+        self.series = {}
+        self.cursor = None
+        self.polls = 0
+
+    def _to_ns(self, value):
+        if self.epoch is None:
+            return parse_rfc3339(value)
+        return value
+
+    def _to_epoch(self, rows, times):
+        """Returns `rows` with their nanosecond times in `epoch` precision
+        """
+        if self.epoch is None or self.epoch == 'ns':
+            return rows
+        unit = EPOCH_PRECISIONS[self.epoch][0]
+        return [[t // unit] + list(row[1:]) for row, t in zip(rows, times)]
+
+    def narrowed(self):
+        """Returns the query for the points after the cursor, from the start
+        of the last bucket with a GROUP BY time
+        """
+        query = self.query.clone()
+        for key in _lower_bounds:
+            query._where.pop(key, None)
+        if self.bucket:
+            query._where['time__gte'] = self.cursor
+        else:
+            query._where['time__gt'] = self.cursor
+        query._limit = None
+        query._order = None
+        query._order_by = []
+        return query
+
+    def poll(self):
+        """Runs the query, or the narrowed query after the first time, and
+        returns the new and updated rows
+        """
+        query = self.query if self.cursor is None else self.narrowed()
+        result = self.engine.execute(query, **self.kwargs)
+        self.polls += 1
+        raw = result.raw
+        delta = dict((k, v) for k, v in raw.items() if k != 'series')
+        changed = []
+        latest = self.cursor
+        for series in raw.get('series', []):
+            rows = series.get('values') or []
+            if not rows:
+                continue
+            times = [self._to_ns(row[0]) for row in rows]
+            if times[0] > times[-1]:
+                rows, times = rows[::-1], times[::-1]
+            rows = self._to_epoch(rows, times)
+            self._update(series, rows, times)
+            changed.append(dict(series, values=rows))
+            if latest is None or times[-1] > latest:
+                latest = times[-1]
+        if latest is not None:
+            self.cursor = latest
+        if changed:
+            delta['series'] = changed
+        return ResultSet(delta)
+
+    def _update(self, series, rows, times):
+        key = (series.get('name'),
+               tuple(sorted((series.get('tags') or {}).items())))
+        kept = self.series.get(key)
+        if kept is None:
+            kept = self.series[key] = dict(series, values=deque(
+                maxlen=self.max_rows))
+            kept['times'] = deque(maxlen=self.max_rows)
+        values, kept_times = kept['values'], kept['times']
+        # rows from the start of the refetched bucket replace the old ones
+        while kept_times and kept_times[-1] >= times[0]:
+            kept_times.pop()
+            values.pop()
+        values.extend(rows)
+        kept_times.extend(times)
+        if self.window is not None:
+            oldest = kept_times[-1] - self.window
+            while kept_times[0] < oldest:
+                kept_times.popleft()
+                values.popleft()
+
+    def result(self):
+        """Returns the rows kept of every series as a ResultSet
+        """
+        series_list = []
+        for series in self.series.values():
+            series = dict(series, values=[list(r) for r in series['values']])
+            del series['times']
+            series_list.append(series)
+        return ResultSet({'series': series_list} if series_list else {})
+
+    def __iter__(self):
+        while self.ticks is None or self.polls < self.ticks:
+            started = self.clock()
+            yield self.poll()
+            if self.ticks is not None and self.polls >= self.ticks:
+                break
+            self.sleep(max(0, self.interval - (self.clock() - started)))
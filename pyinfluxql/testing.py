@@ -0,0 +1,1087 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.testing
+    ~~~~~~~~~~~~~~~~~~
+
+    A local stand-in for an InfluxDB server, for tests and benchmarks
+
+    `FakeInfluxDB` serves the `/query`, `/write` and `/ping` endpoints of the
+    InfluxDB 1.x HTTP API from an in-memory `Store`, so the regular
+    `influxdb.InfluxDBClient` can talk to it. Responses can be chunked and
+    gzipped, times returned as epochs and several statements sent at once.
+    Latency, tail latency and errors can be injected.
+
+    >>> with FakeInfluxDB(latency=0.001) as server:
+    ...     client = server.client('test')
+    ...     client.create_database('test')
+    ...     client.write_points(points)
+    ...     engine = Engine(client)
+
+    Statements are parsed with `pyinfluxql.parser` and aggregated with
+    `pyinfluxql.aggregate`, so what it understands is what this library
+    renders: SELECT with fields, functions and aliases, WHERE on tags, fields
+    and time, GROUP BY time and tags with fill(), ORDER BY time and LIMIT,
+    DELETE, the SHOW statements of `pyinfluxql.query` and CREATE, DROP and
+    SHOW DATABASES. Percentiles are t-digest estimates, TOP() and BOTTOM()
+    only work on their own and without GROUP BY time. DERIVATIVE() and the
+    other transformations aren't supported, they and anything else answer
+    with an error.
+"""
+
+import re
+import gzip
+import bisect
+import json
+import time
+import zlib
+import random
+import datetime
+import threading
+
+import six
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import urlparse, parse_qs
+
+from .aggregate import Aggregation, parse_rfc3339, format_rfc3339, \
+    _timedelta_ns
+from .coalesce import column_name, column_names
+from .functions import Expression, Func, Top
+from .parser import parse, ParseError, _parse_time
+from .query import Query
+from .utils import EPOCH, format_regex_alternation, interval_to_timedelta, \
+    parse_fill
+
+VERSION = '1.8.10'
+DEFAULT_CHUNK_SIZE = 10000
+
+# nanoseconds per unit of the precision and epoch parameters
+PRECISIONS = {
+    'n': 1, 'ns': 1, 'u': 1000, u'µ': 1000, 'ms': 1000000,
+    's': 1000000000, 'm': 60000000000, 'h': 3600000000000,
+}
+_durations = dict(PRECISIONS, d=86400000000000, w=604800000000000)
+_duration = re.compile(u'^(\\d+)(ns|u|µ|ms|s|m|h|d|w)?$', re.UNICODE)
+
+
+class StatementError(ValueError):
+    """An error answered to the client for a single statement
+    """
+
+
+def _split(text, separator):
+    """Splits on `separator` outside of double quoted strings, keeping
+    backslash escapes
+    """
+    parts = []
+    current = []
+    quoted = False
+    i = 0
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c == '\\' and i + 1 < n:
+            current.append(text[i:i + 2])
+            i += 2
+            continue
+        if c == '"':
+            quoted = not quoted
+        elif c == separator and not quoted:
+            parts.append(''.join(current))
+            current = []
+            i += 1
+            continue
+        current.append(c)
+        i += 1
+    parts.append(''.join(current))
+    return parts
+
+
+def _unescape(text):
+    if '\\' not in text:
+        return text
+    for c in ', ="':
+        text = text.replace('\\' + c, c)
+    return text.replace('\\\\', '\\')
+
+
+def _field_value(text):
+    if text[:1] == '"':
+        return _unescape(text[1:-1])
+    if text[-1:] == 'i':
+        return int(text[:-1])
+    lower = text.lower()
+    if lower in ('t', 'true'):
+        return True
+    if lower in ('f', 'false'):
+        return False
+    return float(text)
+
+
+def parse_line(line, precision=None, now=0):
+    """Parses a line of line protocol into (measurement, tags, fields,
+    nanoseconds), points without a time get `now`
+    """
+    parts = _split(line, ' ')
+    parts = [part for part in parts if part]
+    if len(parts) not in (2, 3):
+        raise ValueError("unable to parse %r" % line)
+    key = _split(parts[0], ',')
+    measurement = _unescape(key[0])
+    tags = {}
+    for pair in key[1:]:
+        name, value = _split(pair, '=')
+        tags[_unescape(name)] = _unescape(value)
+    fields = {}
+    for pair in _split(parts[1], ','):
+        name, value = pair.split('=', 1) if '\\' not in pair else \
+            _split(pair, '=')
+        fields[_unescape(name)] = _field_value(value)
+    if len(parts) == 3:
+        timestamp = int(parts[2]) * PRECISIONS[precision or 'n']
+    else:
+        timestamp = now
+    return measurement, tags, fields, timestamp
+
+
+def _split_statements(text):
+    """Splits a request into statements on semicolons outside of quotes
+    """
+    statements = []
+    current = []
+    quote = None
+    i = 0
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if quote is not None:
+            if c == '\\' and i + 1 < n:
+                current.append(text[i:i + 2])
+                i += 2
+                continue
+            if c == quote:
+                quote = None
+        elif c in '\'"':
+            quote = c
+        elif c == ';':
+            statements.append(''.join(current).strip())
+            current = []
+            i += 1
+            continue
+        current.append(c)
+        i += 1
+    statements.append(''.join(current).strip())
+    return [statement for statement in statements if statement]
+
+
+def _unquote(name):
+    if len(name) > 1 and name[0] == '"' and name[-1] == '"':
+        return name[1:-1].replace('\\"', '"')
+    return name
+
+
+class Series(object):
+    """The points of one series, a dict of time to fields sorted lazily
+    """
+    def __init__(self, tags):
+        self.tags = tags
+        self.points = {}
+        self._times = None
+
+    def write(self, timestamp, fields):
+        point = self.points.get(timestamp)
+        if point is None:
+            self.points[timestamp] = dict(fields)
+            self._times = None
+        else:
+            point.update(fields)
+
+    def times(self):
+        if self._times is None:
+            self._times = sorted(self.points)
+        return self._times
+
+    def delete(self, lower, upper):
+        for timestamp in [t for t in self.points if lower <= t <= upper]:
+            del self.points[timestamp]
+        self._times = None
+
+
+class Store(object):
+    """Databases of measurements of series, keyed by their sorted tags
+    """
+    def __init__(self):
+        self.databases = {}
+        self.lock = threading.RLock()
+
+    def database(self, name):
+        if not name:
+            raise StatementError("database name required")
+        try:
+            return self.databases[name]
+        except KeyError:
+            raise StatementError("database not found: %s" % name)
+
+    def write(self, database, measurement, tags, fields, timestamp):
+        with self.lock:
+            series = self.database(database).setdefault(measurement, {})
+            key = tuple(sorted(tags.items()))
+            if key not in series:
+                series[key] = Series(dict(tags))
+            series[key].write(timestamp, fields)
+
+    def write_lines(self, database, lines, precision=None, now=0):
+        """Writes line protocol, returns the number of points written
+        """
+        points = [parse_line(line, precision, now)
+                  for line in lines.splitlines()
+                  if line.strip() and not line.startswith('#')]
+        with self.lock:
+            self.database(database)
+            for point in points:
+                self.write(database, *point)
+        return len(points)
+
+
+class _Conditions(object):
+    """The where clause of a query split into time bounds, conditions on
+    tags that select series and conditions on fields that select points
+    """
+    def __init__(self, query, tag_keys, now):
+        self.lower = None
+        self.upper = None
+        self.tags = []
+        self.fields = []
+        for key, value in query._where.items():
+            identifiers = key.split('__')
+            comparator = 'eq'
+            if identifiers[-1] in Query.binary_op or \
+                    identifiers[-1] in Query.list_op:
+                comparator = identifiers.pop()
+            name = _unquote('.'.join(identifiers))
+            if name == 'time':
+                self._time(comparator, _time_ns(value, now))
+                continue
+            test = _comparison(comparator, value)
+            if name in tag_keys:
+                self.tags.append((name, test))
+            else:
+                self.fields.append((name, test))
+
+    def _time(self, comparator, nanoseconds):
+        if comparator in ('gt', 'gte'):
+            bound = nanoseconds + (comparator == 'gt')
+            self.lower = bound if self.lower is None else \
+                max(self.lower, bound)
+        elif comparator in ('lt', 'lte'):
+            bound = nanoseconds - (comparator == 'lt')
+            self.upper = bound if self.upper is None else \
+                min(self.upper, bound)
+        elif comparator == 'eq':
+            self._time('gte', nanoseconds)
+            self._time('lte', nanoseconds)
+        else:
+            raise StatementError("time can only be compared with =, <, <=, "
+                                 "> and >=")
+
+    def series(self, series):
+        return all(test(series.tags.get(name, '')) for name, test in
+                   self.tags)
+
+    def point(self, fields):
+        return all(test(fields.get(name)) for name, test in self.fields)
+
+    def times(self, series):
+        times = series.times()
+        lower = -2 ** 63 if self.lower is None else self.lower
+        upper = 2 ** 63 if self.upper is None else self.upper
+        if times and lower <= times[0] and times[-1] <= upper:
+            return times
+        return times[bisect.bisect_left(times, lower):
+                     bisect.bisect_right(times, upper)]
+
+
+def _time_ns(value, now):
+    """Nanoseconds since the epoch of a time in a where clause: a datetime,
+    a date string, an integer or an expression of now(), epochs and
+    durations
+    """
+    if isinstance(value, datetime.datetime):
+        offset = value.utcoffset()
+        if offset is not None:
+            value = value.replace(tzinfo=None) - offset
+        return _timedelta_ns(value - EPOCH)
+    if isinstance(value, six.integer_types) and not isinstance(value, bool):
+        return value
+    if isinstance(value, six.string_types):
+        parsed = _parse_time(value)
+        if parsed is not None:
+            return _time_ns(parsed, now)
+        try:
+            return parse_rfc3339(value)
+        except (ValueError, IndexError):
+            raise StatementError("invalid time %r" % value)
+    if isinstance(value, Expression):
+        return _time_expression(value.format(), now)
+    raise StatementError("invalid time %r" % (value,))
+
+
+def _time_expression(text, now):
+    total = 0
+    sign = 1
+    for term in text.replace('+', ' + ').replace('-', ' - ').split():
+        if term in ('+', '-'):
+            sign = 1 if term == '+' else -1
+            continue
+        if term.lower() == 'now()':
+            value = now
+        elif term[:1] == "'":
+            value = _time_ns(term.strip("'"), now)
+        else:
+            match = _duration.match(term)
+            if match is None:
+                raise StatementError("invalid time expression %r" % text)
+            value = int(match.group(1)) * _durations[match.group(2) or 'ns']
+        total += sign * value
+    return total
+
+
+def _regex(value):
+    if isinstance(value, Query._list_types):
+        value = format_regex_alternation(value)
+    if not isinstance(value, six.string_types) or value[:1] != '/':
+        raise StatementError("expected a regex, got %r" % (value,))
+    return re.compile(value[1:-1].replace('\\/', '/'))
+
+
+def _comparison(comparator, value):
+    """Returns a predicate applying a where comparison to a value
+    """
+    if isinstance(value, Expression):
+        raise StatementError("unsupported condition value %s" %
+                             value.format())
+    if comparator == 'match':
+        search = _regex(value).search
+        return lambda v: v is not None and bool(search(six.text_type(v)))
+    if comparator == 'nmatch':
+        search = _regex(value).search
+        return lambda v: v is None or not search(six.text_type(v))
+    if comparator == 'in':
+        values = list(value)
+        return lambda v: v in values
+    if comparator == 'nin':
+        values = list(value)
+        return lambda v: v not in values
+    if comparator == 'eq':
+        return lambda v: v == value
+    if comparator == 'ne':
+        return lambda v: v != value
+
+    def ordered(v):
+        if v is None:
+            return False
+        try:
+            if comparator == 'gt':
+                return v > value
+            elif comparator == 'gte':
+                return v >= value
+            elif comparator == 'lt':
+                return v < value
+            return v <= value
+        except TypeError:
+            return False
+    return ordered
+
+
+class Evaluator(object):
+    """Runs statements against a `Store`, answering with the JSON results
+    InfluxDB would return
+    """
+    def __init__(self, store, clock=time.time):
+        self.store = store
+        self.clock = clock
+
+    def now(self):
+        return int(self.clock() * 1000000000)
+
+    def execute(self, text, database=None):
+        """Returns the result dict of every statement in `text`, each is
+        either {'statement_id', 'series'} or {'statement_id', 'error'}
+        """
+        results = []
+        for i, statement in enumerate(_split_statements(text)):
+            result = {'statement_id': i}
+            try:
+                with self.store.lock:
+                    series = self.statement(statement, database)
+                if series:
+                    result['series'] = series
+            except (StatementError, ParseError) as e:
+                result['error'] = six.text_type(e)
+            results.append(result)
+        return results
+
+    def statement(self, text, database):
+        words = text.split(None, 3)
+        keywords = ' '.join(words[:3]).upper()
+        if keywords.startswith('SELECT') or keywords.startswith('DELETE'):
+            query = parse(text)
+            if query._is_delete:
+                self.delete(database, query)
+                return []
+            return self.select(database, query)
+        if keywords.startswith('CREATE DATABASE'):
+            self.store.databases.setdefault(_unquote(words[2]), {})
+            return []
+        if keywords.startswith('DROP DATABASE'):
+            self.store.databases.pop(_unquote(words[2]), None)
+            return []
+        if keywords == 'SHOW DATABASES':
+            return [{'name': 'databases', 'columns': ['name'],
+                     'values': [[name] for name in
+                                sorted(self.store.databases)]}]
+        if keywords.startswith('DROP MEASUREMENT'):
+            name = _unquote(text.split(None, 2)[2].strip())
+            self.store.database(database).pop(name, None)
+            return []
+        if keywords.startswith('DROP SERIES'):
+            query = self._filter_query(text[len('DROP SERIES'):])
+            self.delete(database, query, drop=True)
+            return []
+        if keywords.startswith('SHOW'):
+            return self.show(database, text)
+        raise StatementError("the stand-in server doesn't support %r" %
+                             text)
+
+    def _filter_query(self, clauses):
+        """Parses the FROM and WHERE clauses of a SHOW or DROP statement
+        """
+        clauses = clauses.strip()
+        if not clauses.upper().startswith('FROM'):
+            clauses = 'FROM /.*/ ' + clauses
+        return parse('DELETE ' + clauses)
+
+    def _measurements(self, database, measurement):
+        measurements = self.store.database(database)
+        if measurement is None:
+            return sorted(measurements.items())
+        if measurement[:1] == '/' and measurement[-1:] == '/':
+            search = _regex(measurement).search
+            return [(m, series) for m, series in sorted(measurements.items())
+                    if search(m)]
+        name = _unquote(_split(measurement, '.')[-1])
+        if name in measurements:
+            return [(name, measurements[name])]
+        return []
+
+    def _database(self, database, measurement):
+        # db.rp.measurement
+        if measurement and measurement[0] != '/':
+            parts = _split(measurement, '.')
+            if len(parts) == 3:
+                return _unquote(parts[0])
+        return database
+
+    def delete(self, database, query, drop=False):
+        database = self._database(database, query._measurement)
+        measurements = self.store.database(database)
+        now = self.now()
+        for name, all_series in self._measurements(database,
+                                                   query._measurement):
+            tag_keys = set(k for s in all_series.values() for k in s.tags)
+            conditions = _Conditions(query, tag_keys, now)
+            if conditions.fields:
+                raise StatementError("fields not supported in WHERE clause "
+                                     "during deletion")
+            for key, series in list(all_series.items()):
+                if not conditions.series(series):
+                    continue
+                unbounded = conditions.lower is None and \
+                    conditions.upper is None
+                if drop or unbounded:
+                    del all_series[key]
+                    continue
+                series.delete(-2 ** 63 if conditions.lower is None
+                              else conditions.lower,
+                              2 ** 63 if conditions.upper is None
+                              else conditions.upper)
+                if not series.points:
+                    del all_series[key]
+            if not all_series:
+                del measurements[name]
+
+    def show(self, database, text):
+        match = re.match(r'(?i)SHOW\s+(MEASUREMENTS|TAG\s+KEYS|TAG\s+VALUES|'
+                         r'FIELD\s+KEYS|SERIES(?:\s+EXACT)?\s+CARDINALITY|'
+                         r'SERIES)\b(.*)$', text, re.DOTALL)
+        if match is None:
+            raise StatementError("the stand-in server doesn't support %r" %
+                                 text)
+        statement = ' '.join(match.group(1).upper().split())
+        rest = match.group(2)
+        limit = None
+        limit_match = re.search(r'(?i)\s+LIMIT\s+(\d+)\s*$', rest)
+        if limit_match:
+            limit = int(limit_match.group(1))
+            rest = rest[:limit_match.start()]
+        with_clause = None
+        with_match = re.search(r'(?i)\bWITH\s+(KEY|MEASUREMENT)\s+'
+                               r'(=~|=|IN)\s*(.*?)(?=\s+WHERE\b|$)', rest)
+        if with_match:
+            with_clause = with_match.group(2).upper(), with_match.group(3)
+            rest = rest[:with_match.start()] + rest[with_match.end():]
+        query = self._filter_query(rest)
+        if not rest.strip().upper().startswith('FROM'):
+            query._measurement = None
+        database = self._database(database, query._measurement)
+        series_list = []
+        now = self.now()
+
+        if statement == 'MEASUREMENTS':
+            names = [name for name, _ in self._measurements(database, None)]
+            if with_clause is not None:
+                search = _regex(with_clause[1]).search
+                names = [name for name in names if search(name)]
+            values = [[name] for name in names][:limit]
+            if values:
+                series_list.append({'name': 'measurements',
+                                    'columns': ['name'], 'values': values})
+            return series_list
+
+        keys = None
+        if statement == 'TAG VALUES':
+            if with_clause is None:
+                raise StatementError("SHOW TAG VALUES requires WITH KEY")
+            operator, value = with_clause
+            if operator == 'IN':
+                keys = [_unquote(k.strip())
+                        for k in value.strip().strip('()').split(',')]
+            elif operator == '=~':
+                search = _regex(value).search
+                keys = search
+            else:
+                keys = [_unquote(value.strip())]
+        for name, all_series in self._measurements(database,
+                                                   query._measurement):
+            tag_keys = set(k for s in all_series.values() for k in s.tags)
+            conditions = _Conditions(query, tag_keys, now)
+            matching = [s for _, s in sorted(all_series.items())
+                        if conditions.series(s)]
+            if statement == 'TAG KEYS':
+                columns = ['tagKey']
+                values = [[k] for k in sorted(set(
+                    k for s in matching for k in s.tags))]
+            elif statement == 'FIELD KEYS':
+                columns = ['fieldKey', 'fieldType']
+                types = {}
+                for s in matching:
+                    for fields in s.points.values():
+                        for field, value in fields.items():
+                            types.setdefault(field, _field_type(value))
+                values = [[k, types[k]] for k in sorted(types)]
+            elif statement == 'TAG VALUES':
+                columns = ['key', 'value']
+                pairs = set()
+                for s in matching:
+                    for k, v in s.tags.items():
+                        if (keys(k) if callable(keys) else k in keys):
+                            pairs.add((k, v))
+                values = [list(pair) for pair in sorted(pairs)]
+            elif statement.endswith('CARDINALITY'):
+                columns = ['count']
+                values = [[len(matching)]] if matching else []
+            else:
+                columns = ['key']
+                values = [[','.join([name] + ['%s=%s' % item for item in
+                                              sorted(s.tags.items())])]
+                          for s in matching]
+            values = values[:limit]
+            if values:
+                series_list.append({'name': name, 'columns': columns,
+                                    'values': values})
+        return series_list
+
+    def select(self, database, query):
+        if query._into_series:
+            raise StatementError("SELECT INTO isn't supported by the "
+                                 "stand-in server")
+        expressions = query._select_expressions
+        aggregates = [isinstance(e, Func) for e in expressions]
+        if any(aggregates) and not all(aggregates):
+            raise StatementError("mixing aggregate and non-aggregate queries "
+                                 "is not supported")
+        selector = isinstance(expressions[0], Top) if expressions else False
+        if selector and (len(expressions) > 1 or query._group_by_time):
+            raise StatementError("the stand-in server only supports %s on "
+                                 "its own and without GROUP BY time" %
+                                 expressions[0].identifier)
+        database = self._database(database, query._measurement)
+        now = self.now()
+        series_list = []
+        for name, all_series in self._measurements(database,
+                                                   query._measurement):
+            tag_keys = set(k for s in all_series.values() for k in s.tags)
+            group_by = [_unquote(g) for g in query._group_by]
+            if '*' in group_by:
+                group_by = sorted(tag_keys)
+            conditions = _Conditions(query, tag_keys, now)
+            groups = {}
+            for key, series in sorted(all_series.items()):
+                if conditions.series(series):
+                    group = tuple((k, series.tags.get(k, ''))
+                                  for k in group_by)
+                    groups.setdefault(group, []).append(series)
+            for group, members in sorted(groups.items()):
+                if selector:
+                    series = self._select_top(query, name, members,
+                                              conditions)
+                elif any(aggregates):
+                    series = self._aggregate(query, name, members,
+                                             conditions)
+                else:
+                    series = self._raw(query, name, members, conditions,
+                                       tag_keys, group_by)
+                if series is None:
+                    continue
+                if group_by:
+                    series['tags'] = dict(group)
+                series_list.append(series)
+        return series_list
+
+    def _raw(self, query, name, members, conditions, tag_keys, group_by):
+        fields = set()
+        for series in members:
+            for point in series.points.values():
+                fields.update(point)
+        selected = []
+        for expression in query._select_expressions:
+            column = expression
+            if isinstance(expression, Expression):
+                column = expression._expression
+            column = _unquote(six.text_type(column).strip())
+            if column == '*':
+                for key in sorted((fields | tag_keys) - set(group_by)):
+                    selected.append((key, key))
+            else:
+                if not re.match(r'^\w+$', column, re.UNICODE):
+                    raise StatementError("the stand-in server doesn't "
+                                         "support the expression %s" % column)
+                selected.append((column, column_name(expression)))
+        names = column_names([alias for _, alias in selected])
+        rows = []
+        for series in members:
+            for timestamp in conditions.times(series):
+                point = series.points[timestamp]
+                if conditions.fields and not conditions.point(point):
+                    continue
+                values = []
+                has_field = False
+                for column, _ in selected:
+                    if column in point:
+                        values.append(point[column])
+                        has_field = True
+                    else:
+                        values.append(series.tags.get(column))
+                if has_field:
+                    rows.append([timestamp] + values)
+        if not rows:
+            return None
+        rows.sort(key=lambda row: row[0], reverse=query._order == 'DESC')
+        if query._limit:
+            rows = rows[:query._limit]
+        return {'name': name, 'columns': ['time'] + names, 'values': rows}
+
+    def _select_top(self, query, name, members, conditions):
+        """TOP() or BOTTOM() over the whole time range: the N largest or
+        smallest values of a field, or with tags the largest or smallest
+        value of each of the N tag value combinations ranking highest
+        """
+        function = query._select_expressions[0]
+        field = _unquote(function._args[0])
+        tags = [_unquote(tag) for tag in function._args[1:-1]]
+        n = function._args[-1]
+        sign = 1 if type(function) is Top else -1
+        candidates = []
+        for series in members:
+            key = [series.tags.get(tag, '') for tag in tags]
+            for timestamp in conditions.times(series):
+                point = series.points[timestamp]
+                if field not in point or \
+                        conditions.fields and not conditions.point(point):
+                    continue
+                candidates.append((-sign * point[field], timestamp, key))
+        # the best first, the earlier point on ties
+        candidates.sort(key=lambda candidate: candidate[:2])
+        rows = []
+        seen = set()
+        for score, timestamp, key in candidates:
+            if tags and tuple(key) in seen:
+                continue
+            seen.add(tuple(key))
+            rows.append([timestamp, -sign * score] + key)
+            if len(rows) == n:
+                break
+        if not rows:
+            return None
+        rows.sort(key=lambda row: row[0], reverse=query._order == 'DESC')
+        if query._limit:
+            rows = rows[:query._limit]
+        return {'name': name, 'values': rows,
+                'columns': ['time', column_name(function)] + tags}
+
+    def _aggregate(self, query, name, members, conditions):
+        interval = None
+        if query._group_by_time:
+            interval = interval_to_timedelta(query._group_by_time)
+            if interval is None:
+                raise StatementError("invalid group by time %s" %
+                                     query._group_by_time)
+        try:
+            aggregation = Aggregation(query._select_expressions, interval,
+                                      epoch='ns', start=conditions.lower or 0)
+        except ValueError as e:
+            raise StatementError(six.text_type(e))
+        fields = aggregation.fields
+        first = last = None
+        for series in members:
+            rows = []
+            for timestamp in conditions.times(series):
+                point = series.points[timestamp]
+                if conditions.fields and not conditions.point(point):
+                    continue
+                rows.append([timestamp] + [point.get(f) for f in fields])
+            if rows:
+                if first is None or rows[0][0] < first:
+                    first = rows[0][0]
+                if last is None or rows[-1][0] > last:
+                    last = rows[-1][0]
+                try:
+                    aggregation.add_series({'name': name,
+                                            'columns': ['time'] + fields,
+                                            'values': rows})
+                except TypeError as e:
+                    raise StatementError(six.text_type(e))
+        buckets = aggregation.groups.get((name, ()), {})
+        if not buckets:
+            return None
+        if interval is None:
+            times = sorted(buckets)
+        else:
+            step = aggregation.interval
+            lower = conditions.lower if conditions.lower is not None \
+                else first
+            upper = conditions.upper if conditions.upper is not None \
+                else last
+            times = range(lower - lower % step, upper + 1, step)
+        rows = []
+        for bucket in times:
+            aggregators = buckets.get(bucket)
+            if aggregators is None:
+                rows.append([bucket] + [None] * len(fields))
+            else:
+                try:
+                    rows.append([bucket] + [a.result() for a in aggregators])
+                except (TypeError, ValueError) as e:
+                    raise StatementError(six.text_type(e))
+        if query._group_by_fill:
+            rows = fill_rows(rows, parse_fill(query._group_by_fill))
+        if query._order == 'DESC':
+            rows.reverse()
+        if query._limit:
+            rows = rows[:query._limit]
+        return {'name': name, 'columns': ['time'] + aggregation.names,
+                'values': rows}
+
+
+def fill_rows(rows, fill):
+    """Fills the nulls of aggregated rows like the server's fill() does
+    """
+    if fill == 'null':
+        return rows
+    if fill == 'none':
+        return [row for row in rows
+                if any(value is not None for value in row[1:])]
+    if fill not in ('previous', 'linear'):
+        return [[row[0]] + [fill if v is None else v for v in row[1:]]
+                for row in rows]
+    rows = [list(row) for row in rows]
+    for column in range(1, len(rows[0]) if rows else 1):
+        known = [i for i, row in enumerate(rows) if row[column] is not None]
+        for before, after in zip([None] + known, known + [None]):
+            start = 0 if before is None else before + 1
+            end = len(rows) if after is None else after
+            for i in range(start, end):
+                if fill == 'previous':
+                    if before is not None:
+                        rows[i][column] = rows[before][column]
+                elif before is not None and after is not None:
+                    x0, y0 = rows[before][0], rows[before][column]
+                    x1, y1 = rows[after][0], rows[after][column]
+                    value = y0 + (y1 - y0) * (rows[i][0] - x0) / \
+                        float(x1 - x0)
+                    if isinstance(y0, int) and isinstance(y1, int):
+                        value = int(value)
+                    rows[i][column] = value
+    return rows
+
+
+def _field_type(value):
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, six.integer_types):
+        return 'integer'
+    if isinstance(value, float):
+        return 'float'
+    return 'string'
+
+
+def format_times(series_list, epoch=None):
+    """Converts the nanosecond times of result series to `epoch` precision,
+    or RFC3339 strings without one
+    """
+    for series in series_list:
+        if series['columns'][0] != 'time':
+            continue
+        if epoch is None:
+            for row in series['values']:
+                row[0] = format_rfc3339(row[0])
+        else:
+            divisor = PRECISIONS[epoch]
+            for row in series['values']:
+                row[0] //= divisor
+    return series_list
+
+
+def chunk_results(results, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields the response objects of a chunked response, every series is
+    sent in pieces of at most `chunk_size` rows
+    """
+    for result in results:
+        series_list = result.get('series')
+        if not series_list:
+            yield {'results': [result]}
+            continue
+        for series in series_list:
+            values = series['values']
+            for start in range(0, len(values), chunk_size):
+                chunk = dict(series, values=values[start:start + chunk_size])
+                if start + chunk_size < len(values):
+                    chunk['partial'] = True
+                yield {'results': [{'statement_id': result['statement_id'],
+                                    'series': [chunk]}]}
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are separate writes, with Nagle's algorithm every
+    # response would wait for the client's delayed ACK
+    disable_nagle_algorithm = True
+    server_version = 'FakeInfluxDB/' + VERSION
+
+    def log_message(self, *args):
+        pass
+
+    def _params(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        body = b''
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            body = self.rfile.read(length)
+            if self.headers.get('Content-Encoding') == 'gzip':
+                body = gzip.GzipFile(fileobj=six.BytesIO(body)).read()
+        content_type = self.headers.get('Content-Type') or ''
+        if url.path == '/query' and content_type.startswith(
+                'application/x-www-form-urlencoded'):
+            for key, value in parse_qs(body.decode('utf-8')).items():
+                params.setdefault(key, []).extend(value)
+            body = b''
+        return url.path, dict((k, v[-1]) for k, v in params.items()), body
+
+    def do_GET(self):  # noqa: N802
+        self.server.fake.handle(self)
+
+    do_POST = do_GET  # noqa: N815
+
+    def send(self, status, body=None, chunks=None, headers=()):
+        """Sends a JSON `body`, or a chunked response of the JSON objects
+        in `chunks`, gzipped if the client accepts it
+        """
+        use_gzip = self.server.fake.gzip and \
+            'gzip' in (self.headers.get('Accept-Encoding') or '')
+        self.send_response(status)
+        self.send_header('X-Influxdb-Version', VERSION)
+        for header in headers:
+            self.send_header(*header)
+        if body is None and chunks is None:
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_header('Content-Type', 'application/json')
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        if chunks is None:
+            data = json.dumps(body).encode('utf-8') + b'\n'
+            if use_gzip:
+                compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+                data = compressor.compress(data) + compressor.flush()
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if use_gzip \
+            else None
+        for chunk in chunks:
+            data = json.dumps(chunk).encode('utf-8') + b'\n'
+            if compressor is not None:
+                data = compressor.compress(data) + \
+                    compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._write_chunk(data)
+        if compressor is not None:
+            self._write_chunk(compressor.flush())
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, data):
+        if data:
+            size = ('%x\r\n' % len(data)).encode('ascii')
+            self.wfile.write(size + data + b'\r\n')
+
+
+class _HTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeInfluxDB(object):
+    """An in-memory InfluxDB serving HTTP on `host`:`port`, a free port by
+    default.
+
+    Every request is delayed by `latency` seconds, or by `tail_latency` for
+    a `tail_probability` fraction of them, and an `error_rate` fraction of
+    them fails with a 500. Responses are gzipped for clients that accept
+    it unless `gzip` is False.
+    """
+    def __init__(self, host='127.0.0.1', port=0, latency=0,
+                 tail_latency=0, tail_probability=0, error_rate=0,
+                 gzip=True, seed=None, clock=time.time, sleep=time.sleep):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.tail_latency = tail_latency
+        self.tail_probability = tail_probability
+        self.error_rate = error_rate
+        self.gzip = gzip
+        self.random = random.Random(seed)
+        self.clock = clock
+        self.sleep = sleep
+        self.store = Store()
+        self.evaluator = Evaluator(self.store, clock)
+        self.requests = 0
+        self.injected_errors = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://%s:%i' % (self.host, self.port)
+
+    def start(self):
+        self._server = _HTTPServer((self.host, self.port), _Handler)
+        self._server.fake = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def client(self, database=None, **kwargs):
+        """An `influxdb.InfluxDBClient` for the server
+        """
+        from influxdb import InfluxDBClient
+        return InfluxDBClient(self.host, self.port, database=database,
+                              **kwargs)
+
+    def _inject(self):
+        """Sleeps for the injected latency, returns whether to fail
+        """
+        with self._lock:
+            self.requests += 1
+            tail = self.tail_probability and \
+                self.random.random() < self.tail_probability
+            fail = self.error_rate and self.random.random() < self.error_rate
+            if fail:
+                self.injected_errors += 1
+        delay = self.tail_latency if tail else self.latency
+        if delay:
+            self.sleep(delay)
+        return fail
+
+    def query(self, q, db=None, epoch=None):
+        """Runs the statements in `q`, returns the result dicts
+        """
+        if epoch is not None and epoch not in PRECISIONS:
+            raise StatementError("invalid epoch %r" % epoch)
+        results = self.evaluator.execute(q, db)
+        for result in results:
+            format_times(result.get('series', ()), epoch)
+        return results
+
+    def write(self, data, db=None, precision=None):
+        """Writes line protocol, returns the number of points
+        """
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return self.store.write_lines(db, data, precision,
+                                      self.evaluator.now())
+
+    def handle(self, request):
+        try:
+            path, params, body = request._params()
+        except (ValueError, IOError) as e:
+            return request.send(400, {'error': six.text_type(e)})
+        if path == '/ping':
+            return request.send(204)
+        if self._inject():
+            return request.send(500, {'error': 'injected failure'})
+        if path == '/write':
+            try:
+                self.write(body, params.get('db'), params.get('precision'))
+            except StatementError as e:
+                return request.send(404, {'error': six.text_type(e)})
+            except (ValueError, KeyError) as e:
+                return request.send(400, {'error': 'unable to parse: %s' %
+                                          e})
+            return request.send(204)
+        if path != '/query':
+            return request.send(404, {'error': 'not found'})
+        if 'q' not in params:
+            return request.send(400, {'error': 'missing required parameter '
+                                               '"q"'})
+        try:
+            results = self.query(params['q'], params.get('db'),
+                                 params.get('epoch'))
+        except StatementError as e:
+            return request.send(400, {'error': six.text_type(e)})
+        except Exception as e:
+            return request.send(500, {'error': repr(e)})
+        if params.get('chunked') == 'true':
+            chunk_size = int(params.get('chunk_size') or DEFAULT_CHUNK_SIZE)
+            return request.send(200, chunks=chunk_results(results,
+                                                          chunk_size))
+        return request.send(200, {'results': results})
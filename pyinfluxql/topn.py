@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+    pyinfluxql.topn
+    ~~~~~~~~~~~~~~~
+
+    Top N panels without pulling every series
+
+    Showing the ten busiest hosts shouldn't move thousands of series. The
+    tag values are ranked first with a cheap query returning one row per
+    value, or a single TOP() selecting only the winners when the ranking is
+    by the maximum (BOTTOM() and the minimum), and only the winners are
+    then fetched at full resolution.
+
+    >>> query = Query(Mean('cpu')).from_('cpu').date_range(start, end) \\
+    ...     .group_by('host', time='1m')
+    >>> result = engine.top(query, 'host', 10)
+"""
+
+import six
+
+from .coalesce import column_name
+from .functions import Func, Top, Bottom, Max, Min
+
+
+def _field(expression):
+    """Returns the field name of a select expression, or of the argument of
+    a function of a single field
+    """
+    if isinstance(expression, Func):
+        if len(expression._args) != 1 or \
+                not isinstance(expression._args[0], six.string_types):
+            return None
+        expression = expression._args[0]
+    if isinstance(expression, six.string_types) and expression.strip() != '*':
+        return expression
+    return None
+
+
+def ranking_function(query, rank_by=None, bottom=False):
+    """Returns the function ranking the tag values: `rank_by`, or the
+    query's first select expression, with raw fields ranked by their
+    maximum, or their minimum for `bottom`
+    """
+    if rank_by is None:
+        if not query._select_expressions:
+            raise ValueError("Can't rank a query without select expressions")
+        rank_by = query._select_expressions[0]
+    if isinstance(rank_by, Func):
+        return rank_by
+    field = _field(rank_by)
+    if field is None:
+        raise ValueError("Can't rank by %r" % (rank_by,))
+    return Min(field) if bottom else Max(field)
+
+
+def can_push_down(function, bottom=False):
+    """Whether TOP() or BOTTOM() ranks like `function`: by the maximum, or
+    the minimum for `bottom`, of a field
+    """
+    return type(function) is (Min if bottom else Max) and \
+        _field(function) is not None
+
+
+def ranking_query(query, tag, n, function, bottom=False, push_down=True):
+    """Returns the query ranking the values of `tag` over the where clause
+    and time range of `query`, and the name of its score column
+    """
+    ranking = query.clone()
+    ranking._group_by = []
+    ranking._group_by_time = None
+    ranking._group_by_fill = False
+    ranking._limit = None
+    ranking._order = None
+    ranking._order_by = []
+    ranking._into_series = None
+    if push_down and can_push_down(function, bottom):
+        selector = (Bottom if bottom else Top)(_field(function), tag, n)
+        ranking._select_expressions = [selector]
+        return ranking, column_name(selector)
+    ranking._select_expressions = [function]
+    ranking.group_by(tag)
+    return ranking, column_name(function)
+
+
+def rank(engine, query, tag, n, rank_by=None, bottom=False, push_down=True,
+         **kwargs):
+    """Returns the `n` values of `tag` ranking highest by `rank_by`, lowest
+    with `bottom`, as a list of (value, score)
+    """
+    function = ranking_function(query, rank_by, bottom)
+    ranking, column = ranking_query(query, tag, n, function, bottom,
+                                    push_down)
+    result = engine.execute(ranking, **kwargs)
+    scores = []
+    for series in result.raw.get('series', []):
+        columns = series['columns']
+        if column not in columns:
+            continue
+        index = columns.index(column)
+        tag_index = columns.index(tag) if tag in columns else None
+        tags = series.get('tags') or {}
+        for row in series.get('values') or []:
+            value = row[tag_index] if tag_index is not None else tags.get(tag)
+            if row[index] is not None and value is not None:
+                scores.append((value, row[index]))
+    scores.sort(key=lambda score: score[1], reverse=not bottom)
+    return scores[:n]
+
+
+def top(engine, query, tag, n, rank_by=None, bottom=False, push_down=True,
+        **kwargs):
+    """Returns the result of `query` for the `n` values of `tag` ranking
+    highest by `rank_by`, lowest with `bottom`, see `rank`
+    """
+    winners = [value for value, _ in rank(engine, query, tag, n, rank_by,
+                                          bottom, push_down, **kwargs)]
+    if not winners:
+        from influxdb.resultset import ResultSet
+        return ResultSet({})
+    filtered = query.clone().where(**{tag + '__in': winners})
+    if tag not in filtered._group_by:
+        filtered.group_by(tag)
+    return engine.execute(filtered, **kwargs)
@@ -6,7 +6,26 @@
     Utility functions
 """
 
-from datetime import timedelta
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+
+# nanoseconds per unit and the suffix used for the literal, bare integers are
+# interpreted as nanoseconds by InfluxDB
+EPOCH_PRECISIONS = {
+    'ns': (1, ''),
+    'u': (1000, 'u'),
+    'ms': (1000000, 'ms'),
+    's': (1000000000, 's'),
+    'm': (60000000000, 'm'),
+    'h': (3600000000000, 'h'),
+}
+
+# fill() options besides a number
+FILL_OPTIONS = ('none', 'null', 'previous', 'linear')
+
+DATETIME_CACHE_SIZE = 1024
+_datetime_cache = {}
 
 
 def parse_interval(interval):
@@ -20,11 +39,25 @@ def parse_interval(interval):
         key = 'hours'
     elif unit == 'd':
         key = 'days'
+    elif unit == 'w':
+        key = 'weeks'
     else:
-        key = 's'
+        raise ValueError("Invalid interval %r" % interval)
     return timedelta(**{key: scalar})
 
 
+def interval_to_timedelta(interval):
+    """Returns a group by interval given as a timedelta or a string like '5m'
+    as a timedelta, or None if it can't be converted
+    """
+    if isinstance(interval, timedelta):
+        return interval
+    try:
+        return parse_interval(interval)
+    except (TypeError, ValueError):
+        return None
+
+
 def format_timedelta(td):
     """formats a timedelta into the largest unit possible
     """
@@ -45,3 +78,100 @@ def format_timedelta(td):
 
 def format_boolean(value):
     return 'true' if value else 'false'
+
+
+def format_fill(fill):
+    """formats the argument of a fill() clause, True is fill(0) and a false
+    value no fill at all
+    """
+    if fill is True:
+        return '0'
+    if fill is False or fill is None:
+        return False
+    if isinstance(fill, (int, float)):
+        return repr(fill)
+    if str(fill).lower() in FILL_OPTIONS:
+        return str(fill).lower()
+    raise ValueError("fill must be a number or one of %s, got %r" % (
+        ", ".join(FILL_OPTIONS), fill))
+
+
+def parse_fill(fill):
+    """returns the number of a formatted fill() argument, or the option
+    """
+    if fill in FILL_OPTIONS:
+        return fill
+    try:
+        return int(fill)
+    except ValueError:
+        return float(fill)
+
+
+def quote_string(value):
+    """formats a string literal, escaping backslashes, quotes and newlines
+    like InfluxQL
+    """
+    return "'%s'" % value.replace('\\', '\\\\').replace(
+        "'", "\\'").replace('\n', '\\n')
+
+
+def format_regex_alternation(values):
+    """formats values as an anchored regex literal matching any of them
+    exactly, e.g. /^(a|b\\.c)$/
+    """
+    import re
+    escaped = [re.escape(str(value)).replace('/', '\\/') for value in values]
+    return '/^(%s)$/' % '|'.join(escaped)
+
+
+def _utc_naive(value):
+    offset = value.utcoffset()
+    if offset is not None:
+        value = (value - offset).replace(tzinfo=None)
+    return value
+
+
+def format_datetime(value):
+    """formats a datetime as a quoted UTC time literal with millisecond
+    precision, e.g. '2015-06-06 00:00:00.000'
+
+    Results are cached since the same time bounds tend to be rendered over
+    and over again.
+    """
+    try:
+        return _datetime_cache[value]
+    except KeyError:
+        pass
+    dt = _utc_naive(value)
+    formatted = "'%04d-%02d-%02d %02d:%02d:%02d.%03d'" % (
+        dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second,
+        dt.microsecond // 1000)
+    if len(_datetime_cache) >= DATETIME_CACHE_SIZE:
+        _datetime_cache.clear()
+    _datetime_cache[value] = formatted
+    return formatted
+
+
+def format_epoch(value, precision='ns'):
+    """formats a datetime as an integer epoch literal, e.g. 1433548800s
+    Naive datetimes are assumed to be in UTC.
+    """
+    if precision not in EPOCH_PRECISIONS:
+        raise ValueError("precision must be one of %s" % ", ".join(
+            sorted(EPOCH_PRECISIONS)))
+    delta = _utc_naive(value) - EPOCH
+    seconds = delta.days * 86400 + delta.seconds
+    nanoseconds = (seconds * 1000000 + delta.microseconds) * 1000
+    divisor, suffix = EPOCH_PRECISIONS[precision]
+    return "%i%s" % (nanoseconds // divisor, suffix)
+
+
+def floor_datetime(value, interval):
+    """Rounds a datetime down to the start of its `interval` sized bucket,
+    buckets are aligned to the epoch like InfluxDB's GROUP BY time()
+    """
+    delta = _utc_naive(value) - EPOCH
+    micro = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    step = (interval.days * 86400 + interval.seconds) * 1000000 + \
+        interval.microseconds
+    return EPOCH + timedelta(microseconds=micro - micro % step)
@@ -26,5 +26,13 @@ setup(
     zip_safe=False,
     include_package_data=True,
     platforms='any',
+    install_requires=['six', 'influxdb>=5.0,<6'],
+    extras_require={
+        'orjson': ['orjson'],
+        'ujson': ['ujson'],
+        'numpy': ['numpy'],
+        'pandas': ['pandas'],
+        'arrow': ['pyarrow'],
+    },
     tests_require=find_packages(include=['*-dev'])
 )
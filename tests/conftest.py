@@ -6,15 +6,19 @@
     Fixtures for pyinfluxql tests
 """
 
+import os
 import pytest
 from influxdb import InfluxDBClient
 from datetime import datetime, timedelta
 import random
 from pyinfluxql import Engine
+from pyinfluxql.testing import FakeInfluxDB
 
+# integration tests run against the in-memory stand-in unless INFLUXDB_HOST
+# points them at a real server
 influxdb_settings = {
-    'INFLUXDB_HOST': 'localhost',
-    'INFLUXDB_PORT': 8086,
+    'INFLUXDB_HOST': os.environ.get('INFLUXDB_HOST'),
+    'INFLUXDB_PORT': int(os.environ.get('INFLUXDB_PORT', 8086)),
     'INFLUXDB_USER': 'root',
     'INFLUXDB_PASSWORD': 'root',
     'INFLUXDB_DB': 'pyinfluxsql_test'
@@ -22,10 +26,20 @@ influxdb_settings = {
 
 
 @pytest.yield_fixture(scope='module')
-def influx_db():
+def influx_server():
+    if influxdb_settings['INFLUXDB_HOST']:
+        yield (influxdb_settings['INFLUXDB_HOST'],
+               influxdb_settings['INFLUXDB_PORT'])
+    else:
+        with FakeInfluxDB() as server:
+            yield server.host, server.port
+
+
+@pytest.yield_fixture(scope='module')
+def influx_db(influx_server):
     _influxdb = InfluxDBClient(
-        influxdb_settings['INFLUXDB_HOST'],
-        influxdb_settings['INFLUXDB_PORT'],
+        influx_server[0],
+        influx_server[1],
         influxdb_settings['INFLUXDB_USER'],
         influxdb_settings['INFLUXDB_PASSWORD'],
         influxdb_settings['INFLUXDB_DB'])
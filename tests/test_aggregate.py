@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+    test_aggregate
+    ~~~~~~~~~~~~~~
+
+    Tests the client side streaming aggregators and sketches
+"""
+
+import math
+import bisect
+import random
+import pytest
+from datetime import datetime, timedelta
+from influxdb.resultset import ResultSet
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.aggregate import (Aggregation, TDigest, HyperLogLog,
+                                  StddevAggregator,
+                                  parse_rfc3339, format_rfc3339)
+from pyinfluxql.functions import (Count, Distinct, Mean, Median, Min, Max,
+                                  Sum, Stddev, First, Last, Percentile,
+                                  Derivative)
+
+NS = 1000000000
+
+
+def raw_series(host, points, start=0, step=10):
+    return {'name': 'cpu', 'tags': {'host': host},
+            'columns': ['time', 'value'],
+            'values': [[(start + i * step) * NS, v]
+                       for i, v in enumerate(points)]}
+
+
+@pytest.mark.unit
+def test_rfc3339():
+    assert parse_rfc3339('1970-01-01T00:00:01Z') == NS
+    assert parse_rfc3339('2015-06-06T00:00:00.5Z') == 1433548800 * NS + NS // 2
+    assert parse_rfc3339('2015-06-06T02:00:00.000000001+02:00') == \
+        1433548800 * NS + 1
+    assert format_rfc3339(1433548800 * NS) == '2015-06-06T00:00:00Z'
+    assert format_rfc3339(1433548800 * NS + 1500) == \
+        '2015-06-06T00:00:00.0000015Z'
+
+
+@pytest.mark.unit
+def test_aggregates_by_bucket():
+    query = Query(Mean('value'), Sum('value'), Min('value'), Max('value'),
+                  Count('value'), Stddev('value'), First('value'),
+                  Last('value'), Median('value')) \
+        .from_('cpu').group_by('host', time='1m')
+    aggregation = Aggregation.from_query(query)
+    aggregation.add_result(ResultSet({'series': [
+        raw_series('a', [1, 2, 3, 4, 5, 6, None, 8])]}))
+    series = aggregation.result().raw['series']
+    assert series[0]['tags'] == {'host': 'a'}
+    assert series[0]['columns'] == [
+        'time', 'mean', 'sum', 'min', 'max', 'count', 'stddev', 'first',
+        'last', 'median']
+    first, second = series[0]['values']
+    assert first == [0, 3.5, 21, 1, 6, 6, pytest.approx(1.8708, 1e-4), 1, 6,
+                     3.5]
+    assert second == [60 * NS, 8.0, 8, 8, 8, 1, None, 8, 8, 8]
+
+
+@pytest.mark.unit
+def test_raw_query():
+    query = Query(Mean('value'), Count(Distinct('"host id"'))).from_('cpu') \
+        .where(region='us').group_by('dc', time='1h', fill=True).limit(10) \
+        .order('time', 'desc').into('cpu_1h')
+    aggregation = Aggregation.from_query(query)
+    assert str(aggregation.raw_query(query)) == \
+        "SELECT value, \"host id\" FROM cpu WHERE region = 'us' GROUP BY dc;"
+    assert aggregation.fields == ['value', 'host id']
+    with pytest.raises(ValueError):
+        Aggregation([Count('*')])
+    with pytest.raises(ValueError):
+        Aggregation([Sum(Mean('value'))])
+    # DISTINCT() returns values and DERIVATIVE() a row per pair of points,
+    # not one value per bucket
+    with pytest.raises(ValueError):
+        Aggregation([Distinct('value')])
+    with pytest.raises(ValueError):
+        Aggregation([Derivative('value', '1m')])
+    with pytest.raises(ValueError):
+        Aggregation([Count(Distinct(Mean('value')))])
+
+
+@pytest.mark.unit
+def test_from_query_aware_start():
+    from dateutil.tz import gettz
+    start = datetime(2015, 6, 6, 2, tzinfo=gettz('Europe/Berlin'))
+    aggregation = Aggregation.from_query(
+        Query(Mean('value')).from_('cpu').date_range(start))
+    assert aggregation.start == 1433548800 * NS
+
+
+@pytest.mark.unit
+def test_merge_partial_states():
+    random.seed(3)
+    values = [random.gauss(50, 10) for _ in range(4000)]
+    functions = [Mean('value'), Stddev('value'), Percentile('value', 95),
+                 Count(Distinct('value'))]
+    whole = Aggregation(functions, '1h')
+    whole.add_result(ResultSet({'series': [raw_series('a', values)]}))
+    parts = [Aggregation(functions, '1h') for _ in range(4)]
+    for i, part in enumerate(parts):
+        part.add_result(ResultSet({'series': [
+            raw_series('a', values[i::4], start=i * 10, step=40)]}))
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+
+    expected = whole.result().raw['series'][0]['values']
+    actual = merged.result().raw['series'][0]['values']
+    assert [row[0] for row in actual] == [row[0] for row in expected]
+    for exp, act in zip(expected, actual):
+        assert act[1] == pytest.approx(exp[1])
+        assert act[2] == pytest.approx(exp[2])
+        assert act[3] == pytest.approx(exp[3], rel=0.05)
+        assert act[4] == exp[4]
+    with pytest.raises(ValueError):
+        merged.merge(Aggregation([Mean('value')], '1h'))
+
+
+@pytest.mark.unit
+def test_engine_aggregate():
+    class Client(object):
+        def query(self, query, **kwargs):
+            self.query_string, self.kwargs = query, kwargs
+            return iter([ResultSet({'series': [raw_series('a', [1, 2])]}),
+                         ResultSet({'series': [raw_series('a', [3], 20)]})])
+
+    start = datetime(1970, 1, 1)
+    engine = Engine(Client())
+    result = engine.aggregate(Query(Mean('value')).from_('cpu')
+                              .date_range(start, start + timedelta(hours=1)))
+    assert engine.client.kwargs == {'chunked': True, 'chunk_size': 10000,
+                                    'epoch': 'ns'}
+    assert result.raw['series'][0]['values'] == [[0, 2.0]]
+    with pytest.raises(ValueError) as error:
+        engine.aggregate(Query(Derivative(Mean('value'), '1m')).from_('cpu')
+                         .group_by(time='5m'))
+    assert 'DERIVATIVE(MEAN(value), 1m) is a transformation' in \
+        str(error.value)
+
+
+@pytest.mark.unit
+def test_tdigest_accuracy():
+    random.seed(7)
+    values = [random.expovariate(1) for _ in range(20000)]
+    digest = TDigest()
+    for value in values:
+        digest.add(value)
+    assert len(digest.means) <= 100
+    values.sort()
+    for q in (0.001, 0.01, 0.5, 0.9, 0.99, 0.999):
+        # the rank of the estimate is close to q, more so in the tails
+        rank = bisect.bisect(values, digest.quantile(q)) / float(len(values))
+        assert abs(rank - q) <= 0.01 * min(q, 1 - q) + 0.001
+    assert digest.quantile(0) == values[0]
+    assert digest.quantile(1) == values[-1]
+
+
+@pytest.mark.unit
+def test_hyperloglog():
+    sketch, other = HyperLogLog(), HyperLogLog()
+    for i in range(50000):
+        sketch.add('host%i' % i)
+        other.add('host%i' % (i + 25000))
+    assert sketch.count() == pytest.approx(50000, rel=0.03)
+    sketch.merge(other)
+    assert sketch.count() == pytest.approx(75000, rel=0.03)
+    small = HyperLogLog()
+    for value in ['a', 'b', 'c', 'a']:
+        small.add(value)
+    assert small.count() == 3
+    with pytest.raises(ValueError):
+        small.merge(HyperLogLog(10))
+
+
+@pytest.mark.unit
+def test_stddev_merge():
+    left, right = StddevAggregator(), StddevAggregator()
+    for value in [1, 2, 3]:
+        left.add(None, value)
+    for value in [4, 5]:
+        right.add(None, value)
+    left.merge(right)
+    assert left.result() == pytest.approx(math.sqrt(2.5))
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+    test_batch
+    ~~~~~~~~~~
+
+    Tests rendering and executing query batches
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from influxdb.resultset import ResultSet
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.batch import QueryBatch
+from pyinfluxql.functions import Mean
+
+START = datetime(2015, 6, 6)
+
+
+def base():
+    return Query(Mean('value')).from_('cpu').where(region='us') \
+        .group_by(time='1h').limit(100)
+
+
+@pytest.mark.unit
+def test_statements_match_queries():
+    hosts = ['a', 'b', 'a', "c%d"]
+    starts = [START + timedelta(days=i) for i in range(4)]
+    ends = [start + timedelta(days=1) for start in starts]
+    batch = QueryBatch(base(), host=hosts, time__gte=starts, time__lt=ends)
+    assert len(batch) == 4
+    expected = [str(base().where(host=h, time__gte=s, time__lt=e))
+                for h, s, e in zip(hosts, starts, ends)]
+    assert batch.statements() == expected
+    assert list(batch) == expected
+
+
+@pytest.mark.unit
+def test_value_types():
+    batch = QueryBatch(Query('value').from_('x').time_precision('s'),
+                       a=[1, 1.0, True], b__match=[['x', 'y'], '/z/', ['x']],
+                       time__gt=[START] * 3)
+    assert batch.statements() == [
+        "SELECT value FROM x WHERE a = 1 AND b =~ /^(x|y)$/ "
+        "AND time > 1433548800s;",
+        "SELECT value FROM x WHERE a = 1.0 AND b =~ /z/ AND time > 1433548800s;",
+        "SELECT value FROM x WHERE a = true AND b =~ /^(x)$/ "
+        "AND time > 1433548800s;"]
+
+
+@pytest.mark.unit
+def test_product():
+    batch = QueryBatch.product(Query('value').from_('x'), host=['a', 'b'],
+                               dc=[1, 2])
+    assert batch.statements() == [
+        "SELECT value FROM x WHERE dc = 1 AND host = 'a';",
+        "SELECT value FROM x WHERE dc = 1 AND host = 'b';",
+        "SELECT value FROM x WHERE dc = 2 AND host = 'a';",
+        "SELECT value FROM x WHERE dc = 2 AND host = 'b';"]
+
+
+@pytest.mark.unit
+def test_invalid_batches():
+    with pytest.raises(TypeError):
+        QueryBatch(base())
+    with pytest.raises(ValueError):
+        QueryBatch(base(), host=['a'], dc=[1, 2])
+    with pytest.raises(ValueError):
+        QueryBatch(base(), host__in=[['a']])
+
+
+@pytest.mark.unit
+def test_execute_many():
+    class Client(object):
+        def __init__(self):
+            self.requests = []
+
+        def query(self, query, **kwargs):
+            self.requests.append(query)
+            results = [ResultSet({'statement_id': i, 'series': []})
+                       for i in range(query.count(';'))]
+            return results if len(results) > 1 else results[0]
+
+    engine = Engine(Client())
+    batch = QueryBatch(Query('value').from_('x'), host=list('abcde'))
+    results = list(engine.execute_many(batch, batch_size=2))
+    assert len(results) == 5
+    assert [r.raw['statement_id'] for r in results] == [0, 1, 0, 1, 0]
+    assert engine.client.requests == [
+        "SELECT value FROM x WHERE host = 'a';"
+        "SELECT value FROM x WHERE host = 'b';",
+        "SELECT value FROM x WHERE host = 'c';"
+        "SELECT value FROM x WHERE host = 'd';",
+        "SELECT value FROM x WHERE host = 'e';"]
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+    test_catalog
+    ~~~~~~~~~~~~
+
+    Tests the schema catalog and query validation
+"""
+
+import pytest
+from influxdb.resultset import ResultSet
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.catalog import Catalog
+from pyinfluxql.functions import Mean, Percentile
+
+RESPONSES = {
+    'SHOW MEASUREMENTS;': [
+        {'name': 'measurements', 'columns': ['name'],
+         'values': [['cpu'], ['mem']]}],
+    'SHOW FIELD KEYS FROM cpu;': [
+        {'name': 'cpu', 'columns': ['fieldKey', 'fieldType'],
+         'values': [['value', 'float'], ['idle', 'integer']]}],
+    'SHOW TAG KEYS FROM cpu;': [
+        {'name': 'cpu', 'columns': ['tagKey'],
+         'values': [['host'], ['region']]}],
+    'SHOW TAG VALUES FROM cpu WITH KEY = "host";': [
+        {'name': 'cpu', 'columns': ['key', 'value'],
+         'values': [['host', 'a'], ['host', 'b']]}],
+    'SHOW TAG VALUES FROM cpu WITH KEY = "k8s.pod";': [
+        {'name': 'cpu', 'columns': ['key', 'value'],
+         'values': [['k8s.pod', 'p1']]}],
+    'SHOW TAG VALUES FROM cpu.k8s WITH KEY = "host";': [
+        {'name': 'cpu.k8s', 'columns': ['key', 'value'],
+         'values': [['host', 'c']]}],
+    'SHOW SERIES EXACT CARDINALITY FROM cpu;': [
+        {'name': 'cpu', 'columns': ['count'], 'values': [[2]]}],
+}
+
+
+class ShowClient(object):
+    def __init__(self):
+        self.queries = []
+
+    def query(self, query, **kwargs):
+        self.queries.append(query)
+        return ResultSet({'statement_id': 0, 'series': RESPONSES[query]})
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def catalog():
+    return Catalog(Engine(ShowClient()), ttl=60, clock=Clock())
+
+
+@pytest.mark.unit
+def test_catalog_lookups(catalog):
+    assert catalog.measurements() == {'cpu', 'mem'}
+    assert catalog.field_keys('cpu') == {'value': 'float', 'idle': 'integer'}
+    assert catalog.tag_keys('cpu') == {'host', 'region'}
+    assert catalog.tag_values('cpu', 'host') == {'a', 'b'}
+    assert catalog.series_count('cpu') == 2
+
+
+@pytest.mark.unit
+def test_catalog_lazy_and_ttl(catalog):
+    queries = catalog.engine.client.queries
+    assert queries == []
+    catalog.tag_keys('cpu')
+    catalog.tag_keys('cpu')
+    assert queries == ['SHOW TAG KEYS FROM cpu;']
+
+    catalog.clock.now = 30
+    catalog.field_keys('cpu')
+    catalog.clock.now = 60
+    assert catalog.refresh() == 1
+    assert queries[-1] == 'SHOW TAG KEYS FROM cpu;'
+    catalog.tag_keys('cpu')
+    assert len(queries) == 3
+
+    catalog.invalidate('cpu')
+    catalog.field_keys('cpu')
+    assert len(queries) == 4
+
+
+@pytest.mark.unit
+def test_catalog_persistence(catalog, tmpdir):
+    path = str(tmpdir.join('schema.json'))
+    catalog.measurements()
+    catalog.tag_values('cpu', 'host')
+    catalog.save(path)
+
+    client = ShowClient()
+    loaded = Catalog.open(Engine(client), path, ttl=60, clock=catalog.clock)
+    assert loaded.measurements() == {'cpu', 'mem'}
+    assert loaded.tag_values('cpu', 'host') == {'a', 'b'}
+    assert client.queries == []
+    catalog.clock.now = 60
+    assert loaded.refresh() == 2
+    with pytest.raises(ValueError):
+        loaded.load({'version': 0})
+
+
+@pytest.mark.unit
+def test_catalog_dotted_names(catalog, tmpdir):
+    queries = catalog.engine.client.queries
+    assert catalog.tag_values('cpu', 'k8s.pod') == {'p1'}
+    assert catalog.tag_values('cpu.k8s', 'host') == {'c'}
+    catalog.clock.now = 60
+    assert catalog.refresh() == 2
+    assert queries[-2:] == queries[:2]
+    catalog.invalidate('cpu')
+    catalog.tag_values('cpu.k8s', 'host')
+    assert len(queries) == 4
+
+    path = str(tmpdir.join('schema.json'))
+    catalog.save(path)
+    loaded = Catalog.open(Engine(ShowClient()), path, clock=catalog.clock)
+    assert loaded.tag_values('cpu.k8s', 'host') == {'c'}
+    assert loaded.engine.client.queries == []
+
+
+@pytest.mark.unit
+def test_validate(catalog):
+    Query(Mean('value'), 'host').from_('cpu') \
+        .where(host__in=['a'], idle__gt=1).date_range(1, 2) \
+        .group_by('region', time='1h').validate(catalog)
+    Query('*').from_('/c.*/').where(nope=1).validate(catalog)
+
+    with pytest.raises(ValueError) as e:
+        Query('value').from_('cpux').validate(catalog)
+    assert "unknown measurement 'cpux', did you mean 'cpu'?" in str(e.value)
+
+    with pytest.raises(ValueError) as e:
+        Query(Percentile('valu', 95)).from_('cpu').where(hots='a') \
+            .group_by('value').validate(catalog)
+    assert str(e.value) == (
+        "Invalid query on cpu: unknown field 'valu', did you mean 'value'?; "
+        "unknown field or tag 'hots', did you mean 'host'?; unknown tag 'value'")
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+    test_cleanup
+    ~~~~~~~~~~~~
+
+    Tests windowed deletes and the drop statement builders
+"""
+
+import json
+import pytest
+from datetime import datetime, timedelta
+
+from pyinfluxql import Query
+from pyinfluxql.cleanup import Cleanup, time_windows
+from pyinfluxql.query import DropSeries, DropMeasurement
+
+START = datetime(2015, 6, 6)
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class SlowEngine(object):
+    """Takes `latencies` seconds of fake time for consecutive deletes
+    """
+    def __init__(self, clock, latencies=(), fail_at=None):
+        self.clock = clock
+        self.latencies = list(latencies)
+        self.fail_at = fail_at
+        self.queries = []
+
+    def execute(self, query):
+        if len(self.queries) == self.fail_at:
+            raise RuntimeError("timeout")
+        self.queries.append(str(query))
+        if self.latencies:
+            self.clock.now += self.latencies.pop(0)
+
+
+def delete_query(days=3):
+    return Query().from_('cpu').delete().where(dc='x') \
+        .date_range(START, START + timedelta(days=days))
+
+
+@pytest.mark.unit
+def test_time_windows():
+    end = START + timedelta(hours=5)
+    assert time_windows(START, end, timedelta(hours=2)) == [
+        (START, START + timedelta(hours=2)),
+        (START + timedelta(hours=2), START + timedelta(hours=4)),
+        (START + timedelta(hours=4), end)]
+
+
+@pytest.mark.unit
+def test_pieces():
+    cleanup = Cleanup(None, delete_query(2), tag='host',
+                      values=['c', 'a', 'b'], series_batch=2)
+    pieces = cleanup.pieces()
+    assert [key for key, _ in pieces] == [
+        '2015-06-06 00:00:00.000 host[0]', '2015-06-06 00:00:00.000 host[1]',
+        '2015-06-07 00:00:00.000 host[0]', '2015-06-07 00:00:00.000 host[1]']
+    assert [str(q) for _, q in pieces[::3]] == [
+        "DELETE FROM cpu WHERE dc = 'x' AND host =~ /^(a|b)$/ AND "
+        "time > '2015-06-06 00:00:00.000' AND time < '2015-06-07 00:00:00.000';",
+        "DELETE FROM cpu WHERE dc = 'x' AND host =~ /^(c)$/ AND "
+        "time >= '2015-06-07 00:00:00.000' AND time < '2015-06-08 00:00:00.000';"]
+
+
+@pytest.mark.unit
+def test_invalid_cleanups():
+    with pytest.raises(ValueError):
+        Cleanup(None, Query('value').from_('cpu').date_range(START, START))
+    with pytest.raises(ValueError):
+        Cleanup(None, Query().from_('cpu').delete().date_range(START))
+    with pytest.raises(ValueError):
+        Cleanup(None, delete_query(), tag='host')
+
+
+@pytest.mark.unit
+def test_pauses_when_slow():
+    clock = Clock()
+    engine = SlowEngine(clock, latencies=[1, 6, 1])
+    cleanup = Cleanup(engine, delete_query(3), concurrency=1, max_latency=5,
+                      pause=30, clock=clock, sleep=clock.sleep)
+    assert cleanup.run() == 3
+    assert len(engine.queries) == 3
+    assert cleanup.pauses == 1
+    assert clock.slept == [30]
+    assert cleanup.latencies == [1, 6, 1]
+
+
+@pytest.mark.unit
+def test_checkpoint_resume(tmpdir):
+    path = str(tmpdir.join('cleanup.json'))
+    clock = Clock()
+    engine = SlowEngine(clock, fail_at=2)
+    cleanup = Cleanup(engine, delete_query(4), concurrency=1,
+                      checkpoint=path, clock=clock, sleep=clock.sleep)
+    with pytest.raises(RuntimeError):
+        cleanup.run()
+    with open(path) as f:
+        assert len(json.load(f)['done']) == 2
+
+    engine = SlowEngine(clock)
+    resumed = Cleanup(engine, delete_query(4), concurrency=1,
+                      checkpoint=path, clock=clock, sleep=clock.sleep)
+    assert resumed.run() == 2
+    assert [q.split('time >= ')[1][:25] for q in engine.queries] == [
+        "'2015-06-08 00:00:00.000'", "'2015-06-09 00:00:00.000'"]
+    assert resumed.run() == 0
+
+
+@pytest.mark.unit
+def test_checkpoint_mismatch(tmpdir):
+    """A checkpoint of another cleanup would skip deletes still to run
+    """
+    path = str(tmpdir.join('cleanup.json'))
+    clock = Clock()
+    hosts = ['a', 'b', 'c']
+    cleanup = Cleanup(SlowEngine(clock), delete_query(2), tag='host',
+                      values=hosts, series_batch=2, concurrency=1,
+                      checkpoint=path, clock=clock, sleep=clock.sleep)
+    assert cleanup.run() == 4
+    for kwargs in [dict(query=delete_query(3)),
+                   dict(window=timedelta(hours=12)),
+                   dict(values=['a', 'b', 'd']),
+                   dict(series_batch=1)]:
+        arguments = dict(query=delete_query(2), tag='host', values=hosts,
+                         series_batch=2)
+        arguments.update(kwargs)
+        with pytest.raises(ValueError) as e:
+            Cleanup(SlowEngine(clock), checkpoint=path, **arguments)
+        assert list(kwargs)[0] in str(e.value)
+    resumed = Cleanup(SlowEngine(clock), delete_query(2), tag='host',
+                      values=list(reversed(hosts)), series_batch=2,
+                      checkpoint=path)
+    assert resumed.run() == 0
+
+
+@pytest.mark.unit
+def test_concurrent_run():
+    clock = Clock()
+    engine = SlowEngine(clock)
+    cleanup = Cleanup(engine, delete_query(10), tag='host',
+                      values=['h%i' % i for i in range(10)], series_batch=5,
+                      concurrency=4)
+    assert cleanup.run() == 20
+    assert len(set(engine.queries)) == 20
+
+
+@pytest.mark.unit
+def test_drop_statements():
+    assert str(DropSeries('cpu')) == 'DROP SERIES FROM cpu;'
+    assert str(DropSeries().where(host='a')) == \
+        "DROP SERIES WHERE host = 'a';"
+    assert str(DropSeries('cpu-load').where(host__in=['a', 'b'])) == \
+        "DROP SERIES FROM \"cpu-load\" WHERE (host = 'a' OR host = 'b');"
+    with pytest.raises(ValueError):
+        DropSeries('cpu').where(time__gt=START)
+    with pytest.raises(ValueError):
+        DropSeries('cpu').date_range(START)
+    drop = DropSeries('cpu').where(host='a')
+    clone = drop.clone()
+    assert isinstance(clone, DropSeries)
+    assert str(clone) == "DROP SERIES FROM cpu WHERE host = 'a';"
+    clone.where(region='us')
+    assert str(drop) == "DROP SERIES FROM cpu WHERE host = 'a';"
+    with pytest.raises(ValueError):
+        str(DropSeries())
+    assert str(DropMeasurement('cpu')) == 'DROP MEASUREMENT "cpu";'
+    assert str(DropMeasurement('a"b')) == 'DROP MEASUREMENT "a\\"b";'
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+    test_coalesce
+    ~~~~~~~~~~~~~
+
+    Tests merging sibling queries
+"""
+
+import pytest
+from datetime import datetime
+from influxdb.resultset import ResultSet
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.functions import (Mean, Max, Sum, Count, Last, Percentile,
+                                  Top, Bottom, Distinct, Derivative,
+                                  MovingAverage, Expression)
+from pyinfluxql.coalesce import Coalescer, column_names, project_result
+
+
+class FakeClient(object):
+    """Returns results for the merged statements the tests expect
+    """
+    def __init__(self, responses):
+        self.responses = responses
+        self.queries = []
+
+    def query(self, query, **kwargs):
+        self.queries.append(query)
+        return ResultSet(self.responses.get(query, {'statement_id': 0}))
+
+
+@pytest.mark.unit
+def test_column_names():
+    assert column_names([Mean('cpu'), Max('cpu'), Mean('mem')]) == \
+        ['mean', 'max', 'mean_1']
+    assert column_names(['cpu', '"mem"', Mean('cpu').as_('m'),
+                         Expression('a + b').as_('c')]) == \
+        ['cpu', 'mem', 'm', 'c']
+
+
+@pytest.mark.unit
+def test_project_result():
+    result = ResultSet({'statement_id': 0, 'series': [
+        {'name': 'x', 'tags': {'host': 'a'}, 'columns': ['time', 'a', 'b'],
+         'values': [[1, 1.0, None], [2, None, None], [3, None, 3.0]]}]})
+    projected = project_result(result, ['b'], ['mean'])
+    assert projected.raw['series'][0]['columns'] == ['time', 'mean']
+    assert projected.raw['series'][0]['tags'] == {'host': 'a'}
+    assert projected.raw['series'][0]['values'] == [[1, None], [2, None], [3, 3.0]]
+    projected = project_result(result, ['b'], ['b'], drop_empty=True)
+    assert projected.raw['series'][0]['values'] == [[3, 3.0]]
+    projected = project_result(result, ['a', 'b'], ['x', 'y'], drop_empty=True)
+    assert projected.raw['series'][0]['values'] == [[1, 1.0, None], [3, None, 3.0]]
+
+
+@pytest.mark.unit
+def test_coalesce():
+    start = datetime(2015, 6, 6)
+    base = Query().from_('stats').where(host='a').date_range(start) \
+        .group_by(time='1h')
+    merged = ("SELECT MEAN(cpu) AS _c0_0, MAX(cpu) AS _c1_0, MEAN(mem) AS _c2_0, "
+              "MAX(mem) AS _c2_1 FROM stats WHERE host = 'a' AND "
+              "time > '2015-06-06 00:00:00.000' GROUP BY time(1h);")
+    client = FakeClient({merged: {'statement_id': 0, 'series': [{
+        'name': 'stats',
+        'columns': ['time', '_c0_0', '_c1_0', '_c2_0', '_c2_1'],
+        'values': [['2015-06-06T00:00:00Z', 1.0, 2.0, 3.0, 4.0],
+                   ['2015-06-06T01:00:00Z', None, None, None, None]]}]}})
+    coalescer = Coalescer(Engine(client))
+    mean_cpu = coalescer.add(base.clone().select(Mean('cpu')))
+    max_cpu = coalescer.add(base.clone().select(Max('cpu')))
+    mem = coalescer.add(base.clone().select(Mean('mem'), Max('mem').as_('peak')))
+    other = coalescer.add(Query(Mean('cpu')).from_('stats').where(host='b'))
+    assert len(coalescer) == 4
+    results = coalescer.execute()
+
+    assert client.queries == [
+        merged, "SELECT MEAN(cpu) FROM stats WHERE host = 'b';"]
+    assert len(coalescer) == 0
+    assert list(results[mean_cpu].get_points()) == [
+        {'time': '2015-06-06T00:00:00Z', 'mean': 1.0},
+        {'time': '2015-06-06T01:00:00Z', 'mean': None}]
+    assert list(results[max_cpu].get_points()) == [
+        {'time': '2015-06-06T00:00:00Z', 'max': 2.0},
+        {'time': '2015-06-06T01:00:00Z', 'max': None}]
+    assert list(results[mem].get_points())[0] == \
+        {'time': '2015-06-06T00:00:00Z', 'mean': 3.0, 'peak': 4.0}
+    assert list(results[other].get_points()) == []
+
+
+@pytest.mark.unit
+def test_coalesce_groups():
+    coalescer = Coalescer(None)
+    coalescer.add(Query(Mean('cpu')).from_('x'))
+    coalescer.add(Query('cpu').from_('x'))
+    coalescer.add(Query(Max('cpu')).from_('x'))
+    coalescer.add(Query('mem').from_('x'))
+    coalescer.add(Query('*').from_('x'))
+    coalescer.add(Query('*').from_('x'))
+    coalescer.add(Query(Max('cpu')).from_('x').limit(10))
+    coalescer.add(Query(Max('cpu'), 'cpu').from_('x'))
+    coalescer.add(Query(Max('cpu')).from_('x').into('y'))
+    # MAX() without GROUP BY time returns the time of the selected point
+    assert coalescer.groups() == [[0], [1, 3], [2], [4], [5], [6], [7], [8]]
+
+
+@pytest.mark.unit
+def test_coalesce_unmergeable():
+    """Selectors are only merged when grouped by time, TOP(), BOTTOM(),
+    DISTINCT() and transformations never
+    """
+    coalescer = Coalescer(None)
+    coalescer.add(Query(Mean('cpu')).from_('x'))
+    coalescer.add(Query(Sum('cpu')).from_('x'))
+    coalescer.add(Query(Percentile('cpu', 95)).from_('x'))
+    coalescer.add(Query(Top('cpu', 3)).from_('x'))
+    coalescer.add(Query(Distinct('cpu')).from_('x'))
+    coalescer.add(Query(Derivative('cpu')).from_('x'))
+    coalescer.add(Query(Expression(Count(Distinct('cpu')))).from_('x'))
+    assert coalescer.groups() == [[0, 1], [2], [3], [4], [5], [6]]
+
+    coalescer = Coalescer(None)
+    for function in (Mean('cpu'), Max('cpu'), Last('cpu'), Bottom('cpu', 2),
+                     MovingAverage(Mean('cpu'), 3), Max('mem')):
+        coalescer.add(Query(function).from_('x').group_by(time='1m'))
+    assert coalescer.groups() == [[0, 1, 2, 5], [3], [4]]
+
+
+@pytest.mark.unit
+def test_execute_coalesced_raw_fields():
+    merged = "SELECT cpu AS _c0_0, mem AS _c1_0 FROM x;"
+    client = FakeClient({merged: {'statement_id': 0, 'series': [{
+        'name': 'x', 'columns': ['time', '_c0_0', '_c1_0'],
+        'values': [[1, 1.0, None], [2, None, 2.0]]}]}})
+    cpu, mem = Engine(client).execute_coalesced(
+        [Query('cpu').from_('x'), Query('mem').from_('x')])
+    assert client.queries == [merged]
+    assert list(cpu.get_points()) == [{'time': 1, 'cpu': 1.0}]
+    assert list(mem.get_points()) == [{'time': 2, 'mem': 2.0}]
+
+
+@pytest.mark.unit
+def test_coalesce_limit_and_fill_none():
+    """A LIMIT on raw queries and fill(none) depend on the other fields of
+    a merged statement
+    """
+    coalescer = Coalescer(None)
+    coalescer.add(Query('cpu').from_('x').limit(10))
+    coalescer.add(Query('mem').from_('x').limit(10))
+    coalescer.add(Query(Mean('cpu')).from_('x').limit(10))
+    coalescer.add(Query(Mean('mem')).from_('x').limit(10))
+    coalescer.add(Query('cpu').from_('x'))
+    coalescer.add(Query('mem').from_('x'))
+    assert coalescer.groups() == [[0], [1], [2, 3], [4, 5]]
+
+    coalescer = Coalescer(None)
+    for fill in ('none', 'none', 'null', 'null', 0):
+        coalescer.add(Query(Mean('cpu')).from_('x')
+                      .group_by(time='1m', fill=fill))
+    coalescer.add(Query(Mean('mem')).from_('x').group_by(time='1m', fill=0))
+    assert coalescer.groups() == [[0], [1], [2, 3], [4, 5]]
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+    test_compact
+    ~~~~~~~~~~~~
+
+    Tests the compact result type
+"""
+
+import gc
+import json
+import tracemalloc
+
+import pytest
+from influxdb.exceptions import InfluxDBClientError
+from influxdb.resultset import ResultSet
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.compact import CompactResult, to_compact
+from pyinfluxql.decode import pack_results
+from pyinfluxql.testing import FakeInfluxDB
+
+RAW = {'statement_id': 0, 'series': [
+    {'name': 'cpu', 'tags': {'host': 'a'}, 'columns': ['time', 'value', 'n'],
+     'values': [[1, 0.5, 'x'], [2, None, 'y'], [3, 2, None]]},
+    {'name': 'cpu', 'tags': {'host': 'b'}, 'columns': ['time', 'value', 'n'],
+     'values': [[1, 1.5, 'z']]},
+    {'name': 'mem', 'columns': ['time', 'host'],
+     'values': [[1, 'a'], [2, 'b']]}]}
+
+
+def grouped(series=200, rows=50):
+    return {'statement_id': 0, 'series': [
+        {'name': 'cpu', 'tags': {'host': 'h%i' % (i % 50),
+                                 'region': 'r%i' % (i // 50)},
+         'columns': ['time', 'mean', 'count'],
+         'values': [[1433548800 + j * 60, i * 0.5 + j, j]
+                    for j in range(rows)]} for i in range(series)]}
+
+
+@pytest.mark.unit
+def test_get_points():
+    expected = ResultSet(RAW)
+    result = CompactResult.from_raw(RAW)
+    assert len(result) == 3
+    assert result.keys() == expected.keys()
+    for kwargs in ({}, {'measurement': 'cpu'}, {'tags': {'host': 'a'}},
+                   {'measurement': 'mem', 'tags': {'host': 'b'}}):
+        assert [dict(p) for p in result.get_points(**kwargs)] == \
+            list(expected.get_points(**kwargs))
+    assert result.raw == RAW
+    assert [list(points) for _, points in result.items()] == \
+        [list(points) for _, points in expected.items()]
+
+
+@pytest.mark.unit
+def test_interning():
+    raw = grouped(series=100)
+    result = CompactResult.from_raw(raw)
+    assert result.series[0].columns is result.series[99].columns
+    assert result.series[0].tags['host'] is result.series[50].tags['host']
+    assert [s.data[0].typecode for s in result.series[:1]] == ['q']
+
+    results = to_compact([ResultSet(raw), ResultSet(raw)])
+    assert results[0].series[3].tags is results[1].series[3].tags
+
+
+@pytest.mark.unit
+def test_point_view():
+    point = next(CompactResult.from_raw(RAW).get_points())
+    assert point['value'] == 0.5
+    assert list(point) == ['time', 'value', 'n']
+    assert 'n' in point and 'host' not in point
+    with pytest.raises(KeyError):
+        point['host']
+    assert [p['value'] for p in CompactResult.from_raw(RAW).get_points(
+        measurement='cpu')] == [0.5, None, 2.0, 1.5]
+
+
+@pytest.mark.unit
+def test_to_numpy():
+    numpy = pytest.importorskip('numpy')
+    series = CompactResult.from_raw(RAW).series[0]
+    assert series.to_numpy('time').tolist() == [1, 2, 3]
+    assert numpy.isnan(series.to_numpy('value')[1])
+    assert series.to_numpy('n').tolist() == ['x', 'y', None]
+
+
+@pytest.mark.unit
+def test_errors():
+    with pytest.raises(InfluxDBClientError):
+        CompactResult.from_raw({'error': 'bad'})
+    result = CompactResult.from_raw({'error': 'bad'}, raise_errors=False)
+    assert result.error == 'bad' and list(result.get_points()) == []
+
+
+@pytest.mark.unit
+def test_engine_compact():
+    with FakeInfluxDB() as server:
+        client = server.client('test')
+        client.create_database('test')
+        client.write_points([{'measurement': 'cpu', 'time': i,
+                              'tags': {'host': 'h%i' % (i % 2)},
+                              'fields': {'value': i * 1.5}}
+                             for i in range(10)], time_precision='s')
+        query = Query('value').from_('cpu').group_by('host')
+        expected = list(Engine(client).execute(query, epoch='s')
+                        .get_points(tags={'host': 'h1'}))
+        for engine in (Engine(client), Engine(client, decoder='json')):
+            result = engine.execute(query, format='compact', epoch='s')
+            assert isinstance(result, CompactResult)
+            assert [dict(p) for p in result.get_points(
+                tags={'host': 'h1'})] == expected
+        chunks = Engine(client, decoder='json').execute(
+            Query('value').from_('cpu'), format='compact', chunked=True,
+            chunk_size=4)
+        assert [len(list(c.get_points())) for c in chunks] == [4, 4, 2]
+
+
+def retained(build):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = build()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return size
+
+
+@pytest.mark.unit
+def test_memory():
+    body = json.dumps({'results': [grouped()]})
+
+    def result_set():
+        return ResultSet(json.loads(body)['results'][0])
+
+    def compact():
+        return CompactResult.from_packed(
+            pack_results(json.loads(body))['results'][0])
+
+    assert retained(compact) * 3 < retained(result_set)
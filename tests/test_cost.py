@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+    test_cost
+    ~~~~~~~~~
+
+    Tests the cost estimator and the engine guardrails against synthetic
+    catalogs
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from influxdb.resultset import ResultSet
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.catalog import Catalog, CATALOG_VERSION
+from pyinfluxql.cost import (CostEstimator, Guardrail, QueryTooExpensive)
+from pyinfluxql.functions import Expression, Mean
+
+NOW = datetime(2015, 6, 10)
+
+
+def synthetic_catalog(series=1000, hosts=100, regions=4):
+    """A catalog that never hits the server, with `series` cpu series
+    """
+    return Catalog(None, ttl=None).load({
+        'version': CATALOG_VERSION,
+        'measurements': {'': [0, ['cpu', 'cpu_extra', 'mem']]},
+        'series_count': {'cpu': [0, series], 'cpu_extra': [0, 10],
+                         'mem': [0, 5]},
+        'tag_keys': {'cpu': [0, ['host', 'region']],
+                     'cpu_extra': [0, []]},
+        'tag_values': {
+            '["cpu", "host"]': [0, ['h%i' % i for i in range(hosts)]],
+            '["cpu", "region"]': [0, ['r%i' % i for i in range(regions)]]},
+    })
+
+
+def estimator(**kwargs):
+    return CostEstimator(synthetic_catalog(**kwargs), point_interval=10,
+                         clock=lambda: NOW)
+
+
+class RecordingClient(object):
+    def __init__(self):
+        self.queries = []
+
+    def query(self, query, **kwargs):
+        self.queries.append(query)
+        i = len(self.queries)
+        return ResultSet({'series': [{
+            'name': 'cpu', 'columns': ['time', 'value'],
+            'values': [[i, 1.0], [i, 2.0]]}]})
+
+
+@pytest.mark.unit
+def test_estimate_raw():
+    cost = estimator().estimate(Query('value').from_('cpu'))
+    assert cost.series == 1000
+    assert cost.span == timedelta(days=365)
+    assert cost.points == 1000 * 365 * 8640
+    assert cost.rows == cost.points
+
+    cost = estimator().estimate(
+        Query('value').from_('cpu').date_range(NOW - timedelta(hours=1))
+        .where(host='h1'))
+    assert cost.series == 10
+    assert cost.points == 10 * 360
+
+    cost = estimator().estimate(Query('value').from_('cpu').limit(5)
+                                .where(host__in=['h1', 'h2'], region='r0'))
+    assert cost.series == 5
+    assert cost.rows == cost.points == 25
+
+    # bare integers are nanosecond epochs
+    cost = estimator().estimate(Query('value').from_('cpu').where(
+        time__gt=1433894400000000000 - 3600 * 10 ** 9, host='h1'))
+    assert cost.span == timedelta(hours=1)
+
+
+@pytest.mark.unit
+def test_estimate_aware_start():
+    from dateutil.tz import gettz, tzutc
+    start = datetime(2015, 6, 10, 1, tzinfo=gettz('Europe/Berlin'))
+    query = Query('value').from_('cpu').date_range(start).where(host='h1')
+    cost = estimator().estimate(query)
+    assert cost.span == timedelta(hours=1)
+    # an aware clock works as well
+    cost = CostEstimator(synthetic_catalog(), point_interval=10,
+                         clock=lambda: NOW.replace(tzinfo=tzutc())) \
+        .estimate(query)
+    assert cost.span == timedelta(hours=1)
+    engine = Engine(RecordingClient(), Guardrail(CostEstimator(),
+                                                 max_points=10 ** 9))
+    engine.execute(Query('value').from_('cpu').date_range(
+        datetime.now(tzutc()) - timedelta(hours=1)))
+    assert len(engine.client.queries) == 1
+
+
+@pytest.mark.unit
+def test_estimate_aggregates():
+    query = Query(Mean('value')).from_('cpu') \
+        .where(time__gt=Expression('now() - 1d'))
+    cost = estimator().estimate(query)
+    assert cost.span == timedelta(days=1)
+    assert cost.points == 1000 * 8640
+    assert cost.rows == 1
+    assert estimator().estimate(query.clone().group_by('host', time='1h')) \
+        .rows == 1000 * 24
+
+
+@pytest.mark.unit
+def test_estimate_regex_measurement():
+    assert estimator().series(Query('value').from_('/^cpu/')) == 1010
+    assert CostEstimator().series(Query('value').from_('/^cpu/')) == 1
+
+
+@pytest.mark.unit
+def test_guardrail_rejects():
+    engine = Engine(RecordingClient(),
+                    Guardrail(estimator(), max_points=10 ** 6))
+    with pytest.raises(QueryTooExpensive) as e:
+        engine.execute(Query('value').from_('cpu'))
+    assert e.value.cost.series == 1000
+    assert engine.client.queries == []
+    engine.execute(Query('value').from_('cpu').where(host='h1')
+                   .date_range(NOW - timedelta(days=1)))
+    assert len(engine.client.queries) == 1
+
+
+@pytest.mark.unit
+def test_guardrail_limits():
+    engine = Engine(RecordingClient(), Guardrail(
+        estimator(), max_points=10 ** 6, max_rows=10000, action='limit'))
+    engine.execute(Query('value').from_('cpu'))
+    assert engine.client.queries == ['SELECT value FROM cpu LIMIT 10;']
+    with pytest.raises(QueryTooExpensive):
+        engine.execute(Query(Mean('value')).from_('cpu'))
+
+
+@pytest.mark.unit
+def test_guardrail_shards():
+    start = datetime(2015, 6, 6, 0, 30)
+    guardrail = Guardrail(estimator(), max_points=10 ** 6, action='shard')
+    query = Query(Mean('value')).from_('cpu') \
+        .date_range(start, start + timedelta(hours=8)).group_by(time='1h')
+    shards = guardrail.check(query)
+    assert len(shards) == 3
+    # shard boundaries fall on group by buckets
+    assert [s._where.get('time__gte') for s in shards] == [
+        None, datetime(2015, 6, 6, 3), datetime(2015, 6, 6, 5)]
+    assert shards[0]._where['time__gt'] == start
+    assert shards[-1]._where['time__lt'] == start + timedelta(hours=8)
+
+    engine = Engine(RecordingClient(), guardrail)
+    result = engine.execute(query)
+    assert len(engine.client.queries) == 3
+    assert [v for _, v in result.raw['series'][0]['values']] == [1.0, 2.0] * 3
+    assert engine.execute(query.clone().limit(3)).raw['series'][0]['values'] \
+        == [[4, 1.0], [4, 2.0], [5, 1.0]]
+
+    # aggregates without time buckets or open ended ranges can't be split
+    with pytest.raises(QueryTooExpensive):
+        guardrail.check(Query(Mean('value')).from_('cpu')
+                        .date_range(start, start + timedelta(hours=8)))
+    with pytest.raises(QueryTooExpensive):
+        guardrail.check(Query('value').from_('cpu'))
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+    test_dataframe
+    ~~~~~~~~~~~~~~
+
+    Tests DataFrame conversion of results
+"""
+
+import pytest
+from influxdb.resultset import ResultSet
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.functions import Mean
+from pyinfluxql.dataframe import to_dataframe
+
+pd = pytest.importorskip('pandas')
+
+
+def grouped_result():
+    return ResultSet({'statement_id': 0, 'series': [
+        {'name': 'cpu', 'tags': {'host': 'a', 'dc': 'x'},
+         'columns': ['time', 'mean'],
+         'values': [['2015-06-06T00:00:00Z', 1.0],
+                    ['2015-06-06T01:00:00.5Z', 2.0]]},
+        {'name': 'cpu', 'tags': {'host': 'b', 'dc': 'x'},
+         'columns': ['time', 'mean'],
+         'values': [['2015-06-06T00:00:00Z', 3.0]]}]})
+
+
+@pytest.mark.unit
+def test_to_dataframe():
+    result = ResultSet({'statement_id': 0, 'series': [
+        {'name': 'cpu', 'columns': ['time', 'value', 'host'],
+         'values': [['2015-06-06T00:00:00Z', 1, 'a'],
+                    ['2015-06-06T00:01:00Z', None, 'b']]}]})
+    df = to_dataframe(result)
+    assert list(df.columns) == ['value', 'host']
+    assert isinstance(df.index, pd.DatetimeIndex)
+    assert str(df.index.tz) == 'UTC'
+    assert df.index[1] == pd.Timestamp('2015-06-06 00:01:00', tz='UTC')
+    assert df['value'].iloc[0] == 1
+    assert pd.isnull(df['value'].iloc[1])
+    assert list(df['host']) == ['a', 'b']
+
+
+@pytest.mark.unit
+def test_to_dataframe_epoch():
+    result = ResultSet({'statement_id': 0, 'series': [
+        {'name': 'cpu', 'columns': ['time', 'value'],
+         'values': [[1433548800000, 1.0]]}]})
+    df = to_dataframe(result, epoch='ms')
+    assert df.index[0] == pd.Timestamp('2015-06-06', tz='UTC')
+
+
+@pytest.mark.unit
+def test_to_dataframe_multiindex():
+    df = to_dataframe(grouped_result())
+    assert df.index.names == ['dc', 'host', 'time']
+    assert isinstance(df.index.get_level_values('host').dtype,
+                      pd.CategoricalDtype)
+    assert list(df.index.get_level_values('host')) == ['a', 'a', 'b']
+    assert list(df['mean']) == [1.0, 2.0, 3.0]
+    assert df.loc[('x', 'b')]['mean'].iloc[0] == 3.0
+    assert df.index.get_level_values('time')[1] == \
+        pd.Timestamp('2015-06-06 01:00:00.5', tz='UTC')
+
+
+@pytest.mark.unit
+def test_to_dataframe_multiple_measurements():
+    result = ResultSet({'statement_id': 0, 'series': [
+        {'name': 'cpu', 'tags': {'host': 'a'}, 'columns': ['time', 'value'],
+         'values': [['2015-06-06T00:00:00Z', 1.0]]},
+        {'name': 'mem', 'columns': ['time', 'free'],
+         'values': [['2015-06-06T00:00:00Z', 2.0]]}]})
+    df = to_dataframe(result)
+    assert df.index.names == ['measurement', 'host', 'time']
+    assert list(df.index.get_level_values('measurement')) == ['cpu', 'mem']
+    assert list(df.columns) == ['value', 'free']
+    assert pd.isnull(df['free'].iloc[0])
+    assert pd.isnull(df.index.get_level_values('host')[1])
+
+
+@pytest.mark.unit
+def test_to_dataframe_per_series():
+    frames = to_dataframe(grouped_result(), per_series=True)
+    assert sorted(frames) == [('cpu', (('dc', 'x'), ('host', 'a'))),
+                              ('cpu', (('dc', 'x'), ('host', 'b')))]
+    df = frames[('cpu', (('dc', 'x'), ('host', 'a')))]
+    assert list(df['mean']) == [1.0, 2.0]
+    assert isinstance(df.index, pd.DatetimeIndex)
+
+
+@pytest.mark.unit
+def test_to_dataframe_empty():
+    df = to_dataframe(ResultSet({'statement_id': 0}))
+    assert len(df) == 0
+
+
+@pytest.mark.unit
+def test_execute_dataframe():
+    class Client(object):
+        def query(self, query, **kwargs):
+            self.kwargs = kwargs
+            return grouped_result()
+
+    client = Client()
+    engine = Engine(client)
+    query = Query(Mean('value')).from_('cpu').group_by('host', 'dc')
+    df = engine.execute(query, format='dataframe')
+    assert df.index.names == ['dc', 'host', 'time']
+    engine.execute(query, epoch='s')
+    assert client.kwargs == {'epoch': 's'}
+    with pytest.raises(ValueError):
+        engine.execute(query, format='xml')
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+    test_decode
+    ~~~~~~~~~~~
+
+    Tests pluggable response decoding and process pool offloading
+"""
+
+import json
+import pytest
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.decode import (Decoder, get_decoder, pack_column,
+                               unpack_column, pack_results, unpack_results,
+                               to_shared_memory, from_shared_memory,
+                               shared_memory)
+from pyinfluxql.testing import FakeInfluxDB
+
+BODY = json.dumps({'results': [{'statement_id': 0, 'series': [
+    {'name': 'cpu', 'tags': {'host': 'a'}, 'columns': ['time', 'value', 'n'],
+     'values': [[1, 0.5, 'x'], [2, None, 'y'], [3, 2, None]]},
+    {'name': 'cpu', 'columns': ['time', 'value'], 'values': []}]}]}) \
+    .encode('utf-8')
+
+
+@pytest.mark.unit
+def test_get_decoder():
+    assert get_decoder('json')(b'{"a": 1}') == {'a': 1}
+    assert get_decoder(len) is len
+    assert get_decoder('auto')(b'[1]') == [1]
+    with pytest.raises(ValueError):
+        get_decoder('yaml')
+
+
+@pytest.mark.unit
+def test_orjson_decoder():
+    pytest.importorskip('orjson')
+    assert Decoder('orjson').decode(BODY) == json.loads(BODY.decode('utf-8'))
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('values, typecode', [
+    ([1, 2, 3], 'q'),
+    ([0.5, None, 2], 'd'),
+    (['a', None], 'o'),
+    ([1, None], 'o'),
+    ([2 ** 70, 1], 'o'),
+    ([True, False], 'o'),
+])
+def test_pack_column(values, typecode):
+    packed = pack_column(values)
+    assert packed[0] == typecode
+    assert unpack_column(*packed) == values
+
+
+@pytest.mark.unit
+def test_pack_results():
+    data = pack_results(json.loads(BODY.decode('utf-8')))
+    series = data['results'][0]['series'][0]
+    assert 'values' not in series
+    assert [c[0] for c in series['packed']] == ['q', 'd', 'o']
+    assert unpack_results(data) == json.loads(BODY.decode('utf-8'))
+
+
+@pytest.mark.unit
+@pytest.mark.skipif(shared_memory is None, reason="needs shared_memory")
+def test_shared_memory():
+    data = pack_results(json.loads(BODY.decode('utf-8')))
+    name = to_shared_memory(data)
+    assert data['results'][0]['series'][0]['packed'][0] == ('q', False, (0, 3))
+    data = from_shared_memory(data, name)
+    assert unpack_results(data) == json.loads(BODY.decode('utf-8'))
+    with pytest.raises(Exception):
+        shared_memory.SharedMemory(name=name)
+
+
+@pytest.mark.unit
+def test_offload():
+    decoder = Decoder('json', offload_threshold=len(BODY))
+    try:
+        assert decoder.decode(BODY[:-1] + b' }') == \
+            json.loads(BODY.decode('utf-8'))
+        assert decoder.decode(b'{}') == {}
+        assert decoder.offloaded == 1
+    finally:
+        decoder.close()
+
+
+@pytest.mark.unit
+def test_engine_decoder():
+    with FakeInfluxDB() as server:
+        client = server.client('test')
+        client.create_database('test')
+        client.write_points([{'measurement': 'cpu', 'time': i,
+                              'fields': {'value': i * 1.5}}
+                             for i in range(10)], time_precision='s')
+        engine = Engine(client, decoder='json')
+        result = engine.execute(Query('value').from_('cpu'), epoch='s')
+        assert [p['value'] for p in result.get_points()] == \
+            [i * 1.5 for i in range(10)]
+        chunks = engine.execute(Query('value').from_('cpu'), chunked=True,
+                                chunk_size=4)
+        assert [len(list(c.get_points())) for c in chunks] == [4, 4, 2]
+        assert engine.client.write_points is not None
+
+
+class RequestClient(object):
+    """Only has the `request` method of InfluxDBClient"""
+    def __init__(self):
+        self.requests = []
+
+    def request(self, **kwargs):
+        self.requests.append(kwargs)
+
+        class Response(object):
+            content = BODY
+        return Response()
+
+
+@pytest.mark.unit
+def test_decoding_client_request():
+    from pyinfluxql.decode import DecodingClient
+    client = RequestClient()
+    result = DecodingClient(client, Decoder('json')).query('SELECT value FROM cpu')
+    assert len(list(result.get_points())) == 3
+    request, = client.requests
+    assert 'db' not in request['params']
+    assert request['headers'] == {'Accept': 'application/json'}
+    DecodingClient(client).query('SELECT value FROM cpu', database='db')
+    assert client.requests[1]['params']['db'] == 'db'
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+    test_densify
+    ~~~~~~~~~~~~
+
+    Tests rebuilding the bucket grid of fill(none) results client side
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from influxdb.resultset import ResultSet
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.functions import Count, Max
+from pyinfluxql.testing import FakeInfluxDB
+
+pytest.importorskip('numpy')
+
+from pyinfluxql.densify import densify  # noqa: E402
+
+START = datetime(2015, 6, 6)
+SPARSE = ResultSet({'statement_id': 0, 'series': [
+    {'name': 'cpu', 'columns': ['time', 'count', 'host'],
+     'values': [[1433548860, 2, 'a'], [1433549040, 8, None]]}]})
+
+
+def query(fill=None):
+    return Query(Count('value')).from_('cpu') \
+        .date_range(START, START + timedelta(minutes=6)) \
+        .group_by(time='1m', fill=fill)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('fill, counts, hosts', [
+    (None, [None, 2, None, None, 8, None], [None, 'a'] + [None] * 4),
+    (0, [0, 2, 0, 0, 8, 0], [0, 'a', 0, 0, 0, 0]),
+    ('previous', [None, 2, 2, 2, 8, 8], [None] + ['a'] * 5),
+    ('linear', [None, 2, 4, 6, 8, None], [None, 'a'] + [None] * 4),
+    ('none', [2, 8], ['a', None]),
+])
+def test_densify(fill, counts, hosts):
+    result = densify(SPARSE, query(), fill, epoch='s')
+    points = list(result.get_points())
+    assert [p['count'] for p in points] == counts
+    assert [p['host'] for p in points] == hosts
+    if fill != 'none':
+        assert [p['time'] for p in points] == \
+            [1433548800 + i * 60 for i in range(6)]
+
+
+@pytest.mark.unit
+def test_densify_options():
+    assert [p['count'] for p in densify(SPARSE, query('previous'), epoch='s')
+            .get_points()][-1] == 8
+    result = densify(SPARSE, Query(Count('value')).group_by(time='1m'),
+                     'linear', epoch='s')
+    assert [p['count'] for p in result.get_points()] == [2, 4, 6, 8]
+    result = densify(SPARSE, query().order('time', 'desc').limit(2), 0,
+                     epoch='s')
+    assert [p['time'] for p in result.get_points()] == \
+        [1433549100, 1433549040]
+    with pytest.raises(ValueError):
+        densify(SPARSE, Query(Count('value')))
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('fill', [0, 'null', 'previous', 'linear'])
+def test_execute_dense(fill):
+    with FakeInfluxDB() as server:
+        client = server.client('test')
+        client.create_database('test')
+        client.write_points([
+            {'measurement': 'cpu', 'tags': {'host': 'h%i' % (i % 2)},
+             'time': START + timedelta(minutes=i * 3),
+             'fields': {'value': float(i)}} for i in range(5)])
+        engine = Engine(client)
+        query = Query(Max('value')).from_('cpu') \
+            .date_range(START - timedelta(minutes=2),
+                        START + timedelta(minutes=20)) \
+            .group_by('host', time='2m', fill=fill)
+        for epoch in ('s', None):
+            assert engine.execute_dense(query, epoch=epoch).raw == \
+                engine.execute(query, epoch=epoch).raw
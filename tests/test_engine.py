@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+    test_engine
+    ~~~~~~~~~~~
+
+    Tests the query engine against a fake client
+"""
+
+import pytest
+from influxdb.resultset import ResultSet
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.functions import Mean
+
+
+class FakeClient(object):
+    def __init__(self, series=None):
+        self.series = series or []
+        self.queries = []
+
+    def query(self, query, **kwargs):
+        self.queries.append(query)
+        return ResultSet({'statement_id': 0, 'series': self.series})
+
+
+def host_series(host, region=None, mean=1.0):
+    tags = {'host': host}
+    if region:
+        tags['region'] = region
+    return {'name': 'cpu', 'tags': tags, 'columns': ['time', 'mean'],
+            'values': [['2015-06-06T00:00:00Z', mean]]}
+
+
+@pytest.mark.unit
+def test_execute():
+    client = FakeClient([host_series('a')])
+    engine = Engine(client)
+    result = engine.execute(Query('value').from_('cpu'))
+    assert client.queries == ['SELECT value FROM cpu;']
+    assert isinstance(result, ResultSet)
+
+
+@pytest.mark.unit
+def test_execute_by_tag():
+    client = FakeClient([host_series('a', mean=1.0), host_series('b', mean=2.0),
+                         host_series('c', mean=3.0)])
+    engine = Engine(client)
+    query = Query(Mean('value')).from_('cpu').where(region='us')
+    results = engine.execute_by_tag(query, 'host', ['a', 'b', 'd'])
+
+    assert client.queries == [
+        "SELECT MEAN(value) FROM cpu WHERE (host = 'a' OR host = 'b' OR "
+        "host = 'd') AND region = 'us' GROUP BY host;"]
+    assert sorted(results) == ['a', 'b', 'd']
+    assert list(results['a'].get_points()) == [
+        {'time': '2015-06-06T00:00:00Z', 'mean': 1.0}]
+    assert list(results['b'].get_points()) == [
+        {'time': '2015-06-06T00:00:00Z', 'mean': 2.0}]
+    assert list(results['d'].get_points()) == []
+    assert 'tags' not in results['a'].raw['series'][0]
+    # the original query is left alone
+    assert str(query) == "SELECT MEAN(value) FROM cpu WHERE region = 'us';"
+
+
+@pytest.mark.unit
+def test_execute_by_tag_regex_keeps_other_tags():
+    client = FakeClient([host_series('a', 'us'), host_series('a', 'eu')])
+    engine = Engine(client)
+    query = Query(Mean('value')).from_('cpu').group_by('region')
+    results = engine.execute_by_tag(query, 'host', ['a'], regex=True)
+    assert client.queries == [
+        "SELECT MEAN(value) FROM cpu WHERE host =~ /^(a)$/ "
+        "GROUP BY region, host;"]
+    assert [s['tags'] for s in results['a'].raw['series']] == [
+        {'region': 'us'}, {'region': 'eu'}]
+
+
+@pytest.mark.unit
+def test_execute_by_tag_already_grouped():
+    client = FakeClient([host_series('a')])
+    query = Query(Mean('value')).from_('cpu').group_by('host')
+    results = Engine(client).execute_by_tag(query, 'host', ['a'])
+    assert client.queries[0].endswith("GROUP BY host;")
+    assert results['a'].raw['series'][0]['tags'] == {'host': 'a'}
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+    test_export
+    ~~~~~~~~~~~
+
+    Tests exporting results to Parquet and Arrow files
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from influxdb.resultset import ResultSet
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.export import split_time_range, part_paths, BatchWriter
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+NS = 1000000000
+
+
+def chunk(host, times, values, region='us'):
+    return ResultSet({'series': [{
+        'name': 'cpu', 'tags': {'host': host, 'region': region},
+        'columns': ['time', 'value'],
+        'values': [[t, v] for t, v in zip(times, values)]}]})
+
+
+class ChunkedClient(object):
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.calls = []
+
+    def query(self, query, **kwargs):
+        self.calls.append((query, kwargs))
+        return iter(self.chunks)
+
+
+@pytest.mark.unit
+def test_part_paths():
+    assert part_paths('/tmp/out.parquet', 2) == [
+        '/tmp/out.part0.parquet', '/tmp/out.part1.parquet']
+
+
+@pytest.mark.unit
+def test_split_time_range():
+    start = datetime(2015, 6, 6)
+    query = Query('value').from_('cpu').date_range(start, start + timedelta(days=3))
+    first, second, third = [str(q) for q in split_time_range(query, 3)]
+    assert first == "SELECT value FROM cpu WHERE time > '2015-06-06 00:00:00.000' " \
+        "AND time < '2015-06-07 00:00:00.000';"
+    assert second == "SELECT value FROM cpu WHERE time >= '2015-06-07 00:00:00.000' " \
+        "AND time < '2015-06-08 00:00:00.000';"
+    assert third == "SELECT value FROM cpu WHERE time >= '2015-06-08 00:00:00.000' " \
+        "AND time < '2015-06-09 00:00:00.000';"
+    with pytest.raises(ValueError):
+        split_time_range(Query('value').from_('cpu').date_range(start), 2)
+
+
+@pytest.mark.unit
+def test_export_parquet(tmpdir):
+    client = ChunkedClient([
+        chunk('a', [1 * NS, 2 * NS], [1.0, 2.0]),
+        chunk('b', [3 * NS], [None], region=None),
+    ])
+    path = str(tmpdir.join('out.parquet'))
+    query = Query('value').from_('cpu').group_by('host', 'region')
+    assert Engine(client).export(query, path, chunk_size=2) == [path]
+    assert client.calls[0][1] == {'chunked': True, 'chunk_size': 2, 'epoch': 'ns'}
+
+    table = pq.read_table(path)
+    assert table.schema.field('time').type == pa.timestamp('ns', tz='UTC')
+    assert pa.types.is_dictionary(table.schema.field('host').type)
+    assert table.column('value').to_pylist() == [1.0, 2.0, None]
+    assert table.column('host').to_pylist() == ['a', 'a', 'b']
+    assert table.column('region').to_pylist() == ['us', 'us', None]
+    assert table.column('time').to_pylist()[2].timestamp() == 3
+
+
+@pytest.mark.unit
+def test_export_arrow(tmpdir):
+    client = ChunkedClient([chunk('a', [NS], [1.0]), chunk('b', [2 * NS], [2.0])])
+    path = str(tmpdir.join('out.arrows'))
+    Engine(client).export(Query('value').from_('cpu').group_by('host'), path,
+                          format='arrow')
+    with pa.ipc.open_stream(path) as reader:
+        table = reader.read_all()
+    assert table.column('host').to_pylist() == ['a', 'b']
+    assert table.schema.names == ['time', 'host', 'value']
+
+
+@pytest.mark.unit
+def test_export_parallel(tmpdir):
+    client = ChunkedClient([chunk('a', [NS], [1.0])])
+    start = datetime(2015, 6, 6)
+    query = Query('value').from_('cpu').date_range(start, start + timedelta(days=2))
+    path = str(tmpdir.join('out.parquet'))
+    paths = Engine(client).export(query, path, jobs=2)
+    assert paths == part_paths(path, 2)
+    assert sorted(q for q, _ in client.calls) == sorted(
+        str(q) for q in split_time_range(query, 2))
+    for part in paths:
+        assert pq.read_table(part).num_rows == 1
+
+
+def rows(path):
+    table = pq.read_table(path)
+    return table.schema, table.to_pylist()
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('first, later, expected', [
+    ([1, 2], [2.5], pa.float64()),        # int turning float
+    ([None, None], [3], pa.int64()),      # null getting a type
+    ([None], [u'up'], pa.string()),
+])
+def test_batch_writer_widens_fields(tmpdir, first, later, expected):
+    path = str(tmpdir.join('out.parquet'))
+    writer = BatchWriter(path)
+    writer.write(chunk('a', range(len(first)), first))
+    writer.write(chunk('b', [NS], later))
+    writer.write(chunk('c', [2 * NS], [None]))
+    writer.close()
+    assert writer.rewrites == 1
+    schema, written = rows(path)
+    assert schema.field('value').type == expected
+    assert [r['value'] for r in written] == first + later + [None]
+    assert [r['host'] for r in written] == ['a'] * len(first) + ['b', 'c']
+    assert tmpdir.listdir() == [tmpdir.join('out.parquet')]
+
+
+@pytest.mark.unit
+def test_batch_writer_rewrites_once(tmpdir):
+    path = str(tmpdir.join('out.parquet'))
+    writer = BatchWriter(path)
+    for i in range(5):
+        writer.write(ResultSet({'series': [{
+            'name': 'cpu', 'columns': ['time', 'f%i' % i],
+            'values': [[i * NS, i]]}]}))
+    assert writer.rewrites == 0
+    writer.close()
+    assert writer.rewrites == 1
+    schema, written = rows(path)
+    assert schema.names == ['time', 'f0', 'f1', 'f2', 'f3', 'f4']
+    assert [[r['f%i' % i] for i in range(5)] for r in written] == [
+        [i if i == j else None for i in range(5)] for j in range(5)]
+    assert tmpdir.listdir() == [tmpdir.join('out.parquet')]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('format', ['parquet', 'arrow'])
+def test_batch_writer_new_columns(tmpdir, format):
+    path = str(tmpdir.join('out'))
+    writer = BatchWriter(path, format=format)
+    writer.write(ResultSet({'series': [{
+        'name': 'cpu', 'tags': {'host': 'a'}, 'columns': ['time', 'value'],
+        'values': [[NS, 1.0]]}]}))
+    writer.write(ResultSet({'series': [{
+        'name': 'cpu', 'tags': {'host': 'b', 'dc': 'x'},
+        'columns': ['time', 'value', 'other'], 'values': [[2 * NS, 2.0, 7]]}]}))
+    writer.close()
+    assert writer.rewrites == 1
+    if format == 'parquet':
+        table = pq.read_table(path)
+    else:
+        with pa.ipc.open_stream(path) as reader:
+            table = reader.read_all()
+    assert table.schema.names == ['time', 'host', 'dc', 'value', 'other']
+    assert pa.types.is_dictionary(table.schema.field('dc').type)
+    assert [(r['dc'], r['host'], r['value'], r['other'])
+            for r in table.to_pylist()] == [
+        (None, 'a', 1.0, None), ('x', 'b', 2.0, 7)]
+
+
+@pytest.mark.unit
+def test_batch_writer_incompatible_types(tmpdir):
+    writer = BatchWriter(str(tmpdir.join('out.parquet')))
+    writer.write(chunk('a', [NS], [1.0]))
+    with pytest.raises(ValueError) as error:
+        writer.write(chunk('a', [2 * NS], [u'up']))
+    assert 'value' in str(error.value)
+    writer.close()
+
+
+@pytest.mark.unit
+def test_batch_writer_invalid_format(tmpdir):
+    with pytest.raises(ValueError):
+        BatchWriter(str(tmpdir.join('out.csv')), format='csv')
@@ -10,7 +10,8 @@ import pytest
 
 from pyinfluxql.functions import (Expression, Func, Sum, Min, Max, Mean, Count,
                                   Median, Derivative, Distinct, Stddev, First,
-                                  Last, Percentile)
+                                  Last, Percentile, Top, Bottom, Spread,
+                                  Mode, Difference, MovingAverage)
 
 
 @pytest.mark.unit
@@ -145,6 +146,45 @@ def test_percentile_fails_upper_range():
         Percentile('col', 100)
 
 
+@pytest.mark.unit
+def test_top_bottom():
+    assert Top('col', 3).format() == 'TOP(col, 3)'
+    assert Top('col', 'host', 'region', 3).format() == \
+        'TOP(col, host, region, 3)'
+    assert Bottom('col', 'host', 1).format() == 'BOTTOM(col, host, 1)'
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('args, error', [
+    (('col',), ValueError),
+    (('col', 2.5), TypeError),
+    (('col', True), TypeError),
+    (('col', 0), ValueError),
+    (('col', 1, 3), TypeError),
+])
+def test_top_fails_invalid_args(args, error):
+    with pytest.raises(error):
+        Top(*args)
+    with pytest.raises(error):
+        Bottom(*args)
+
+
+@pytest.mark.unit
+def test_transformations():
+    assert Spread('col').format() == 'SPREAD(col)'
+    assert Mode('col').format() == 'MODE(col)'
+    assert Difference('col').format() == 'DIFFERENCE(col)'
+    assert MovingAverage('col', 5).format() == 'MOVING_AVERAGE(col, 5)'
+    with pytest.raises(ValueError):
+        Spread('col', 1)
+    with pytest.raises(ValueError):
+        MovingAverage('col')
+    with pytest.raises(TypeError):
+        MovingAverage('col', '5')
+    with pytest.raises(ValueError):
+        MovingAverage('col', 0)
+
+
 @pytest.mark.unit
 def test_composed_functions_format():
     percentile = Percentile('a', 99)
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+    test_hedge
+    ~~~~~~~~~~
+
+    Tests hedged requests against stub replicas with injected latency
+"""
+
+import time
+import pytest
+import threading
+from influxdb.resultset import ResultSet
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.hedge import HedgedClient, LatencyHistogram
+
+
+class Replica(object):
+    def __init__(self, name, latency=0.0, error=None):
+        self.name = name
+        self.latency = latency
+        self.error = error
+        self.calls = 0
+        self.finished = threading.Event()
+
+    def query(self, query, **kwargs):
+        self.calls += 1
+        try:
+            time.sleep(self.latency)
+            if self.error:
+                raise self.error
+            return ResultSet({'series': [{
+                'name': self.name, 'columns': ['value'], 'values': [[1]]}]})
+        finally:
+            self.finished.set()
+
+
+def answered_by(result):
+    return result.raw['series'][0]['name']
+
+
+@pytest.mark.unit
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(99) is None
+    for _ in range(95):
+        histogram.record(0.001)
+    for _ in range(5):
+        histogram.record(0.1)
+    assert 0.001 <= histogram.percentile(50) < 0.0012
+    assert 0.001 <= histogram.percentile(95) < 0.0012
+    assert 0.1 <= histogram.percentile(99) < 0.12
+    histogram.record(1000)
+    assert histogram.percentile(100) == histogram.bounds[-1]
+
+
+@pytest.mark.unit
+def test_histogram_adapts():
+    histogram = LatencyHistogram(halflife=100)
+    for _ in range(1000):
+        histogram.record(0.001)
+    for _ in range(300):
+        histogram.record(0.01)
+    # the older fast samples have mostly decayed away
+    assert histogram.percentile(50) >= 0.01
+    assert histogram.total < 200
+
+
+@pytest.mark.unit
+def test_hedges_slow_replica():
+    slow, fast = Replica('slow', latency=0.5), Replica('fast')
+    client = HedgedClient([slow, fast], initial_delay=0.01)
+    start = time.time()
+    result = Engine(client).execute(Query('value').from_('cpu'))
+    assert time.time() - start < 0.25
+    assert answered_by(result) == 'fast'
+    assert client.hedges == client.hedge_wins == 1
+    # the loser's latency is still recorded once it finishes
+    assert slow.finished.wait(2)
+    time.sleep(0.01)
+    assert client.histograms[0].percentile(50) >= 0.5
+
+
+@pytest.mark.unit
+def test_no_hedge_when_fast():
+    replicas = [Replica('a'), Replica('b')]
+    engine = Engine(replicas, hedge_percentile=99)
+    names = [answered_by(engine.execute(Query('value').from_('cpu')))
+             for _ in range(4)]
+    assert names == ['a', 'b', 'a', 'b']
+    assert engine.client.hedges == 0
+
+
+@pytest.mark.unit
+def test_hedge_delay_follows_percentile():
+    client = HedgedClient([Replica('a'), Replica('b')], percentile=90,
+                          initial_delay=0.05, min_samples=10)
+    assert client.hedge_delay(0) == 0.05
+    for _ in range(10):
+        client.histograms[0].record(0.002)
+    assert 0.002 <= client.hedge_delay(0) < 0.0025
+
+
+@pytest.mark.unit
+def test_errors_fail_over():
+    broken = Replica('broken', error=RuntimeError('down'))
+    client = HedgedClient([broken, Replica('ok')])
+    assert answered_by(client.query('SELECT value FROM cpu;')) == 'ok'
+    client = HedgedClient([broken, Replica('broken', error=KeyError('x'))])
+    with pytest.raises((RuntimeError, KeyError)):
+        client.query('SELECT value FROM cpu;')
+    with pytest.raises(ValueError):
+        HedgedClient([])
+
+
+@pytest.mark.unit
+def test_chunked_not_hedged():
+    slow, fast = Replica('slow', latency=0.1), Replica('fast')
+    client = HedgedClient([slow, fast], initial_delay=0.01)
+    for replica in ('slow', 'fast'):
+        result = client.query('SELECT value FROM cpu;', chunked=True)
+        assert answered_by(result) == replica
+    assert client.hedges == 0
+    assert slow.calls == fast.calls == 1
+    assert client.histograms[0].total == 0
+
+
+@pytest.mark.unit
+def test_writes_go_to_primary():
+    first, second = Replica('first', latency=0.1), Replica('second')
+    client = HedgedClient([first, second], initial_delay=0.01)
+    for statement in ("DELETE FROM cpu WHERE time < now() - 1d;",
+                      "DROP SERIES FROM cpu;",
+                      "SELECT mean(value) INTO cpu_1h FROM cpu;",
+                      "SHOW MEASUREMENTS; DROP MEASUREMENT cpu;"):
+        assert answered_by(client.query(statement)) == 'first'
+    assert first.calls == 4 and second.calls == 0
+    assert client.hedges == 0
+
+    client.query('SHOW MEASUREMENTS;')
+    client.query('select value from cpu;')
+    assert second.calls == 2
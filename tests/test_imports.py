@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+    test_imports
+    ~~~~~~~~~~~~
+
+    Keeps the package cheap to import
+"""
+
+import sys
+import pytest
+import subprocess
+
+from benchmarks.bench_import import BUDGETS, REFERENCE, import_time
+
+# modules only some features need, they must not be imported up front
+LAZY_MODULES = [
+    'dateutil', 'hashlib', 'difflib', 'influxdb', 'numpy', 'pandas',
+    'pyarrow', 'pyinfluxql.parser', 'pyinfluxql.coalesce',
+    'pyinfluxql.hedge', 'pyinfluxql.catalog', 'pyinfluxql.cost',
+    'pyinfluxql.scheduler', 'pyinfluxql.dataframe', 'pyinfluxql.export',
+]
+
+
+def imported_by(statement):
+    output = subprocess.check_output([sys.executable, '-c', (
+        "import sys\n"
+        "before = set(sys.modules)\n"
+        "%s\n"
+        "print('\\n'.join(sorted(set(sys.modules) - before)))") % statement],
+        universal_newlines=True)
+    return output.split()
+
+
+@pytest.mark.unit
+def test_package_import_is_lazy():
+    assert imported_by('import pyinfluxql') == ['pyinfluxql']
+
+
+@pytest.mark.unit
+def test_engine_import_skips_optional_modules():
+    imported = imported_by('from pyinfluxql import Engine, Query; '
+                           'Engine(None).execute')
+    assert 'pyinfluxql.engine' in imported
+    for module in LAZY_MODULES:
+        assert module not in imported
+
+
+@pytest.mark.unit
+def test_lazy_attributes():
+    import pyinfluxql
+    from pyinfluxql.query import Query
+    assert pyinfluxql.Query is Query
+    assert 'Engine' in dir(pyinfluxql)
+    with pytest.raises(AttributeError):
+        pyinfluxql.Nope
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('statement', sorted(BUDGETS))
+def test_import_time_budget(statement):
+    # best of three, the first run also writes the bytecode cache, compared
+    # with the dependencies' import time on the same machine
+    seconds = min(import_time(statement) for _ in range(3))
+    reference = min(import_time(REFERENCE) for _ in range(3))
+    assert seconds <= BUDGETS[statement] * reference
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+    test_parser
+    ~~~~~~~~~~~
+
+    Tests the InfluxQL parser
+"""
+
+import pytest
+from datetime import datetime, timedelta
+
+from pyinfluxql.functions import (Expression, Count, Sum, Mean, Max,
+                                  Percentile, Derivative)
+from pyinfluxql.query import Query
+from pyinfluxql.parser import (parse, parse_all, tokenize, ParseError, IDENT,
+                               QIDENT, STRING, NUMBER, DURATION, REGEX, OP,
+                               EOF)
+
+
+@pytest.mark.unit
+def test_tokenize():
+    tokens = tokenize("SELECT mean(\"value\") FROM cpu WHERE host =~ /a.*/ "
+                      "AND time > now() - 1h AND x = 'it\\'s' AND y >= 2.5")
+    assert [t[:2] for t in tokens] == [
+        (IDENT, 'SELECT'), (IDENT, 'mean'), ('(', '('), (QIDENT, 'value'),
+        (')', ')'), (IDENT, 'FROM'), (IDENT, 'cpu'), (IDENT, 'WHERE'),
+        (IDENT, 'host'), (OP, '=~'), (REGEX, '/a.*/'), (IDENT, 'AND'),
+        (IDENT, 'time'), (OP, '>'), (IDENT, 'now'), ('(', '('), (')', ')'),
+        (OP, '-'), (DURATION, '1h'), (IDENT, 'AND'), (IDENT, 'x'), (OP, '='),
+        (STRING, "it's"), (IDENT, 'AND'), (IDENT, 'y'), (OP, '>='),
+        (NUMBER, '2.5'), (EOF, '')]
+    assert tokens[0][2] == 'SELECT'
+    assert tokens[1][2] == 'MEAN'
+
+
+@pytest.mark.unit
+def test_tokenize_division_is_not_a_regex():
+    assert [t[:2] for t in tokenize("a / 2")] == [
+        (IDENT, 'a'), (OP, '/'), (NUMBER, '2'), (EOF, '')]
+
+
+@pytest.mark.unit
+def test_tokenize_fails():
+    with pytest.raises(ParseError):
+        tokenize("SELECT 'unterminated FROM x")
+    with pytest.raises(ParseError):
+        tokenize("SELECT a FROM x WHERE time > now() - 1y")
+    with pytest.raises(ParseError):
+        tokenize("SELECT a FROM x WHERE a ! b")
+    with pytest.raises(ParseError):
+        tokenize("SELECT a FROM x WHERE a = $b")
+
+
+@pytest.mark.unit
+def test_parse_builds_query():
+    q = parse("SELECT mean(value), PERCENTILE(value, 95) FROM cpu "
+              "WHERE host = 'a' AND load > 0.5 AND time > '2015-06-06' "
+              "GROUP BY time(1h), host fill(0) ORDER BY time DESC LIMIT 10")
+    assert isinstance(q, Query)
+    assert [type(e) for e in q._select_expressions] == [Mean, Percentile]
+    assert q._select_expressions[1]._args == ('value', 95)
+    assert q._measurement == 'cpu'
+    assert q._where == {
+        'host': 'a', 'load__gt': 0.5, 'time__gt': datetime(2015, 6, 6)}
+    assert q.start_time == datetime(2015, 6, 6)
+    assert q._group_by_time == '1h'
+    assert q._group_by == ['host']
+    assert q._group_by_fill
+    assert q._order == 'DESC'
+    assert q._order_by == ['time']
+    assert q._limit == 10
+
+
+@pytest.mark.unit
+def test_parse_delete():
+    q = parse("delete from cpu where time < '2015-06-06 12:00:00.000'")
+    assert q._is_delete
+    assert q._where == {'time__lt': datetime(2015, 6, 6, 12)}
+    assert q.end_time == datetime(2015, 6, 6, 12)
+    assert str(q) == "DELETE FROM cpu WHERE time < '2015-06-06 12:00:00.000';"
+
+
+@pytest.mark.unit
+def test_parse_values():
+    q = parse("SELECT a FROM x WHERE b = true AND c != false AND d < -4 "
+              "AND e =~ /^e$/ AND f !~ /f/ AND time > now() - 1h "
+              "AND time < 1433548800s AND g = 'g'")
+    assert q._where['b'] is True
+    assert q._where['c__ne'] is False
+    assert q._where['d__lt'] == -4
+    assert q._where['e__match'] == '/^e$/'
+    assert q._where['f__nmatch'] == '/f/'
+    assert isinstance(q._where['time__gt'], Expression)
+    assert q._where['time__gt'].format() == 'now() - 1h'
+    assert q._where['time__lt'].format() == '1433548800s'
+    assert q._where['g'] == 'g'
+    assert q.start_time is None
+
+
+@pytest.mark.unit
+def test_parse_or():
+    q = parse("SELECT a FROM x WHERE (host = 'a' OR host = 'b') AND "
+              "dc != 'y' AND dc <> 'z' AND (b = 1 AND c = 2)")
+    assert q._where == {'host__in': ['a', 'b'], 'dc__nin': ['y', 'z'],
+                        'b': 1, 'c': 2}
+    q = parse("SELECT a FROM x WHERE host = 'a' OR (host = 'b' OR host = 'c')")
+    assert q._where == {'host__in': ['a', 'b', 'c']}
+    assert str(q) == "SELECT a FROM x WHERE " \
+        "(host = 'a' OR host = 'b' OR host = 'c');"
+
+
+@pytest.mark.unit
+def test_parse_time_strings():
+    assert parse("SELECT a FROM x WHERE time > '2015-06-06T01:02:03Z'") \
+        ._where['time__gt'] == datetime(2015, 6, 6, 1, 2, 3)
+    assert parse("SELECT a FROM x WHERE time > '2015-06-06 01:02:03.5'") \
+        ._where['time__gt'] == datetime(2015, 6, 6, 1, 2, 3, 500000)
+    # precision finer than milliseconds can't be rendered, keep the string
+    assert parse("SELECT a FROM x WHERE time > '2015-06-06T01:02:03.000000001Z'") \
+        ._where['time__gt'] == '2015-06-06T01:02:03.000000001Z'
+
+
+@pytest.mark.unit
+def test_parse_nested_functions():
+    q = parse("SELECT sum(count(max(a))) AS total, derivative(b, 1s) FROM x")
+    total, derivative = q._select_expressions
+    assert isinstance(total, Sum)
+    assert isinstance(total._args[0], Count)
+    assert isinstance(total._args[0]._args[0], Max)
+    assert total._as == 'total'
+    assert isinstance(derivative, Derivative)
+    assert derivative._args == ('b', '1s')
+
+
+@pytest.mark.unit
+def test_parse_unknown_function():
+    q = parse("SELECT holt_winters(first(value), 10, 4) FROM x")
+    assert str(q) == "SELECT HOLT_WINTERS(FIRST(value), 10, 4) FROM x;"
+
+
+@pytest.mark.unit
+def test_parse_invalid_function_arguments():
+    with pytest.raises(ParseError):
+        parse("SELECT percentile(value, 101) FROM x")
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('text', [
+    "SELECT * FROM x;",
+    "SELECT a, b FROM x;",
+    "SELECT * FROM x LIMIT 100;",
+    "SELECT * FROM x ORDER BY time ASC;",
+    "SELECT COUNT(a) FROM x;",
+    "SELECT SUM(COUNT(a)) FROM x;",
+    "SELECT * FROM x WHERE a = 'something' AND b = 1;",
+    "SELECT * FROM x WHERE a = true AND b = false;",
+    "SELECT * FROM x WHERE a < 4 AND b > 6.0;",
+    "SELECT * FROM x GROUP BY time(1h), a, b;",
+    "SELECT COUNT(a), SUM(b), PERCENTILE(d, 99) FROM x "
+    "WHERE e = false AND f != true AND g < 4 AND h > 5 "
+    "GROUP BY time(1h), a, b fill(0) LIMIT 100 ORDER BY time ASC;",
+    "SELECT MEAN(a) FROM x GROUP BY time(1m) fill(none);",
+    "SELECT MEAN(a) FROM x GROUP BY time(1m) fill(previous);",
+    "SELECT MEAN(a) FROM x GROUP BY time(1m) fill(-1.5);",
+    "SELECT COUNT(col) FROM clicks GROUP BY time(1h) INTO clicks.count.1h;",
+    "SELECT MEAN(value) FROM \"cpu-load\" WHERE host =~ /^a$/;",
+    "SELECT value * 2 AS double FROM /cpu.*/ WHERE time > now() - 1h;",
+    "SELECT * FROM x WHERE time > '2015-06-06 00:00:00.000' "
+    "AND time < '2015-06-07 00:00:00.000';",
+    "DELETE FROM series WHERE time > 20 AND time < 40;",
+])
+def test_parse_roundtrip(text):
+    """Canonical statements render back to exactly the same text
+    """
+    assert str(parse(text)) == text
+
+
+@pytest.mark.unit
+def test_parse_roundtrip_queries():
+    start = datetime(2015, 6, 6)
+    queries = [
+        Query(Mean('value')).from_('cpu').where(host='a', region__ne='b')
+        .date_range(start, start + timedelta(days=1))
+        .group_by('host', time=timedelta(hours=1), fill=True).limit(10),
+        Query(Percentile('value', 99.9).as_('p999')).from_('a series')
+        .where(foo__bar__lt=4),
+    ]
+    for query in queries:
+        assert str(parse(str(query))) == str(query)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('value', [
+    "it's", "a\\", "a\\'b", "\\'", "two\nlines", "'; DROP SERIES FROM x; '",
+])
+def test_parse_string_escapes(value):
+    """Quotes and backslashes are escaped when rendered and unescaped when
+    parsed, so string values survive parse -> str -> parse
+    """
+    query = Query('a').from_('x').where(host=value, region='b')
+    text = str(query)
+    parsed = parse(text)
+    assert parsed._where == {'host': value, 'region': 'b'}
+    assert str(parsed) == text
+    assert str(parse(str(parsed))) == text
+
+
+@pytest.mark.unit
+def test_parse_escaped_text():
+    text = "SELECT a FROM x WHERE host = 'it\\'s' AND path = 'c:\\\\';"
+    query = parse(text)
+    assert query._where == {'host': "it's", 'path': 'c:\\'}
+    assert str(query) == text
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('text, what', [
+    ("SELECT a FROM x WHERE x > 1 AND x > 2", "more than one > condition"),
+    ("SELECT a FROM x WHERE host = 'a' AND region = 'b' AND host = 'c'",
+     "more than one = condition"),
+    ("SELECT a FROM x LIMIT 1 OFFSET 2", "OFFSET"),
+    ("SELECT a FROM x SLIMIT 1", "SLIMIT"),
+    ("SELECT MEAN(a) FROM x GROUP BY time(1h, 30m)", "an offset in GROUP BY"),
+    ("SELECT a FROM x WHERE a = 1 OR b = 2", "OR except between ="),
+    ("SELECT a FROM x WHERE a = 1 AND b = 1 OR b = 2", "mixing AND and OR"),
+])
+def test_parse_unsupported(text, what):
+    """Valid InfluxQL the Query model can't represent is rejected clearly
+    """
+    with pytest.raises(ParseError) as e:
+        parse(text)
+    assert what in str(e.value)
+    assert "isn't supported by the Query model" in str(e.value)
+
+
+@pytest.mark.unit
+def test_parse_canonicalizes():
+    assert str(parse(
+        "select  mean(\"value\")  from \"cpu\"  where \"region\"='us' and "
+        "host <> 'a' group by time(5m),\"host\"")) == \
+        "SELECT MEAN(value) FROM cpu WHERE host != 'a' AND region = 'us' " \
+        "GROUP BY time(5m), host;"
+
+
+@pytest.mark.unit
+def test_parse_all():
+    queries = parse_all("SELECT a FROM x; SELECT b FROM y;")
+    assert [str(q) for q in queries] == ["SELECT a FROM x;", "SELECT b FROM y;"]
+    with pytest.raises(ParseError):
+        parse("SELECT a FROM x; SELECT b FROM y")
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('text', [
+    "",
+    "SHOW MEASUREMENTS",
+    "SELECT FROM x",
+    "SELECT a",
+    "SELECT a FROM",
+    "SELECT a FROM x WHERE",
+    "SELECT a FROM x WHERE a",
+    "SELECT a FROM x WHERE a = 1 OR b = 2",
+    "SELECT a FROM x WHERE a > 1 OR a > 2",
+    "SELECT a FROM x WHERE a = 1 AND b = 1 OR b = 2",
+    "SELECT a FROM x WHERE (a = 1 AND b = 1",
+    "SELECT a FROM x WHERE a = 1 AND a = 2",
+    "SELECT a FROM x GROUP BY time(1h) fill(nothing)",
+    "SELECT a FROM x GROUP BY time(1h) fill(-none)",
+    "SELECT a FROM x LIMIT",
+    "SELECT a FROM x y",
+])
+def test_parse_fails(text):
+    with pytest.raises(ParseError):
+        parse(text)
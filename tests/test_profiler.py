@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+    test_profiler
+    ~~~~~~~~~~~~~
+
+    Tests query shapes and the profiler
+"""
+
+import json
+from datetime import datetime
+
+import pytest
+from influxdb.resultset import ResultSet
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.functions import Mean
+from pyinfluxql.profiler import Profiler, shape
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TimedClient(object):
+    """Answers with `rows` rows after `latency` seconds, or the latency of
+    the measurement, of fake time
+    """
+    def __init__(self, clock, latency=0.1, rows=2):
+        self.clock = clock
+        self.latency = latency
+        self.rows = rows
+
+    def query(self, query, **kwargs):
+        latency = self.latency
+        if isinstance(latency, dict):
+            measurement = query.split(' FROM ')[1].split()[0]
+            latency = latency[measurement.rstrip(';')]
+        self.clock.now += latency
+        if 'fail' in query:
+            raise RuntimeError("timeout")
+        return ResultSet({'statement_id': 0, 'series': [
+            {'name': 'cpu', 'columns': ['time', 'value'],
+             'values': [[i, i] for i in range(self.rows)]}]})
+
+
+def dashboard_query(host, day):
+    return Query(Mean('value')).from_('cpu') \
+        .where(host=host, region__in=['us', 'eu'][:day % 2 + 1]) \
+        .date_range(datetime(2020, 1, day), datetime(2020, 1, day + 1)) \
+        .group_by(time='1h')
+
+
+@pytest.mark.unit
+def test_shape():
+    expected = ("SELECT MEAN(value) FROM cpu WHERE host = ? AND region = ? "
+                "AND time > ? AND time < ? GROUP BY time(1h);")
+    assert shape(dashboard_query('a', 1)) == expected
+    assert shape(dashboard_query('b', 2)) == expected
+    assert shape(str(dashboard_query('c', 3))) == expected
+    query = dashboard_query('a', 1)
+    shape(query)
+    assert query._where['host'] == 'a'
+
+
+@pytest.mark.unit
+def test_shape_text():
+    # mixing AND and OR isn't parsed
+    text = ("SELECT value / 2 FROM cpu WHERE time > now() - 1h AND "
+            "host = 'a' OR host = 'b' OR host = 'c' OR dc =~ /^x$/ LIMIT 5")
+    assert shape(text) == ("SELECT value / ? FROM cpu WHERE time > ? AND "
+                           "host = ? OR dc =~ ? LIMIT ?")
+
+
+@pytest.mark.unit
+def test_profiler_statistics():
+    clock = Clock()
+    client = TimedClient(clock, latency={'cpu': 0.1, 'mem': 0.5}, rows=3)
+    engine = Engine(client, profiler=Profiler(clock=clock))
+    for day in range(1, 11):
+        engine.execute(dashboard_query('host%i' % day, day))
+    engine.execute(Query('value').from_('mem').where(host='a'))
+    with pytest.raises(RuntimeError):
+        engine.execute(Query('value').from_('mem').where(host='fail'))
+    cpu, mem = engine.profiler.report()
+    assert mem['shape'] == "SELECT value FROM mem WHERE host = ?;"
+    assert mem['count'] == 2
+    assert mem['errors'] == 1
+    assert mem['total'] == pytest.approx(1.0)
+    assert mem['rows'] == 3
+    assert mem['mean_rows'] == 3
+    assert mem['slowest'] == "SELECT value FROM mem WHERE host = 'fail';"
+    assert cpu['count'] == 10
+    assert cpu['total'] == pytest.approx(1.0)
+    assert cpu['mean'] == pytest.approx(0.1)
+    assert cpu['p95'] == pytest.approx(0.1, rel=0.2)
+    assert cpu['rows'] == 30
+    assert cpu['error'] == 0
+    assert engine.profiler.report(1) == [cpu]
+
+
+@pytest.mark.unit
+def test_profiler_space_saving():
+    profiler = Profiler(capacity=5)
+    # three expensive shapes and many cheap one off shapes
+    for i in range(200):
+        for measurement in ('cpu', 'mem', 'disk'):
+            profiler.record(Query('value').from_(measurement), 1.0)
+        profiler.record(Query('value').from_('m%i' % i), 0.01)
+    report = profiler.report()
+    assert len(profiler.shapes) == 5
+    assert len(profiler._heap) <= 4 * 5
+    assert sorted(s['shape'] for s in report[:3]) == [
+        "SELECT value FROM %s;" % m for m in ('cpu', 'disk', 'mem')]
+    for s in report[:3]:
+        assert s['count'] == 200
+        assert s['total'] == pytest.approx(200)
+        assert s['error'] == 0
+    # the cheap shapes inherited the totals of the ones they replaced
+    for s in report[3:]:
+        assert s['count'] == 1
+        assert s['error'] > 0
+        assert s['total'] == pytest.approx(s['error'] + 0.01)
+        assert s['total'] < 2
+
+
+@pytest.mark.unit
+def test_profiler_compact_rows():
+    clock = Clock()
+    engine = Engine(TimedClient(clock, rows=4), profiler=Profiler(clock=clock))
+    engine.execute(Query('value').from_('cpu'), format='compact')
+    assert engine.profiler.report()[0]['rows'] == 4
+
+
+class ChunkedClient(TimedClient):
+    """Answers chunked queries with a chunk of `rows` rows per `latency`
+    seconds
+    """
+    def query(self, query, chunked=False, chunks=3, **kwargs):
+        for i in range(chunks):
+            if 'fail' in query and i == 1:
+                raise RuntimeError("connection reset")
+            yield TimedClient.query(self, query, **kwargs)
+
+
+@pytest.mark.unit
+def test_profiler_chunked():
+    clock = Clock()
+    engine = Engine(ChunkedClient(clock, latency=0.5),
+                    profiler=Profiler(clock=clock))
+    chunks = engine.execute(Query('value').from_('cpu'), chunked=True)
+    assert engine.profiler.queries == 0
+    assert len(list(chunks)) == 3
+    stats, = engine.profiler.report()
+    assert stats['total'] == pytest.approx(1.5)
+    assert stats['rows'] == 6
+    # closed after the first chunk
+    chunks = engine.execute(Query('value').from_('cpu'), chunked=True)
+    next(chunks)
+    chunks.close()
+    stats, = engine.profiler.report()
+    assert stats['count'] == 2
+    assert stats['total'] == pytest.approx(2.0)
+    assert stats['rows'] == 8
+    chunks = engine.execute(Query('value').from_('fail'), chunked=True)
+    with pytest.raises(RuntimeError):
+        list(chunks)
+    failed = engine.profiler.report()[1]
+    assert failed['shape'] == "SELECT value FROM fail;"
+    assert failed['errors'] == 1
+    assert failed['total'] == pytest.approx(0.5)
+
+
+@pytest.mark.unit
+def test_slow_log(tmpdir):
+    path = str(tmpdir.join('slow.log'))
+    clock = Clock()
+    samples = iter([0.1, 0.9, 0.1])
+    client = TimedClient(clock, latency={'cpu': 0.1, 'mem': 2.0})
+    profiler = Profiler(slow=1.0, sample_rate=0.5, slow_log=path,
+                        clock=clock, random=lambda: next(samples))
+    engine = Engine(client, profiler=profiler)
+    engine.execute(Query('value').from_('cpu'))
+    for host in ('a', 'b', 'c'):
+        engine.execute(Query('value').from_('mem').where(host=host))
+    profiler.close()
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert [r['statement'] for r in records] == [
+        "SELECT value FROM mem WHERE host = 'a';",
+        "SELECT value FROM mem WHERE host = 'c';"]
+    assert records[0]['duration'] == pytest.approx(2.0)
+    assert records[0]['rows'] == 2
+    assert records[0]['digest'] == profiler.report(1)[0]['digest']
+    assert profiler.sampled == 2
+
+
+@pytest.mark.unit
+def test_periodic_dump(tmpdir):
+    path = str(tmpdir.join('shapes.json'))
+    clock = Clock()
+    client = TimedClient(clock, latency=10)
+    profiler = Profiler(dump=path, dump_interval=60, clock=clock)
+    engine = Engine(client, profiler=profiler)
+    for i in range(5):
+        engine.execute(Query('value').from_('cpu'))
+    assert not tmpdir.join('shapes.json').check()
+    engine.execute(Query('value').from_('cpu'))
+    with open(path) as f:
+        dumped = json.load(f)
+    assert dumped['queries'] == 6
+    assert dumped['time'] == 1060
+    assert dumped['shapes'][0]['count'] == 6
+    engine.execute(Query('value').from_('cpu'))
+    profiler.close()
+    with open(path) as f:
+        assert json.load(f)['queries'] == 7
+    assert tmpdir.listdir() == [tmpdir.join('shapes.json')]
@@ -10,8 +10,12 @@ import six
 import pytest
 from datetime import datetime, timedelta
 import dateutil
-from pyinfluxql.functions import Sum, Min, Max, Count, Distinct, Percentile
-from pyinfluxql.query import Query, ContinuousQuery
+from pyinfluxql.functions import (Sum, Min, Max, Mean, Count, Distinct,
+                                  Percentile, Expression)
+from pyinfluxql.query import (Query, ContinuousQuery, ShowMeasurements,
+                              ShowTagKeys, ShowTagValues, ShowFieldKeys,
+                              ShowSeries, ShowSeriesCardinality)
+from pyinfluxql.parser import parse
 
 
 @pytest.mark.unit
@@ -51,6 +55,18 @@ def test_clone():
     assert query._group_by == ['col2']
 
 
+@pytest.mark.unit
+def test_clone_copies_all_clauses():
+    query = Query('a').from_('x').date_range(1, 2).group_by(time='1h', fill=True) \
+        .into('y').order('time', 'desc')
+    new_query = query.clone()
+    assert str(new_query) == str(query)
+    assert new_query.start_time == 1
+    assert new_query.end_time == 2
+    new_query._order_by.append('x')
+    assert query._order_by == ['time']
+
+
 @pytest.mark.unit
 def test_select():
     """Selecting should be chainable and add to the `_select_expressions`
@@ -152,6 +168,9 @@ def test_format_value():
     assert q._format_value(True) == "true"
     assert q._format_value(False) == "false"
     assert q._format_value('/stats.*/') == "/stats.*/"
+    assert q._format_value("it's") == "'it\\'s'"
+    assert q._format_value("a\\") == "'a\\\\'"
+    assert q._format_value("a' OR b = 'b") == "'a\\' OR b = \\'b'"
     assert q._format_value(datetime(2014, 2, 10, 18, 4, 53, 834825)) == \
         "'2014-02-10 18:04:53.834'"
     assert q._format_value(
@@ -160,6 +179,23 @@ def test_format_value():
         "'2014-02-10 23:04:53.834'"
 
 
+@pytest.mark.unit
+def test_time_precision():
+    start = datetime(2015, 6, 6)
+    q = Query('*').from_('x').date_range(start)
+    assert q.time_precision('s') is q
+    assert q._time_precision == 's'
+    assert q._format_value(start) == '1433548800s'
+    assert str(q) == 'SELECT * FROM x WHERE time > 1433548800s;'
+    assert q.clone()._time_precision == 's'
+    q.time_precision('ns')
+    assert str(q) == 'SELECT * FROM x WHERE time > 1433548800000000000;'
+    q.time_precision(None)
+    assert str(q) == "SELECT * FROM x WHERE time > '2015-06-06 00:00:00.000';"
+    with pytest.raises(ValueError):
+        q.time_precision('d')
+
+
 @pytest.mark.unit
 def test_date_range():
     q = Query()
@@ -214,6 +250,41 @@ def test_format_where():
         "WHERE col1 = 'a' AND col2 != 'b' AND col3 < 5 AND col4 > 7.0"
 
 
+@pytest.mark.unit
+def test_where_lists():
+    q = Query().where(host__in=['a', 'b'])
+    assert q._format_where() == "WHERE (host = 'a' OR host = 'b')"
+    q = Query().where(host__in=['a'])
+    assert q._format_where() == "WHERE host = 'a'"
+    q = Query().where(host__nin={'b', 'a'})
+    assert q._format_where() == "WHERE (host != 'a' AND host != 'b')"
+    q = Query().where(code__in=(1, 2), host__match=['a.b', 'c/d'])
+    assert q._format_where() == \
+        r"WHERE (code = 1 OR code = 2) AND host =~ /^(a\.b|c\/d)$/"
+    q = Query().where(host__nmatch='/^a/')
+    assert q._format_where() == "WHERE host !~ /^a/"
+    with pytest.raises(ValueError):
+        Query().where(host__in=[])
+    with pytest.raises(TypeError):
+        Query().where(host__in='a')
+
+
+@pytest.mark.unit
+def test_where_lists_eq():
+    """A list compared with = or != is an IN or NOT IN list, not a
+    comparison with a regex literal
+    """
+    q = Query().where(host=['a', 'b'])
+    assert q._format_where() == "WHERE (host = 'a' OR host = 'b')"
+    q = Query().where(host__eq=('a',), region__ne=['x', 'y'])
+    assert q._format_where() == \
+        "WHERE host = 'a' AND (region != 'x' AND region != 'y')"
+    q = Query().where(host__match=['a', 'b'])
+    assert q._format_where() == "WHERE host =~ /^(a|b)$/"
+    with pytest.raises(TypeError):
+        Query().where(load__gt=[1, 2])
+
+
 @pytest.mark.unit
 def test_format_where_eq():
     """equals expressions should be formatted correctly in a where clause
@@ -302,6 +373,13 @@ def test_format_group_by():
     assert q._format_group_by() == 'GROUP BY time(1h)'
     q = Query().group_by_time('1h', fill=True)
     assert q._format_group_by() == 'GROUP BY time(1h) fill(0)'
+    for fill, formatted in [(0, '0'), (-1.5, '-1.5'), ('none', 'none'),
+                            ('NULL', 'null'), ('previous', 'previous'),
+                            ('linear', 'linear')]:
+        q = Query().group_by_time('1h', fill=fill)
+        assert q._format_group_by() == 'GROUP BY time(1h) fill(%s)' % formatted
+    with pytest.raises(ValueError):
+        Query().group_by_time('1h', fill='zero')
 
 
 @pytest.mark.unit
@@ -512,3 +590,97 @@ def test_format_continuous_query():
     cq = ContinuousQuery("1h_clicks_count", "test", q)
     expected = 'CREATE CONTINUOUS QUERY "1h_clicks_count" ON test BEGIN SELECT COUNT(col) FROM clicks GROUP BY time(1h) INTO clicks.count.1h END'
     assert cq._format() == expected
+
+
+@pytest.mark.unit
+def test_format_show():
+    assert str(ShowMeasurements()) == 'SHOW MEASUREMENTS;'
+    assert str(ShowMeasurements('/^cpu/').limit(10)) == \
+        'SHOW MEASUREMENTS WITH MEASUREMENT =~ /^cpu/ LIMIT 10;'
+    assert str(ShowTagKeys()) == 'SHOW TAG KEYS;'
+    assert str(ShowTagKeys('cpu')) == 'SHOW TAG KEYS FROM cpu;'
+    assert str(ShowTagValues('host', 'cpu').where(region='us')) == \
+        'SHOW TAG VALUES FROM cpu WITH KEY = "host" WHERE region = \'us\';'
+    assert str(ShowTagValues(['host', 'region'])) == \
+        'SHOW TAG VALUES WITH KEY IN ("host", "region");'
+    assert str(ShowFieldKeys('cpu-load')) == 'SHOW FIELD KEYS FROM "cpu-load";'
+    assert str(ShowSeries('cpu').where(host='a')) == \
+        "SHOW SERIES FROM cpu WHERE host = 'a';"
+    assert str(ShowSeriesCardinality('cpu')) == \
+        'SHOW SERIES EXACT CARDINALITY FROM cpu;'
+    assert str(ShowSeriesCardinality(exact=False)) == \
+        'SHOW SERIES CARDINALITY;'
+    with pytest.raises(ValueError):
+        ShowTagValues([])
+
+
+@pytest.mark.unit
+def test_clone_show():
+    show = ShowTagValues(['host', 'region'], 'cpu').where(region='us')
+    clone = show.clone()
+    assert isinstance(clone, ShowTagValues)
+    assert str(clone) == str(show)
+    clone.where(host='a')._keys.append('dc')
+    assert str(show) == \
+        'SHOW TAG VALUES FROM cpu WITH KEY IN ("host", "region") ' \
+        'WHERE region = \'us\';'
+    assert isinstance(ShowMeasurements('/^cpu/').clone(), ShowMeasurements)
+
+
+@pytest.mark.unit
+def test_canonical():
+    q = Query(Mean('"value"').as_('m'), 'x').from_('"cpu"') \
+        .where(host='a', region__eq='b', load__gt=1) \
+        .date_range(datetime(2015, 6, 6, 0, 1), datetime(2015, 6, 6, 1, 1)) \
+        .group_by('region', 'host', time='5m')
+    assert q.canonical() == (
+        False, 'cpu', ((('MEAN', 'value'), 'm'), ('x', None)),
+        (('host', 'a'), ('load__gt', 1), ('region', 'b'),
+         ('time__gt', None), ('time__lt', None)),
+        timedelta(minutes=5), ('host', 'region'), False, None, None, None)
+    assert q.canonical(round_time=True)[3][-2:] == (
+        ('time__gt', "'2015-06-06 00:00:00.000'"),
+        ('time__lt', "'2015-06-06 01:00:00.000'"))
+
+
+@pytest.mark.unit
+def test_fingerprint():
+    start = datetime(2015, 6, 6)
+    q = Query(Mean('value').as_('m')).from_('cpu') \
+        .where(host='a', region='b') \
+        .date_range(start + timedelta(minutes=1)) \
+        .group_by('host', time=timedelta(minutes=5))
+    fingerprint = q.fingerprint()
+    assert len(fingerprint) == 40
+    assert fingerprint == q.clone().fingerprint()
+
+    # where order, quoting, whitespace and the interval spelling
+    parsed = parse("select  mean(\"value\") as \"m\" from \"cpu\" where "
+                   "region='b' and \"host\" = 'a' and "
+                   "time > '2015-06-06 00:03:00' group by time(5m),host")
+    assert parsed.fingerprint() == fingerprint
+    assert parsed.fingerprint(round_time=True) == q.fingerprint(round_time=True)
+
+    # time bounds are dropped, or rounded to the group by bucket
+    later = q.clone().date_range(start + timedelta(minutes=6))
+    assert later.fingerprint() == fingerprint
+    assert later.fingerprint(round_time=True) != q.fingerprint(round_time=True)
+
+    # relative time bounds are kept
+    relative = q.clone().where(time__gt=Expression('now() - 1h'))
+    assert relative.fingerprint() != fingerprint
+    assert relative.fingerprint() == \
+        q.clone().where(time__gt=Expression('now() - 1h')).fingerprint()
+
+    # aliases name the result's columns
+    renamed = q.clone()
+    renamed._select_expressions = [Mean('value').as_('n')]
+    assert renamed.fingerprint() != fingerprint
+    renamed._select_expressions = [Mean('value')]
+    assert renamed.fingerprint() != fingerprint
+
+    assert q.clone().where(host='c').fingerprint() != fingerprint
+    assert q.clone().limit(10).fingerprint() != fingerprint
+    assert q.clone().group_by('region').fingerprint() != fingerprint
+    q._is_delete = True
+    assert q.fingerprint() != fingerprint
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+    test_replay
+    ~~~~~~~~~~~
+
+    Tests recording and replaying query traffic
+"""
+
+import pytest
+from influxdb.resultset import ResultSet
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.replay import (Recorder, Replayer, Record, read_records,
+                               format_record, parse_record, percentile)
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class TimedClient(object):
+    """Answers with `rows` rows after `latency` seconds of fake time
+    """
+    def __init__(self, clock, latency=0.1, rows=2):
+        self.clock = clock
+        self.latency = latency
+        self.rows = rows
+        self.queries = []
+
+    def query(self, query, **kwargs):
+        self.queries.append((query, kwargs))
+        self.clock.now += self.latency
+        if 'fail' in query:
+            raise RuntimeError("timeout")
+        return ResultSet({'statement_id': 0, 'series': [
+            {'name': 'cpu', 'columns': ['time', 'value'],
+             'values': [[i, i] for i in range(self.rows)]}]})
+
+
+@pytest.mark.unit
+def test_record_round_trip():
+    record = Record(1.5, 0.25, None, 'abc', {'epoch': 'ns'},
+                    "SELECT value FROM cpu WHERE host = 'a\tb';", True)
+    line = format_record(record)
+    assert line.count('\n') == 1
+    assert parse_record(line) == record
+
+
+@pytest.mark.unit
+def test_recorder(tmpdir):
+    path = str(tmpdir.join('traffic.log'))
+    clock = Clock()
+    client = TimedClient(clock)
+    query = Query('value').from_('cpu')
+    with Recorder(Engine(client), path, clock=clock) as engine:
+        assert engine.execute(query, epoch='s', params={'a': 1}) is not None
+        clock.now += 1
+        with pytest.raises(RuntimeError):
+            engine.execute('SELECT fail FROM cpu;')
+        assert engine.client is client
+
+    first, second = read_records(path)
+    assert first == Record(1000.0, pytest.approx(0.1), 2,
+                           query.fingerprint()[:16], {'epoch': 's'},
+                           'SELECT value FROM cpu;', False)
+    assert second.start == pytest.approx(1001.1)
+    assert second.rows is None and second.error
+
+
+@pytest.mark.unit
+def test_replay_pacing():
+    records = [Record(10.0 + i, 0.5, 2, 'f', {}, 'SELECT %i;' % i, False)
+               for i in range(4)]
+    clock = Clock()
+    client = TimedClient(clock, latency=0.1)
+    report = Replayer(records, clock=clock, sleep=clock.sleep).run(
+        Engine(client), speed=2, concurrency=1)
+
+    assert [q for q, _ in client.queries] == [r.statement for r in records]
+    assert clock.slept == [pytest.approx(0.4)] * 3
+    assert report.lag == 0
+    assert report.recorded.throughput == pytest.approx(4 / 3.5)
+    assert report.replayed.throughput == pytest.approx(4 / 1.6)
+    comparison = report.compare()
+    assert comparison['p50'] == (0.5, pytest.approx(0.1), pytest.approx(0.2))
+    assert comparison['throughput'][0] == pytest.approx(8 / 3.5)
+    assert not report.row_mismatches
+    assert 'p99' in str(report)
+
+
+@pytest.mark.unit
+def test_replay_concurrently():
+    records = [Record(float(i), 0.5, 1, 'f', {}, 'SELECT %i;' % i, False)
+               for i in range(20)]
+    clock = Clock()
+    client = TimedClient(clock, latency=0.0, rows=2)
+    report = Replayer(records, clock=clock, sleep=clock.sleep).run(
+        Engine(client), speed=None, concurrency=4)
+
+    assert sorted(q for q, _ in client.queries) == \
+        sorted(r.statement for r in records)
+    assert [r.statement for r in report.replayed_records] == \
+        [r.statement for r in records]
+    assert clock.slept == []
+    assert len(report.row_mismatches) == 20
+    assert report.replayed.errors == 0
+
+
+@pytest.mark.unit
+def test_percentile():
+    assert percentile([], 95) == 0.0
+    assert percentile(list(range(101)), 95) == 95
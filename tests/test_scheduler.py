@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+    test_scheduler
+    ~~~~~~~~~~~~~~
+
+    Tests the priority scheduler with a fake clock
+"""
+
+import pytest
+from influxdb.resultset import ResultSet
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.scheduler import (Scheduler, PriorityClass, TokenBucket,
+                                  FakeClock, ManualExecutor, QueryShed,
+                                  QUEUED, RUNNING, DONE, SHED)
+
+CLASSES = (
+    PriorityClass('alert', 0, deadline=1),
+    PriorityClass('interactive', 1, deadline=5),
+    PriorityClass('batch', 2, concurrency=1, rate=1, burst=1),
+)
+
+
+class Client(object):
+    def __init__(self):
+        self.queries = []
+
+    def query(self, query, **kwargs):
+        self.queries.append(query)
+        if 'fail' in query:
+            raise RuntimeError("boom")
+        return ResultSet({'series': []})
+
+
+def scheduler(**kwargs):
+    kwargs.setdefault('concurrency', 2)
+    return Scheduler(Engine(Client()), CLASSES, clock=FakeClock(),
+                     executor=ManualExecutor(), **kwargs)
+
+
+def q(name):
+    return Query('value').from_(name)
+
+
+@pytest.mark.unit
+def test_token_bucket():
+    clock = FakeClock()
+    bucket = TokenBucket(2, burst=2, clock=clock)
+    assert bucket.take() and bucket.take()
+    assert not bucket.take()
+    assert bucket.wait_time() == 0.5
+    clock.advance(0.5)
+    assert bucket.take()
+    clock.advance(10)
+    assert bucket.take() and bucket.take()
+    assert not bucket.take()
+
+
+@pytest.mark.unit
+def test_priority_order():
+    s = scheduler()
+    s.concurrency = 0
+    batch = s.submit(q('b'), 'batch')
+    interactive = s.submit(q('i'))
+    alert = s.submit(q('a'), 'alert')
+    assert s.queued == 3
+    s.concurrency = 2
+    assert s.step() == [alert, interactive]
+    assert alert.state == interactive.state == RUNNING
+    assert batch.state == QUEUED
+    s.executor.run()
+    assert s.engine.client.queries == [
+        'SELECT value FROM a;', 'SELECT value FROM i;', 'SELECT value FROM b;']
+    assert batch.state == DONE
+    assert isinstance(alert.result(), ResultSet)
+
+
+@pytest.mark.unit
+def test_class_concurrency_and_rate_limit():
+    s = scheduler(concurrency=10)
+    first, second, third = [s.submit(q('b%i' % i), 'batch') for i in range(3)]
+    assert first.state == RUNNING and second.state == QUEUED
+    s.executor.run()
+    # the class is idle but out of tokens
+    assert second.state == QUEUED
+    s.clock.advance(1)
+    assert s.step() == [second]
+    s.clock.advance(1)
+    assert s.step() == []
+    s.executor.run(1)
+    assert third.state == RUNNING
+    assert s.metrics()['batch']['wait_max'] == 2
+
+
+@pytest.mark.unit
+def test_deadlines_shed_queued_work():
+    s = scheduler(concurrency=1)
+    running = s.submit(q('i0'))
+    queued = s.submit(q('i1'))
+    alert = s.submit(q('a'), 'alert')
+    s.clock.advance(2)
+    s.step()
+    assert alert.state == SHED
+    with pytest.raises(QueryShed):
+        alert.result()
+    s.executor.run()
+    assert running.state == queued.state == DONE
+    metrics = s.metrics()
+    assert metrics['alert']['shed'] == 1
+    assert metrics['interactive']['completed'] == 2
+    assert metrics['interactive']['wait_max'] == 2
+
+
+@pytest.mark.unit
+def test_full_queue_sheds_lowest_priority():
+    s = scheduler(concurrency=0, max_queue=2)
+    batch = s.submit(q('b'), 'batch')
+    interactive = s.submit(q('i'))
+    alert = s.submit(q('a'), 'alert')
+    assert batch.state == SHED
+    assert s.submit(q('b2'), 'batch').state == SHED
+    assert interactive.state == alert.state == QUEUED
+    assert s.metrics()['interactive']['queue_depth'] == 1
+
+
+@pytest.mark.unit
+def test_failures_are_raised():
+    s = scheduler()
+    ticket = s.submit(q('fail'))
+    s.executor.run()
+    with pytest.raises(RuntimeError):
+        ticket.result()
+    assert s.metrics()['interactive']['failed'] == 1
+    with pytest.raises(ValueError):
+        s.submit(q('x'), 'unknown')
+
+
+@pytest.mark.unit
+def test_threaded():
+    s = Scheduler(Engine(Client()), concurrency=2)
+    try:
+        tickets = [s.submit(q('x%i' % i), p) for i, p in
+                   enumerate(['alert', 'interactive', 'batch', 'batch'])]
+        for ticket in tickets:
+            assert isinstance(ticket.result(timeout=5), ResultSet)
+        assert s.running == s.queued == 0
+    finally:
+        s.close()
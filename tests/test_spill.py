@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+    test_spill
+    ~~~~~~~~~~
+
+    Tests spilling large results to memory-mapped files
+"""
+
+import os
+import sys
+import json
+import threading
+import subprocess
+
+import pytest
+from six.moves import BaseHTTPServer
+
+from pyinfluxql.decode import pack_results
+from pyinfluxql.spill import ResultBuilder, SpilledArray, SpilledObjects
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+#: rows of the capped memory test, raise it to try multi-GB responses
+ROWS = int(os.environ.get('PYINFLUXQL_SPILL_ROWS', 1500000))
+CHUNK = 5000
+SERIES = 10
+
+
+def chunk(rows, columns=('time', 'value', 'host')):
+    return pack_results({'results': [{'statement_id': 0, 'series': [{
+        'name': 'cpu', 'tags': {'dc': 'a'}, 'columns': list(columns),
+        'values': rows}]}]})['results'][0]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('budget', [None, 0, 100])
+def test_result_builder(budget):
+    builder = ResultBuilder(budget)
+    builder.add(chunk([[1, 1, 'x'], [2, 2, None]]))
+    builder.add(chunk([[3, 2.5, 'y'], [4, None, 'z']]))
+    builder.add(chunk([[5, 'high', 7]]))
+    assert builder.spilled == (budget is not None)
+    result = builder.result()
+    try:
+        time, value, host = result.series[0].data
+        if budget is not None:
+            assert isinstance(time, SpilledArray)
+            assert isinstance(host, SpilledObjects)
+        assert [dict(p) for p in result.get_points()] == [
+            {'time': 1, 'value': 1.0, 'host': 'x'},
+            {'time': 2, 'value': 2.0, 'host': None},
+            {'time': 3, 'value': 2.5, 'host': 'y'},
+            {'time': 4, 'value': None, 'host': 'z'},
+            {'time': 5, 'value': 'high', 'host': 7}]
+        assert result.keys() == [('cpu', {'dc': 'a'})]
+    finally:
+        result.close()
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('budget', [None, 0])
+def test_result_builder_empty_chunks(budget):
+    builder = ResultBuilder(budget)
+    builder.add(chunk([]))
+    builder.add(chunk([[1, 1, 'x']]))
+    builder.add(chunk([]))
+    builder.add(chunk([[2, 2, 'y']]))
+    result = builder.result()
+    try:
+        time, value, host = builder.series[list(builder.series)[0]]
+        assert value.typecode == time.typecode == 'q'
+        assert [p['value'] for p in result.get_points()] == [1, 2]
+    finally:
+        result.close()
+
+
+@pytest.mark.unit
+def test_spilled_numpy(tmpdir):
+    numpy = pytest.importorskip('numpy')
+    builder = ResultBuilder(0, directory=str(tmpdir))
+    builder.add(chunk([[i, i * 0.5] for i in range(1000)],
+                      ('time', 'value')))
+    builder.add(chunk([[i, None] for i in range(1000, 1500)],
+                      ('time', 'value')))
+    result = builder.result()
+    values = result.series[0].to_numpy('value')
+    assert values.dtype == numpy.float64 and len(values) == 1500
+    assert values[:1000].sum() == sum(i * 0.5 for i in range(1000))
+    assert numpy.isnan(values[1000:]).all()
+    assert result.series[0].column('value')[-1] is None
+    del values
+    result.close()
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answers every query with ROWS rows in chunks of CHUNK rows, encoded
+    once up front so the server isn't the bottleneck
+    """
+    chunks = [json.dumps({'results': [{'statement_id': 0, 'series': [{
+        'name': 'cpu', 'tags': {'host': 'h%i' % s},
+        'columns': ['time', 'value'],
+        'values': [[1433548800000000000 + i * 10 ** 9, i * 0.5]
+                   for i in range(CHUNK)]}], 'partial': True}]}
+    ).encode('utf-8') + b'\n' for s in range(SERIES)]
+
+    def do_GET(self):  # noqa: N802
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        chunks = ROWS // CHUNK
+        for i in range(chunks):
+            self.wfile.write(self.chunks[i * SERIES // chunks])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.yield_fixture
+def large_response():
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+# runs in a child process whose data segment is capped at what it uses after
+# the imports plus HEADROOM, far less than the columns of the response
+CHILD = '''
+import sys, resource
+from influxdb import InfluxDBClient
+from pyinfluxql.decode import Decoder, DecodingClient
+
+HEADROOM = 12 * 2 ** 20
+port, budget = int(sys.argv[1]), int(sys.argv[2])
+client = DecodingClient(InfluxDBClient('127.0.0.1', port, database='test'),
+                        Decoder('json', spill_budget=budget))
+used = [int(line.split()[1]) * 1024 for line in open('/proc/self/status')
+        if line.startswith('VmData')][0]
+resource.setrlimit(resource.RLIMIT_DATA, (used + HEADROOM, used + HEADROOM))
+try:
+    result = client.query('SELECT value FROM cpu GROUP BY host',
+                          compact=True, chunked=True, chunk_size=%i)
+except MemoryError:
+    print('MemoryError')
+else:
+    print(sum(len(s) for s in result.series),
+          sum(float(s.to_numpy('value').sum()) for s in result.series))
+''' % CHUNK
+
+
+def run_capped(port, budget):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    return subprocess.check_output(
+        [sys.executable, '-c', CHILD, str(port), str(budget)], env=env,
+        stderr=subprocess.STDOUT).decode('utf-8').split()
+
+
+@pytest.mark.unit
+@pytest.mark.skipif(resource is None or not sys.platform.startswith('linux'),
+                    reason="needs RLIMIT_DATA")
+def test_spill_under_memory_limit(large_response):
+    pytest.importorskip('numpy')
+    rows, total = run_capped(large_response, 2 ** 20)
+    assert int(rows) == ROWS
+    assert float(total) == ROWS // CHUNK * sum(i * 0.5 for i in range(CHUNK))
+    # the same response doesn't fit without spilling
+    assert run_capped(large_response, 2 ** 62) == ['MemoryError']
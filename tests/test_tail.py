@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+    test_tail
+    ~~~~~~~~~
+
+    Tests incremental refreshes of a query
+"""
+
+import pytest
+from datetime import datetime, timedelta
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.functions import Count
+from pyinfluxql.testing import FakeInfluxDB
+
+START = datetime(2015, 6, 6)
+
+
+def point(minute, host='a'):
+    return {'measurement': 'cpu', 'tags': {'host': host},
+            'time': START + timedelta(minutes=minute),
+            'fields': {'value': float(minute)}}
+
+
+@pytest.yield_fixture
+def client():
+    with FakeInfluxDB() as server:
+        client = server.client('test')
+        client.create_database('test')
+        client.write_points([point(i) for i in range(7)])
+        yield client
+
+
+def writer(client, batches):
+    batches = list(batches)
+
+    def sleep(seconds):
+        client.write_points(batches.pop(0))
+    return sleep
+
+
+@pytest.mark.unit
+def test_tail_raw(client):
+    engine = Engine(client)
+    query = Query('value').from_('cpu').where(time__gt=START)
+    tail = engine.tail(query, 5, ticks=3, epoch='s', sleep=writer(
+        client, [[point(7), point(8, 'b')], []]))
+    deltas = [[p['value'] for p in delta.get_points()] for delta in tail]
+    assert deltas[0] == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+    assert sorted(deltas[1]) == [7.0, 8.0]
+    assert deltas[2] == []
+    assert 'time > 1433549280000000000' in str(tail.narrowed())
+    assert "time > '2015-06-06" not in str(tail.narrowed())
+    assert [p['value'] for p in tail.result().get_points()] == \
+        [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0]
+
+
+@pytest.mark.unit
+def test_tail_sub_second(client):
+    def at(seconds):
+        return {'measurement': 'mem', 'time': START + timedelta(seconds=seconds),
+                'fields': {'value': seconds}}
+    client.write_points([at(1.25), at(1.75)])
+    engine = Engine(client)
+    query = Query('value').from_('mem').where(time__gt=START)
+    tail = engine.tail(query, 5, ticks=3, epoch='s', sleep=writer(
+        client, [[at(2.5)], []]))
+    deltas = [[(p['time'], p['value']) for p in delta.get_points()]
+              for delta in tail]
+    assert deltas == [[(1433548801, 1.25), (1433548801, 1.75)],
+                      [(1433548802, 2.5)], []]
+    assert 'time > 1433548802500000000' in str(tail.narrowed())
+
+
+@pytest.mark.unit
+def test_tail_refetches_open_bucket(client):
+    engine = Engine(client)
+    query = Query(Count('value')).from_('cpu') \
+        .where(time__gte=START).group_by(time='5m')
+    tail = engine.tail(query, 5, ticks=2, epoch='s', sleep=writer(
+        client, [[point(7), point(11)]]))
+    first, second = [[(p['time'], p['count']) for p in delta.get_points()]
+                     for delta in tail]
+    assert first == [(1433548800, 5), (1433549100, 2)]
+    assert second == [(1433549100, 3), (1433549400, 1)]
+    assert 'time >= 1433549400000000000' in str(tail.narrowed())
+    assert [p['count'] for p in tail.result().get_points()] == [5, 3, 1]
+
+
+@pytest.mark.unit
+def test_tail_window(client):
+    engine = Engine(client)
+    query = Query('value').from_('cpu').where(time__gte=START)
+    tail = engine.tail(query, 5, max_rows=3, epoch='s')
+    tail.poll()
+    assert [p['value'] for p in tail.result().get_points()] == [4.0, 5.0, 6.0]
+    tail = engine.tail(query, 5, window=timedelta(minutes=2), epoch='s')
+    tail.poll()
+    assert [p['value'] for p in tail.result().get_points()] == [4.0, 5.0, 6.0]
+    client.write_points([point(10)])
+    assert [p['value'] for p in tail.poll().get_points()] == [10.0]
+    assert [p['value'] for p in tail.result().get_points()] == [10.0]
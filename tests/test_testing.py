@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+    test_testing
+    ~~~~~~~~~~~~
+
+    Tests the in-memory stand-in InfluxDB server
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from influxdb.exceptions import InfluxDBClientError, InfluxDBServerError
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.functions import Bottom, Count, Derivative, Max, Mean, Top
+from pyinfluxql.query import (DropSeries, ShowSeriesCardinality,
+                              ShowTagValues)
+from pyinfluxql.testing import FakeInfluxDB, parse_line, _split_statements
+
+START = datetime(2015, 6, 6)
+
+
+def points(n=12):
+    return [{'measurement': 'cpu', 'tags': {'host': 'h%i' % (i % 3)},
+             'time': START + timedelta(minutes=i),
+             'fields': {'value': float(i)}} for i in range(n)]
+
+
+@pytest.yield_fixture
+def server():
+    with FakeInfluxDB() as server:
+        client = server.client('test')
+        client.create_database('test')
+        client.write_points(points())
+        yield server
+
+
+@pytest.mark.unit
+def test_parse_line():
+    assert parse_line('cpu,host=a\\ b,dc=x value=1.5,n=2i,ok=t,s="a \\"b\\"" '
+                      '10', precision='s') == (
+        'cpu', {'host': 'a b', 'dc': 'x'},
+        {'value': 1.5, 'n': 2, 'ok': True, 's': 'a "b"'}, 10000000000)
+    assert parse_line('cpu value=1', now=5) == ('cpu', {}, {'value': 1.0}, 5)
+    with pytest.raises(ValueError):
+        parse_line('cpu')
+
+
+@pytest.mark.unit
+def test_split_statements():
+    assert _split_statements("SELECT a FROM b WHERE c = ';'; SHOW SERIES;") == \
+        ["SELECT a FROM b WHERE c = ';'", 'SHOW SERIES']
+
+
+@pytest.mark.unit
+def test_select(server):
+    engine = Engine(server.client('test'))
+    query = Query(Mean('value'), Count('value')).from_('cpu') \
+        .date_range(START, START + timedelta(minutes=10)) \
+        .group_by('host', time='5m')
+    result = engine.execute(query)
+    assert list(result.get_points(tags={'host': 'h0'})) == [
+        {'time': '2015-06-06T00:00:00Z', 'mean': 3.0, 'count': 1},
+        {'time': '2015-06-06T00:05:00Z', 'mean': 7.5, 'count': 2}]
+
+    query = Query('value', 'host').from_('cpu').where(host__in=['h1', 'h2'],
+                                                      value__gte=7)
+    result = engine.execute(query.order('time', 'desc').limit(2), epoch='s')
+    assert list(result.get_points()) == [
+        {'time': 1433549460, 'value': 11.0, 'host': 'h2'},
+        {'time': 1433549400, 'value': 10.0, 'host': 'h1'}]
+
+    result = engine.execute(Query(Max('value')).from_('cpu')
+                            .where(host__match='/^h[01]$/'))
+    assert list(result.get_points()) == [
+        {'time': '1970-01-01T00:00:00Z', 'max': 10.0}]
+
+
+@pytest.mark.unit
+def test_fill(server):
+    client = server.client('test')
+    result = client.query(
+        "SELECT COUNT(value) FROM cpu WHERE host = 'h0' AND "
+        "time >= '2015-06-06 00:00:00.000' AND time < '2015-06-06 00:20:00.000' "
+        "GROUP BY time(5m) fill(0)")
+    assert [p['count'] for p in result.get_points()] == [2, 2, 0, 0]
+
+    query = "SELECT MAX(value) FROM cpu WHERE host = 'h0' AND " \
+        "time >= '2015-06-06 00:00:00.000' AND " \
+        "time < '2015-06-06 00:10:00.000' GROUP BY time(1m) fill(%s)"
+    for fill, expected in [
+            ('null', [0, None, None, 3, None, None, 6, None, None, 9]),
+            ('none', [0, 3, 6, 9]),
+            ('-1', [0, -1, -1, 3, -1, -1, 6, -1, -1, 9]),
+            ('previous', [0, 0, 0, 3, 3, 3, 6, 6, 6, 9]),
+            ('linear', [0, 1, 2, 3, 4, 5, 6, 7, 8, 9])]:
+        result = client.query(query % fill)
+        assert [p['max'] for p in result.get_points()] == expected
+
+
+@pytest.mark.unit
+def test_top_and_bottom(server):
+    engine = Engine(server.client('test'))
+    result = engine.execute(Query(Top('value', 3)).from_('cpu'))
+    assert [p['top'] for p in result.get_points()] == [9.0, 10.0, 11.0]
+    result = engine.execute(Query(Top('value', 'host', 2)).from_('cpu'))
+    assert list(result.get_points()) == [
+        {'time': '2015-06-06T00:10:00Z', 'top': 10.0, 'host': 'h1'},
+        {'time': '2015-06-06T00:11:00Z', 'top': 11.0, 'host': 'h2'}]
+    result = engine.execute(Query(Bottom('value', 'host', 1)).from_('cpu')
+                            .where(value__gt=0))
+    assert list(result.get_points()) == [
+        {'time': '2015-06-06T00:01:00Z', 'bottom': 1.0, 'host': 'h1'}]
+
+    client = server.client('test')
+    for query in (Query(Top('value', 2), Max('value')).from_('cpu'),
+                  Query(Top('value', 2)).from_('cpu').group_by(time='5m'),
+                  Query(Derivative(Mean('value'), '1m')).from_('cpu')
+                  .group_by(time='5m')):
+        with pytest.raises(InfluxDBClientError):
+            client.query(str(query))
+
+
+@pytest.mark.unit
+def test_chunked_gzip_and_statements(server):
+    client = server.client('test', gzip=True)
+    chunks = list(client.query('SELECT value FROM cpu', chunked=True,
+                               chunk_size=5))
+    assert [len(list(chunk.get_points())) for chunk in chunks] == [5, 5, 2]
+
+    first, second = client.query("SELECT value FROM cpu LIMIT 1; "
+                                 "SHOW TAG VALUES WITH KEY = \"host\"")
+    assert len(list(first.get_points())) == 1
+    assert [p['value'] for p in second.get_points()] == ['h0', 'h1', 'h2']
+
+
+@pytest.mark.unit
+def test_delete_and_show(server):
+    engine = Engine(server.client('test'))
+    engine.execute(Query().from_('cpu').delete().where(
+        host='h0', time__gte=START + timedelta(minutes=6)))
+    engine.execute(DropSeries('cpu').where(host='h1'))
+    result = engine.execute(Query('value').from_('cpu').where(host='h0'))
+    assert [p['value'] for p in result.get_points()] == [0.0, 3.0]
+    result = engine.execute(ShowTagValues('host', 'cpu'))
+    assert [p['value'] for p in result.get_points()] == ['h0', 'h2']
+    result = engine.execute(ShowSeriesCardinality('cpu'))
+    assert list(result.get_points()) == [{'count': 2}]
+
+
+@pytest.mark.unit
+def test_errors(server):
+    client = server.client('test')
+    with pytest.raises(InfluxDBClientError) as e:
+        client.query('SELECT value FROM cpu', database='missing')
+    assert 'database not found' in str(e.value)
+    with pytest.raises(InfluxDBClientError):
+        client.query('SELECT value + 1 FROM cpu')
+
+    server.error_rate = 1
+    with pytest.raises(InfluxDBServerError):
+        client.query('SELECT value FROM cpu')
+    assert server.injected_errors == 1
+
+
+@pytest.mark.unit
+def test_latency_injection():
+    slept = []
+    server = FakeInfluxDB(latency=0.01, tail_latency=1,
+                          tail_probability=0.5, seed=1, sleep=slept.append)
+    for _ in range(20):
+        server._inject()
+    assert set(slept) == {0.01, 1}
+    assert 4 < slept.count(1) < 16
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+    test_topn
+    ~~~~~~~~~
+
+    Tests ranking tag values and fetching only the top N
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from influxdb.resultset import ResultSet
+
+from pyinfluxql import Engine, Query
+from pyinfluxql.functions import Mean, Max, Min, Percentile
+from pyinfluxql.testing import FakeInfluxDB
+from pyinfluxql.topn import ranking_function, ranking_query
+
+START = datetime(2015, 6, 6)
+
+
+def panel():
+    return Query(Mean('cpu')).from_('cpu') \
+        .date_range(START, START + timedelta(hours=1)) \
+        .group_by('host', time='5m').limit(100)
+
+
+class RecordingClient(object):
+    def __init__(self, results):
+        self.results = list(results)
+        self.statements = []
+
+    def query(self, query, **kwargs):
+        self.statements.append(query)
+        return self.results.pop(0)
+
+
+@pytest.mark.unit
+def test_ranking_query():
+    query = panel()
+    assert str(ranking_query(query, 'host', 3, Mean('cpu'))[0]) == \
+        "SELECT MEAN(cpu) FROM cpu WHERE time > '2015-06-06 00:00:00.000' " \
+        "AND time < '2015-06-06 01:00:00.000' GROUP BY host;"
+    ranking, column = ranking_query(query, 'host', 3, Max('cpu'))
+    assert column == 'top'
+    assert str(ranking).startswith("SELECT TOP(cpu, host, 3) FROM cpu WHERE")
+    ranking, column = ranking_query(query, 'host', 3, Min('cpu'), bottom=True)
+    assert str(ranking).startswith("SELECT BOTTOM(cpu, host, 3) FROM cpu")
+    ranking, column = ranking_query(query, 'host', 3, Max('cpu'),
+                                    push_down=False)
+    assert str(ranking).startswith("SELECT MAX(cpu) FROM cpu")
+    assert isinstance(ranking_function(Query('cpu')), Max)
+    assert isinstance(ranking_function(Query('cpu'), bottom=True), Min)
+    with pytest.raises(ValueError):
+        ranking_function(Query())
+
+
+@pytest.mark.unit
+def test_top_push_down():
+    client = RecordingClient([
+        ResultSet({'series': [{'name': 'cpu',
+                               'columns': ['time', 'top', 'host'],
+                               'values': [[1, 90, 'c'], [2, 99, 'a']]}]}),
+        ResultSet({'series': []})])
+    engine = Engine(client)
+    engine.top(panel(), 'host', 2, rank_by=Max('cpu'))
+    assert client.statements[0].startswith("SELECT TOP(cpu, host, 2) FROM")
+    assert "(host = 'a' OR host = 'c')" in client.statements[1] or \
+        "(host = 'c' OR host = 'a')" in client.statements[1]
+    assert client.statements[1].endswith("GROUP BY time(5m), host LIMIT 100;")
+
+
+@pytest.mark.unit
+def test_top_two_phase():
+    with FakeInfluxDB() as server:
+        client = server.client('test')
+        client.create_database('test')
+        client.write_points([
+            {'measurement': 'cpu', 'tags': {'host': 'h%i' % host},
+             'time': START + timedelta(minutes=minute),
+             'fields': {'cpu': float(host * 10 + minute % 3)}}
+            for host in range(6) for minute in range(0, 60, 2)])
+        engine = Engine(client)
+        assert [h for h, _ in engine.rank(panel(), 'host', 2)] == \
+            ['h5', 'h4']
+        assert [h for h, _ in engine.rank(panel(), 'host', 2, bottom=True)] \
+            == ['h0', 'h1']
+        assert [h for h, _ in engine.rank(
+            panel(), 'host', 1, rank_by=Percentile('cpu', 90))] == ['h5']
+        # pushed down as TOP(cpu, host, 2) and BOTTOM(cpu, host, 2)
+        assert engine.rank(panel(), 'host', 2, rank_by=Max('cpu')) == \
+            [('h5', 52.0), ('h4', 42.0)]
+        assert engine.rank(panel(), 'host', 2, rank_by=Min('cpu'),
+                           bottom=True) == [('h0', 0.0), ('h1', 10.0)]
+
+        result = engine.top(panel(), 'host', 2)
+        assert sorted(tags['host'] for _, tags in result.keys()) == \
+            ['h4', 'h5']
+        assert len(list(result.get_points(tags={'host': 'h5'}))) == 12
+        assert engine.top(panel().where(host='nope'), 'host', 2).raw == {}
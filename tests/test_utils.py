@@ -7,9 +7,13 @@
 """
 
 import pytest
-from datetime import timedelta
+import random
+from datetime import datetime, timedelta
+from dateutil.tz import gettz, tzutc
 
-from pyinfluxql.utils import format_timedelta, format_boolean, parse_interval
+from pyinfluxql.utils import (format_timedelta, format_boolean, parse_interval,
+                              format_datetime, format_epoch, floor_datetime,
+                              interval_to_timedelta)
 
 
 @pytest.mark.unit
@@ -57,9 +61,86 @@ def test_parse_interval():
     assert parse_interval('1h') == timedelta(hours=1)
     assert parse_interval('24h') == timedelta(hours=24)
     assert parse_interval('1d') == timedelta(days=1)
+    assert parse_interval('2w') == timedelta(weeks=2)
+    with pytest.raises(ValueError):
+        parse_interval('1y')
+
+
+@pytest.mark.unit
+def test_interval_to_timedelta():
+    assert interval_to_timedelta(timedelta(hours=1)) == timedelta(hours=1)
+    assert interval_to_timedelta('5m') == timedelta(minutes=5)
+    assert interval_to_timedelta('1ms') is None
+    assert interval_to_timedelta('now') is None
+
+
+@pytest.mark.unit
+def test_floor_datetime():
+    dt = datetime(2015, 6, 6, 13, 47, 12, 500)
+    assert floor_datetime(dt, timedelta(minutes=5)) == datetime(2015, 6, 6, 13, 45)
+    assert floor_datetime(dt, timedelta(hours=1)) == datetime(2015, 6, 6, 13)
+    assert floor_datetime(dt, timedelta(days=1)) == datetime(2015, 6, 6)
+    assert floor_datetime(dt, timedelta(milliseconds=1)) == \
+        datetime(2015, 6, 6, 13, 47, 12)
+    assert floor_datetime(dt.replace(tzinfo=gettz('US/Eastern')),
+                          timedelta(hours=1)) == datetime(2015, 6, 6, 17)
 
 
 @pytest.mark.unit
 def test_format_boolean():
     assert format_boolean(True) == 'true'
     assert format_boolean(False) == 'false'
+
+
+def _strftime_literal(value):
+    """The original strftime based formatting of time literals
+    """
+    if value.tzinfo:
+        value = value.astimezone(tzutc())
+    return "'%s'" % datetime.strftime(value, "%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+@pytest.mark.unit
+def test_format_datetime():
+    assert format_datetime(datetime(2014, 2, 10, 18, 4, 53, 834825)) == \
+        "'2014-02-10 18:04:53.834'"
+    assert format_datetime(datetime(2015, 6, 6)) == "'2015-06-06 00:00:00.000'"
+    assert format_datetime(
+        datetime(2014, 2, 10, 18, 4, 53, 834825, tzinfo=gettz('US/Eastern'))) == \
+        "'2014-02-10 23:04:53.834'"
+    # cached results must not leak between naive and aware datetimes
+    assert format_datetime(datetime(2015, 6, 6, tzinfo=gettz('US/Eastern'))) == \
+        "'2015-06-06 04:00:00.000'"
+
+
+@pytest.mark.unit
+def test_format_datetime_matches_strftime():
+    random.seed(27)
+    zones = [None, tzutc(), gettz('US/Eastern'), gettz('Asia/Kolkata')]
+    for i in range(2000):
+        value = datetime(2000, 1, 1) + timedelta(
+            seconds=random.randint(0, 10 ** 9), microseconds=random.randint(0, 999999))
+        value = value.replace(tzinfo=zones[i % len(zones)])
+        assert format_datetime(value) == _strftime_literal(value)
+
+
+@pytest.mark.unit
+def test_format_epoch():
+    dt = datetime(2015, 6, 6)
+    assert format_epoch(dt) == '1433548800000000000'
+    assert format_epoch(dt, 'ns') == '1433548800000000000'
+    assert format_epoch(dt, 'u') == '1433548800000000u'
+    assert format_epoch(dt, 'ms') == '1433548800000ms'
+    assert format_epoch(dt, 's') == '1433548800s'
+    assert format_epoch(dt, 'm') == '23892480m'
+    assert format_epoch(dt, 'h') == '398208h'
+    assert format_epoch(datetime(2015, 6, 6, 0, 0, 0, 1500), 'ms') == \
+        '1433548800001ms'
+    assert format_epoch(datetime(2015, 6, 6, 0, 0, 0, 1500), 'ns') == \
+        '1433548800001500000'
+    assert format_epoch(dt.replace(tzinfo=tzutc()), 's') == '1433548800s'
+    assert format_epoch(
+        datetime(2015, 6, 5, 20, tzinfo=gettz('US/Eastern')), 's') == \
+        '1433548800s'
+    with pytest.raises(ValueError):
+        format_epoch(dt, 'd')